@@ -17,6 +17,7 @@ const uploadRoutes = require('./src/routes/upload');
 
 // Import middleware
 const { errorHandler } = require('./src/middleware/errorHandler');
+const { loadImagePack } = require('./src/utils/imagePack');
 
 const app = express();
 
@@ -38,7 +39,11 @@ app.use(cors({
 app.use(express.json());
 app.use(express.urlencoded({ extended: true }));
 
-// Serve static files
+// Serve static files; product images in the packed archive are answered from it first
+const imagePack = loadImagePack(process.env.IMAGE_PACK_PATH);
+if (imagePack) {
+  app.use('/uploads/products', imagePack.middleware());
+}
 app.use('/uploads', express.static(path.join(__dirname, 'uploads')));
 
 // Routes
@@ -1,5 +1,9 @@
 const Product = require('../models/Product');
 const Category = require('../models/Category');
+const { loadSearchIndex } = require('../utils/searchIndex');
+
+// Search index built at extraction time (search_index.py), loaded once at startup
+const searchIndex = loadSearchIndex(process.env.SEARCH_INDEX_PATH);
 
 // @desc    Get all products
 // @route   GET /api/products
@@ -34,7 +38,22 @@ exports.getProducts = async (req, res) => {
     }
     
     if (search) {
-      query.$text = { $search: search };
+      // The index adds substring matches on the names and codes of the
+      // extraction it was built from. It doesn't know about products created,
+      // renamed or imported since, so the text index results are always kept
+      const ids = searchIndex ? [...new Set([...searchIndex.search(search), ...searchIndex.lookup(search)])] : [];
+      if (ids.length > 0) {
+        const records = ids.map(id => searchIndex.record(id));
+        // $text can't sit in an $or next to unindexed fields, resolve it first
+        const textIds = await Product.distinct('_id', { $text: { $search: search } });
+        query.$or = [
+          { _id: { $in: textIds } },
+          { sku: { $in: records.map(r => r.sku).filter(Boolean) } },
+          { name: { $in: records.map(r => r.name) } }
+        ];
+      } else {
+        query.$text = { $search: search };
+      }
     }
 
     // Price filtering
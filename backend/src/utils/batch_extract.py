@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Batch extraction of several workbooks and multi-tab price lists
+Every (workbook, worksheet) pair is extracted in its own process, then the
+results are merged into one output set. Images are renamed with a per-sheet
+prefix so files from different suppliers never collide. The prefix carries a
+short hash of the workbook's path relative to the other inputs, so two
+price.xlsx from different directories get their own parts and images, and
+sourceFile records that relative path.
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from zipfile import ZipFile
+
+from extract_with_openpyxl_improved import extract_with_openpyxl_improved
+from output_writers import WRITERS, products_filename, read_products
+from xlsx_anchors import worksheet_paths
+
+PARTS_DIR = 'parts'
+IMAGES_DIR = 'product_images_corrected'
+DEFAULT_MEDIA_WORKERS = 4
+
+
+def find_workbooks(inputs):
+    """Expand directories to the .xlsx files inside them (Excel lock files skipped)"""
+    workbooks = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            workbooks.extend(sorted(p for p in path.glob('*.xlsx') if not p.name.startswith('~$')))
+        elif path.exists():
+            workbooks.append(path)
+        else:
+            print(f"Warning: Not found, skipping: {item}")
+    return workbooks
+
+
+def _slug(text):
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', text).strip('_') or 'sheet'
+
+
+def source_names(workbooks):
+    """Each workbook's path relative to the directory all of them share, with / separators"""
+    paths = [workbook.resolve() for workbook in workbooks]
+    root = Path(os.path.commonpath([path.parent for path in paths])) if paths else None
+    return [path.relative_to(root).as_posix() for path in paths]
+
+
+def task_prefix(source, sheet):
+    """Part directory and image prefix of one worksheet, unique per source path and sheet"""
+    digest = hashlib.sha1(f"{source}\0{sheet}".encode('utf-8')).hexdigest()[:8]
+    return f"{_slug(f'{Path(source).stem}__{sheet}')}_{digest}"
+
+
+def _run_task(task):
+    """
+    Extract one worksheet into its own part directory (runs in a worker process)
+    Progress output goes to extract.log in the part directory
+    """
+    part_dir = Path(task['part_dir'])
+    part_dir.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    try:
+        with open(part_dir / 'extract.log', 'w', encoding='utf-8') as log, contextlib.redirect_stdout(log):
+            result = extract_with_openpyxl_improved(
+                task['workbook'], part_dir, streaming=True, workers=task['media_workers'],
+                dedupe=task['dedupe'], output_format=task['output_format'], sheet_name=task['sheet'])
+        if result is None:
+            raise RuntimeError(f"extraction failed, see {part_dir / 'extract.log'}")
+        return dict(task, seconds=time.perf_counter() - started, summary=result['summary'],
+                    products_path=result['output_path'], error=None)
+    except Exception as e:
+        return dict(task, seconds=time.perf_counter() - started, summary=None,
+                    products_path=None, error=str(e))
+
+
+def _merge_images(part_dir, images_dir, prefix, dedupe):
+    """
+    Move a part's images into the merged image directory
+    Returns {old filename: new filename}
+    """
+    renamed = {}
+    part_images = Path(part_dir) / IMAGES_DIR
+    if not part_images.exists():
+        return renamed
+    for image in part_images.iterdir():
+        if image.name.startswith('.'):
+            continue
+        # Digest names are already unique and shared across suppliers
+        new_name = image.name if dedupe else f"{prefix}_{image.name}"
+        target = images_dir / new_name
+        if dedupe and target.exists():
+            image.unlink()
+        else:
+            os.replace(image, target)
+        renamed[image.name] = new_name
+    return renamed
+
+
+def batch_extract(inputs, output_dir, processes=None, media_workers=DEFAULT_MEDIA_WORKERS,
+                  dedupe=False, output_format='json'):
+    """
+    Extract every worksheet of every workbook in inputs (files or directories)
+    and merge the products into one output set in output_dir
+    """
+    print(f"Batch extraction\n")
+    workbooks = find_workbooks(inputs)
+    print(f"Workbooks: {len(workbooks)}")
+    print(f"Output directory: {output_dir}\n")
+    if not workbooks:
+        print("Error: No workbooks to extract")
+        return None
+
+    output_path = Path(output_dir)
+    images_dir = output_path / IMAGES_DIR
+    images_dir.mkdir(parents=True, exist_ok=True)
+
+    tasks = []
+    prefixes = set()
+    for workbook, source in zip(workbooks, source_names(workbooks)):
+        with ZipFile(workbook, 'r') as zip_ref:
+            sheets = [title for title, _ in worksheet_paths(zip_ref)]
+        for sheet in sheets:
+            prefix = task_prefix(source, sheet)
+            if prefix in prefixes:
+                # The same workbook given twice
+                print(f"Warning: {source} [{sheet}] is already in the batch, skipping")
+                continue
+            prefixes.add(prefix)
+            part_dir = output_path / PARTS_DIR / prefix
+            if part_dir.exists():
+                # Never merge a previous run's leftovers into this one
+                print(f"Warning: Replacing the part directory of an earlier run: {part_dir}")
+                shutil.rmtree(part_dir)
+            tasks.append({
+                'workbook': str(workbook),
+                'source': source,
+                'sheet': sheet,
+                'prefix': prefix,
+                'part_dir': str(part_dir),
+                'media_workers': media_workers,
+                'dedupe': dedupe,
+                'output_format': output_format
+            })
+    print(f"Worksheets: {len(tasks)}\n")
+
+    print("=== Extracting worksheets ===\n")
+    started = time.perf_counter()
+    json_path = output_path / products_filename(output_format)
+    timings = []
+    total_products = 0
+
+    with open(json_path, 'w', encoding='utf-8') as f, ProcessPoolExecutor(max_workers=processes) as pool:
+        writer = WRITERS[output_format](f)
+
+        # Results come back in task order, earlier parts merge while later ones still run
+        for result in pool.map(_run_task, tasks):
+            label = f"{result['source']} [{result['sheet']}]"
+            if result['error']:
+                print(f"  {label}: FAILED after {result['seconds']:.2f}s - {result['error']}")
+                timings.append({'file': result['workbook'], 'sheet': result['sheet'],
+                                'seconds': round(result['seconds'], 3), 'error': result['error']})
+                continue
+
+            renamed = _merge_images(result['part_dir'], images_dir, result['prefix'], dedupe)
+            count = 0
+            for product in read_products(result['products_path']):
+                for img in product['图片']:
+                    img['filename'] = renamed.get(img['filename'], img['filename'])
+                    img['path'] = f"{IMAGES_DIR}/{img['filename']}"
+                product['sourceFile'] = result['source']
+                product['sourceSheet'] = result['sheet']
+                writer.write(product)
+                count += 1
+            total_products += count
+
+            print(f"  {label}: {count} products, {result['summary']['totalImages']} images in {result['seconds']:.2f}s")
+            timings.append({'file': result['workbook'], 'sheet': result['sheet'], 'products': count,
+                            'images': result['summary']['totalImages'], 'seconds': round(result['seconds'], 3)})
+
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        'totalProducts': total_products,
+        'workbooks': len(workbooks),
+        'worksheets': len(tasks),
+        'failedWorksheets': sum(1 for t in timings if 'error' in t),
+        'wallSeconds': round(elapsed, 3),
+        'taskSeconds': round(sum(t['seconds'] for t in timings), 3),
+        'extractionDate': datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+        'timings': timings
+    }
+    summary_path = output_path / 'batch_summary.json'
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    print(f"\n=== Batch Summary ===")
+    print(f"Total products: {total_products}")
+    print(f"Worksheets: {len(tasks)} ({summary['failedWorksheets']} failed)")
+    print(f"Wall time: {elapsed:.2f}s (sum of worksheet times: {summary['taskSeconds']:.2f}s)")
+    print(f"Products data saved to: {json_path}")
+    print(f"Summary saved to: {summary_path}")
+
+    return {'summary': summary, 'output_path': str(json_path)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Extract several workbooks / worksheets in parallel and merge the results')
+    parser.add_argument('inputs', nargs='+', help='Workbooks or directories containing .xlsx files')
+    parser.add_argument('-o', '--output-dir', default='../extracted_data_batch',
+                        help='Merged output directory (default: ../extracted_data_batch)')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='Worksheets extracted in parallel (default: CPU count)')
+    parser.add_argument('--media-workers', type=int, default=DEFAULT_MEDIA_WORKERS,
+                        help=f'Image extraction threads per worksheet (default: {DEFAULT_MEDIA_WORKERS})')
+    parser.add_argument('--dedupe', action='store_true',
+                        help='Store each distinct image once under its SHA-256 digest, across all workbooks')
+    parser.add_argument('--format', dest='output_format', choices=sorted(WRITERS), default='json',
+                        help='Products file format: json (pretty, default), compact or ndjson')
+    args = parser.parse_args()
+
+    try:
+        result = batch_extract(args.inputs, args.output_dir, processes=args.processes,
+                               media_workers=args.media_workers, dedupe=args.dedupe,
+                               output_format=args.output_format)
+    except Exception as e:
+        print(f"\nError: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+    if result is None:
+        sys.exit(1)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Excel extractors on synthetic price lists
+Generates workbooks at several scales (synthetic_workbook.py), runs every
+engine in its own process so peak memory is measured per run, and reports
+wall time, peak RSS and image-to-row mapping accuracy against the truth
+sidecar of each workbook
+"""
+import argparse
+import contextlib
+import io
+import json
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from extraction_metrics import peak_rss_mb
+from output_writers import read_products
+from synthetic_workbook import generate_workbook, load_truth
+
+DEFAULT_SCALES = [1000, 10000, 100000]
+
+
+def _run_legacy(excel_path, output_dir):
+    from extract_with_openpyxl import extract_with_openpyxl
+    return extract_with_openpyxl(excel_path, output_dir)
+
+
+def _run_improved(excel_path, output_dir, **options):
+    from extract_with_openpyxl_improved import extract_with_openpyxl_improved
+    return extract_with_openpyxl_improved(excel_path, output_dir, **options)
+
+
+# name -> (workbook layout, runner); new engines only need an entry here
+ENGINES = {
+    'openpyxl': ('legacy', _run_legacy),
+    'improved': ('improved', _run_improved),
+    'improved-streaming': ('improved', lambda xlsx, out: _run_improved(xlsx, out, streaming=True)),
+    'improved-pipelined': ('improved', lambda xlsx, out: _run_improved(xlsx, out, pipelined=True)),
+    'improved-raw': ('improved', lambda xlsx, out: _run_improved(xlsx, out, engine='raw'))
+}
+
+
+def mapping_accuracy(result, truth):
+    """
+    Compare the media member matched to each product against the truth sidecar
+    A product without a picture is correct when it was given no image
+    """
+    original_by_filename = {img['filename']: img['original_path'] for img in result['images']}
+    counts = {'correct': 0, 'wrong': 0, 'missing': 0, 'spurious': 0}
+    products = read_products(result['output_path'])
+
+    for product in products:
+        expected = truth.get(product['rowNumber'])
+        got = original_by_filename.get(product['图片'][0]['filename']) if product['图片'] else None
+        if got == expected:
+            counts['correct'] += 1
+        elif expected is None:
+            counts['spurious'] += 1
+        elif got is None:
+            counts['missing'] += 1
+        else:
+            counts['wrong'] += 1
+
+    counts['products'] = len(products)
+    counts['accuracy'] = round(counts['correct'] / len(products), 4) if products else None
+    return counts
+
+
+def run_one(engine, excel_path, output_dir):
+    """Run one engine in this process and return its measurements"""
+    _, runner = ENGINES[engine]
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = runner(excel_path, output_dir)
+    seconds = time.perf_counter() - started
+    return {
+        'seconds': round(seconds, 3),
+        'peak_rss_mb': peak_rss_mb(),
+        **mapping_accuracy(result, load_truth(excel_path))
+    }
+
+
+def run_benchmarks(work_dir, scales=DEFAULT_SCALES, engines=None, timeout=None):
+    """
+    Generate (or reuse) a workbook per scale and layout, and time every engine on it
+    """
+    work_path = Path(work_dir)
+    engines = engines or list(ENGINES)
+    results = []
+
+    print(f"Benchmarking {', '.join(engines)} at {', '.join(str(s) for s in scales)} rows\n")
+    for rows in scales:
+        for engine in engines:
+            layout, _ = ENGINES[engine]
+            workbook = work_path / f"synthetic_{layout}_{rows}.xlsx"
+            if not workbook.exists() or not Path(f"{workbook}.truth.json").exists():
+                print(f"  Generating {workbook.name} ...")
+                generate_workbook(workbook, rows, layout=layout)
+
+            output_dir = work_path / f"out_{engine}_{rows}"
+            cmd = [sys.executable, str(Path(__file__).resolve()), '--run-one', engine, str(workbook), str(output_dir)]
+            try:
+                proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+                if proc.returncode != 0:
+                    raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'failed')
+                measurement = json.loads(proc.stdout.strip().splitlines()[-1])
+            except Exception as e:
+                measurement = {'error': str(e)}
+
+            measurement.update({'engine': engine, 'rows': rows})
+            results.append(measurement)
+            if 'error' in measurement:
+                print(f"  {engine:<20} {rows:>7} rows  ERROR: {measurement['error']}")
+            else:
+                print(f"  {engine:<20} {rows:>7} rows  {measurement['seconds']:>8.2f}s  "
+                      f"{measurement['peak_rss_mb']:>8} MB  accuracy {measurement['accuracy']:.2%}")
+
+    report = {
+        'date': datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+        'python': sys.version.split()[0],
+        'results': results
+    }
+    report_path = work_path / 'benchmark_results.json'
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nResults saved to: {report_path}")
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the Excel extractors on synthetic workbooks')
+    parser.add_argument('--work-dir', default='../benchmark_data',
+                        help='Where workbooks and outputs are kept (default: ../benchmark_data)')
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES,
+                        help='Row counts to benchmark (default: 1000 10000 100000)')
+    parser.add_argument('--engines', nargs='+', choices=sorted(ENGINES), default=None,
+                        help='Engines to run (default: all)')
+    parser.add_argument('--timeout', type=int, default=None, help='Per-run timeout in seconds')
+    parser.add_argument('--run-one', nargs=3, metavar=('ENGINE', 'XLSX', 'OUTPUT_DIR'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        engine, excel_path, output_dir = args.run_one
+        print(json.dumps(run_one(engine, excel_path, output_dir)))
+        sys.exit(0)
+
+    run_benchmarks(args.work_dir, scales=args.scales, engines=args.engines, timeout=args.timeout)
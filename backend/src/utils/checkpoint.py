@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Checkpoints of a running extraction, so a killed run can be resumed
+Every interval seconds the products file is flushed to disk and
+extraction_checkpoint.json is replaced atomically. It records the last row
+whose product was written, the products file size at that point, the media
+already extracted and the running counters. A resumed run truncates the
+products file back to that size, reuses the media files and continues with
+the next row. The checkpoint is removed when a run completes.
+"""
+import json
+import os
+import time
+from pathlib import Path
+
+CHECKPOINT_NAME = 'extraction_checkpoint.json'
+DEFAULT_CHECKPOINT_INTERVAL = 30.0
+VERSION = 1
+
+
+def source_identity(excel_path, **options):
+    """
+    What a checkpoint is only valid for: the same workbook (by name, size and
+    modification time) extracted with the same output-affecting options
+    """
+    stat = os.stat(excel_path)
+    return {'file': Path(excel_path).name, 'size': stat.st_size, 'mtime': stat.st_mtime_ns, **options}
+
+
+class ExtractionCheckpoint:
+    """
+    Writes checkpoints during a run and holds the one being resumed from
+    state is None unless resuming
+    """
+    def __init__(self, output_dir, identity, interval=DEFAULT_CHECKPOINT_INTERVAL, state=None):
+        self.path = Path(output_dir) / CHECKPOINT_NAME
+        self.identity = identity
+        self.interval = interval
+        self.state = state
+        self.saves = 0
+        self.seconds = 0.0
+        self._last_saved = time.perf_counter()
+
+    @classmethod
+    def load(cls, output_dir, identity, interval=DEFAULT_CHECKPOINT_INTERVAL):
+        """
+        The checkpoint left in output_dir by an interrupted run, if it was taken
+        for the same workbook and options. Returns (checkpoint, reason it
+        can't be resumed or None)
+        """
+        checkpoint = cls(output_dir, identity, interval)
+        if not checkpoint.path.exists():
+            return checkpoint, 'no checkpoint found'
+        with open(checkpoint.path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('version') != VERSION or state.get('source') != identity:
+            return checkpoint, 'the checkpoint is for a different workbook or options'
+        checkpoint.state = state
+        return checkpoint, None
+
+    @property
+    def last_row(self):
+        """Row of the last product written before the checkpoint (0 when not resuming)"""
+        return self.state['lastRow'] if self.state else 0
+
+    @property
+    def products(self):
+        return self.state['products'] if self.state else 0
+
+    @property
+    def output_bytes(self):
+        return self.state['outputBytes'] if self.state else 0
+
+    def value(self, key, default=None):
+        return self.state.get(key, default) if self.state else default
+
+    def cached_media(self, member, images_dir):
+        """The entry for a media member extracted before the checkpoint, if its file is intact"""
+        entry = self.value('media', {}).get(member)
+        if not entry:
+            return None
+        path = Path(images_dir) / entry['filename']
+        if not path.exists() or path.stat().st_size != entry['size']:
+            return None
+        return entry
+
+    def due(self):
+        return time.perf_counter() - self._last_saved >= self.interval
+
+    def save(self, f, last_row, products, media, **state):
+        """
+        Flush the products file f to disk, then atomically replace the
+        checkpoint with one pointing at its current end. Extra keyword
+        arguments (counters, errors, sink statistics) are stored as they are
+        """
+        started = time.perf_counter()
+        f.flush()
+        os.fsync(f.fileno())
+        checkpoint = {
+            'version': VERSION,
+            'source': self.identity,
+            'lastRow': last_row,
+            'products': products,
+            'outputBytes': f.tell(),
+            'media': media,
+            **state
+        }
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as out:
+            json.dump(checkpoint, out, ensure_ascii=False)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, self.path)
+        self.saves += 1
+        self._last_saved = time.perf_counter()
+        self.seconds += self._last_saved - started
+
+    def remove(self):
+        """Drop the checkpoint once the run it covers has completed"""
+        if self.path.exists():
+            self.path.unlink()
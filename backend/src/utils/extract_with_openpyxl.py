@@ -3,6 +3,7 @@
 Extract products and images from Excel file using openpyxl
 This provides better image position tracking than JavaScript libraries
 """
+import argparse
 import json
 import sys
 import os
@@ -12,9 +13,16 @@ from openpyxl.drawing.image import Image
 import shutil
 from zipfile import ZipFile
 
-def extract_with_openpyxl(excel_path, output_dir):
+from media_extraction import DEFAULT_WORKERS, extract_media
+from row_decoder import HEADERS, HEADER_SCAN_ROWS, RowDecoder, detect_schema
+
+# 序号..重量KG in A..L, the layout this script was written for
+LEGACY_COLUMNS = {header: index for index, header in enumerate(HEADERS)}
+
+def extract_with_openpyxl(excel_path, output_dir, workers=DEFAULT_WORKERS):
     """
     Extract products and images from Excel file with correct image-to-product mapping
+    workers: number of threads extracting xl/media/ members
     """
     print(f"📊 Extracting data with openpyxl\n")
     print(f"Excel file: {excel_path}")
@@ -96,36 +104,38 @@ def extract_with_openpyxl(excel_path, output_dir):
                     # We'll need to match based on the image path/filename
                     pass
             
+            jobs = []
             for idx, img_path in enumerate(image_files):
-                try:
-                    image_data = zip_ref.read(img_path)
-                    img_filename = Path(img_path).name
-                    img_ext = Path(img_path).suffix or '.jpeg'
-                    
-                    output_filename = f"product_{idx + 1}_{img_filename}{img_ext}"
-                    output_path_img = images_dir / output_filename
-                    
-                    with open(output_path_img, 'wb') as f:
-                        f.write(image_data)
-                    
-                    # Try to find row position from images_info
-                    row_pos = None
-                    if idx < len(images_info) and images_info[idx]['row']:
-                        row_pos = images_info[idx]['row']
-                    
-                    xlsx_images.append({
-                        'index': idx,
-                        'original_path': img_path,
-                        'filename': output_filename,
-                        'path': f"product_images_corrected/{output_filename}",
-                        'size': len(image_data),
-                        'row': row_pos
-                    })
-                    
-                    if idx < 5:
-                        print(f"  Saved: {output_filename} ({len(image_data)/1024:.2f} KB, Row: {row_pos or 'N/A'})")
-                except Exception as e:
-                    print(f"  Warning: Could not extract {img_path}: {e}")
+                img_filename = Path(img_path).name
+                img_ext = Path(img_path).suffix or '.jpeg'
+                output_filename = f"product_{idx + 1}_{img_filename}{img_ext}"
+                jobs.append((img_path, images_dir / output_filename))
+            
+            # Members are streamed to disk in chunks by a thread pool
+            results = extract_media(excel_path, jobs, workers=workers)
+            for idx, (img_path, output_path_img, size, _, error) in enumerate(results):
+                if error:
+                    print(f"  Warning: Could not extract {img_path}: {error}")
+                    continue
+                
+                output_filename = output_path_img.name
+                
+                # Try to find row position from images_info
+                row_pos = None
+                if idx < len(images_info) and images_info[idx]['row']:
+                    row_pos = images_info[idx]['row']
+                
+                xlsx_images.append({
+                    'index': idx,
+                    'original_path': img_path,
+                    'filename': output_filename,
+                    'path': f"product_images_corrected/{output_filename}",
+                    'size': size,
+                    'row': row_pos
+                })
+                
+                if idx < 5:
+                    print(f"  Saved: {output_filename} ({size/1024:.2f} KB, Row: {row_pos or 'N/A'})")
     except Exception as e:
         print(f"Warning: Could not read XLSX as ZIP: {e}")
     
@@ -147,45 +157,28 @@ def extract_with_openpyxl(excel_path, output_dir):
                 # Try to match by index if available
                 product_row_to_image[row_num] = img_info['index']
     
+    # Columns come from the header row. Without one, this script's own layout
+    # applies: 序号..重量KG in A..L, with header rows only skipped by their text
+    schema = detect_schema(worksheet.iter_rows(min_row=1, max_row=min(HEADER_SCAN_ROWS, worksheet.max_row),
+                                               values_only=True),
+                           default_columns=LEGACY_COLUMNS, default_header_row=0)
+    decoder = RowDecoder(schema)
+    if schema.detected:
+        print(f"Header row {schema.header_row}: {schema.describe()}\n")
+    else:
+        print(f"No header row found, using the default columns: {schema.describe()}\n")
+    
     # Extract products row by row
     row_idx = 0
-    for row_num in range(1, worksheet.max_row + 1):
-        row = worksheet[row_num]
-        
-        # Skip header rows (usually first 2 rows)
-        if row_num <= 2:
-            # Check if it's a header
-            first_cell = row[0].value if len(row) > 0 else None
-            if first_cell and ('序号' in str(first_cell) or '配货中心' in str(first_cell)):
-                continue
-        
-        # Get product name from column B (index 1)
-        product_name = None
-        if len(row) > 1:
-            product_name = row[1].value
-            if product_name:
-                product_name = str(product_name).strip()
-        
-        # Skip if no product name or if it looks like a header
-        if not product_name or product_name == '' or '配货中心' in product_name or product_name == '名称':
+    for row_num, row in enumerate(worksheet.iter_rows(min_row=1, max_row=worksheet.max_row,
+                                                      values_only=True), start=1):
+        product = decoder.decode(row_num, row)
+        # Skip empty and header rows, including the title row
+        if product is None or '配货中心' in product['名称']:
             continue
         
         row_idx += 1
-        
-        # Extract all fields
-        product_code = str(row[0].value).strip() if len(row) > 0 and row[0].value else ''
-        battery_model = str(row[2].value).strip() if len(row) > 2 and row[2].value else '无'
-        unit = str(row[3].value).strip() if len(row) > 3 and row[3].value else ''
-        
-        # Numeric fields
-        cost_price = float(row[4].value) if len(row) > 4 and row[4].value else 0
-        quantity = int(row[5].value) if len(row) > 5 and row[5].value else 0
-        specification = str(row[6].value).strip() if len(row) > 6 and row[6].value else ''
-        amount = float(row[7].value) if len(row) > 7 and row[7].value else 0
-        suggested_price = float(row[8].value) if len(row) > 8 and row[8].value else 0
-        market_value = float(row[9].value) if len(row) > 9 and row[9].value else 0
-        barcode = str(row[10].value).strip() if len(row) > 10 and row[10].value else ''
-        weight = float(row[11].value) if len(row) > 11 and row[11].value else 0
+        product_name = product['名称']
         
         # Match image to this product row
         matched_images = []
@@ -207,22 +200,7 @@ def extract_with_openpyxl(excel_path, output_dir):
                 'size': img['size']
             })
         
-        product = {
-            'rowNumber': row_num,
-            '序号': product_code,
-            '名称': product_name,
-            '电池型号': battery_model,
-            '单位': unit,
-            '价格': cost_price,
-            '数量': quantity,
-            '规格': specification,
-            '金额': amount,
-            '建议价': suggested_price,
-            '市值': market_value,
-            '条码': barcode,
-            '重量KG': weight,
-            '图片': matched_images
-        }
+        product['图片'] = matched_images
         
         products.append(product)
         
@@ -231,6 +209,9 @@ def extract_with_openpyxl(excel_path, output_dir):
             print(f"  Product {row_idx}: \"{product_name[:40]}...\" - Row {row_num}, Image: {img_info}")
     
     print(f"\n✅ Extracted {len(products)} products\n")
+    if decoder.errors:
+        decoder.print_errors()
+        print()
     
     # Step 4: Save results
     print("=== Step 4: Saving results ===\n")
@@ -260,19 +241,24 @@ def extract_with_openpyxl(excel_path, output_dir):
     }
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print("Usage: python extract_with_openpyxl.py <excel-file> [output-dir]")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description='Extract products and images from an Excel price list')
+    parser.add_argument('excel_file', help='Path to the .xlsx file')
+    parser.add_argument('output_dir', nargs='?', default='../extracted_data_openpyxl',
+                        help='Output directory (default: ../extracted_data_openpyxl)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Threads used to extract images (default: {DEFAULT_WORKERS})')
+    args = parser.parse_args()
     
-    excel_path = sys.argv[1]
-    output_dir = sys.argv[2] if len(sys.argv) > 2 else '../extracted_data_openpyxl'
+    excel_path = args.excel_file
+    output_dir = args.output_dir
     
     if not os.path.exists(excel_path):
         print(f"Error: Excel file not found: {excel_path}")
         sys.exit(1)
     
     try:
-        extract_with_openpyxl(excel_path, output_dir)
+        extract_with_openpyxl(excel_path, output_dir, workers=args.workers)
     except Exception as e:
         print(f"\n❌ Error: {e}")
         import traceback
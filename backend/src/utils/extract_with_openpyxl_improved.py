@@ -2,19 +2,173 @@
 """
 Improved extraction using openpyxl with better image-to-row mapping
 This version attempts to properly map images to their Excel row positions
+
+With --streaming the sheet is read through openpyxl's read-only row iterator
+and products are written out as they are parsed, so memory stays flat as the
+price list grows. The JSON output is identical to the default mode.
+
+--format selects the products writer: pretty JSON (default), compact JSON or
+NDJSON, which is flushed one product per line as extraction runs.
+
+--engine raw reads the rows straight from the sheet XML (xlsx_raw_reader.py)
+instead of through openpyxl, decoding only the product columns. The output is
+identical to the openpyxl engine.
+
+--price-columns also writes the numeric fields as typed columns
+(price_columns.py) and checks 金额 against 价格 × 数量 and prices against the
+rest of the sheet.
+
+--pack-images appends the images to one product_images.pack blob with an
+offset index (image_pack.py) instead of writing a file per picture.
+
+A checkpoint is written every --checkpoint-interval seconds (checkpoint.py);
+--resume continues a killed run after the last row it wrote.
 """
+import argparse
+import contextlib
+from datetime import datetime, timezone
 import json
 import sys
 import os
+import threading
+import time
 from pathlib import Path
 from openpyxl import load_workbook
 from zipfile import ZipFile
-import xml.etree.ElementTree as ET
 
-def extract_with_openpyxl_improved(excel_path, output_dir):
+from image_derivatives import build_derivatives
+from image_pack import IMAGE_PACK_NAME, ImagePackWriter
+from checkpoint import DEFAULT_CHECKPOINT_INTERVAL, ExtractionCheckpoint, source_identity
+from extraction_metrics import PROFILE_NAME, StageMetrics, TimedWriter
+from image_matcher import ImageRowIndex, match_images
+from incremental import ExtractionManifest
+from media_extraction import DEFAULT_WORKERS, extract_media, store_by_digest
+from mongo_loader import DEFAULT_BATCH_SIZE, MongoProductSink, open_database, print_stats
+from output_writers import WRITERS, iter_written_products, products_filename
+from pipeline import Background, Consumer, Producer
+from price_columns import PRICE_COLUMNS_NAME, PriceColumnsBuilder
+from price_columns import print_report as print_price_report, save_report as save_price_report
+from product_categorizer import ProductCategorizer
+from row_decoder import HEADER_SCAN_ROWS, CellError, RowDecoder, detect_schema
+from search_index import SEARCH_INDEX_NAME, SearchIndexBuilder
+from xlsx_anchors import read_image_anchors, worksheet_path
+from xlsx_raw_reader import RawWorksheet
+
+ENGINES = ('openpyxl', 'raw')
+
+
+def _parse_products(rows, decoder, categorizer=None):
+    """
+    Yield product dicts from (row_num, values) pairs, skipping header and empty rows
+    decoder: RowDecoder compiled for the sheet's columns
+    categorizer, if given, writes each product's category into the record
+    """
+    decode = decoder.decode
+    for row_num, row in rows:
+        product = decode(row_num, row)
+        if product is not None:
+            if categorizer is not None:
+                categorizer.categorize(product)
+            yield product
+
+
+def _iter_products(products, image_index, resolve_image, after_row=None):
+    """
+    Yield (product, matches) with matched images attached
+    resolve_image turns an indexed media member into its extracted image
+    (None if it could not be extracted); after_row is the last row already
+    written when resuming
+    """
+    count = 0
+
+    for product, matches in match_images(products, image_index, after_row=after_row):
+        resolved = []
+        for match in matches:
+            match['image'] = resolve_image(match['image'])
+            if match['image'] is not None:
+                resolved.append(match)
+        matches = resolved
+
+        # A product keeps every picture matched to it, best match first
+        for match in sorted(matches, key=lambda m: -m['confidence']):
+            product['图片'].append({
+                'filename': match['image']['filename'],
+                'path': match['image']['path'],
+                'size': match['image']['size'],
+                'confidence': match['confidence']
+            })
+
+        count += 1
+        if count <= 5:
+            img_info = product['图片'][0]['filename'] if product['图片'] else 'None'
+            match_method = matches[0]['method'] if matches else 'none'
+            print(f"  Product {count}: \"{product['名称'][:40]}...\" - Row {product['rowNumber']}, Image: {img_info} ({match_method})")
+
+        yield product, matches
+
+
+def _abandon_run(media_stage, image_pack, workbook, mongo_client):
+    """
+    Release what a failed run still holds, so a long-running process (see
+    extraction_service.py) keeps no files, threads or connections of it
+    """
+    if media_stage is not None:
+        # The media thread writes into the pack, let it finish first
+        with contextlib.suppress(Exception):
+            media_stage.join()
+    if image_pack is not None:
+        image_pack.abort()
+    for resource in (workbook, mongo_client):
+        if resource is not None:
+            with contextlib.suppress(Exception):
+                resource.close()
+
+
+def extract_with_openpyxl_improved(excel_path, output_dir, streaming=False, workers=DEFAULT_WORKERS,
+                                   dedupe=False, incremental=False, derivatives=False, output_format='json',
+                                   sheet_name=None, mongo_uri=None, mongo_batch_size=DEFAULT_BATCH_SIZE,
+                                   mongo_overwrite=False, pipelined=False, engine='openpyxl', search_index=False,
+                                   pack_images=False, price_columns=False,
+                                   checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL, resume=False, part_cache=None):
     """
     Extract products and images with proper row-based image matching
+
+    streaming: read rows with openpyxl's read-only iterator and write each
+    product as soon as it is parsed instead of holding the sheet in memory
+    workers: number of threads extracting xl/media/ members
+    dedupe: store each distinct image once under its SHA-256 digest and point
+    every product that reuses it at the shared file
+    incremental: compare against the manifest of the previous run in output_dir,
+    skip unchanged images and write a delta of added/changed/removed products
+    (implies dedupe so image names are stable between runs)
+    derivatives: render thumbnail/card/detail WebP variants after extraction
+    output_format: 'json' (indent=2), 'compact' or 'ndjson'
+    sheet_name: worksheet to extract instead of the active one; only the
+    images anchored on that sheet are extracted
+    mongo_uri: also upsert products into this MongoDB database, mongo_batch_size
+    products per bulk write (mongo_overwrite updates existing products)
+    pipelined: run image extraction, row decoding, matching and output writing
+    as concurrent stages joined by bounded queues (implies streaming)
+    engine: 'openpyxl', or 'raw' to decode the product columns straight from
+    the sheet XML (implies streaming)
+    search_index: also write search_index.bin, the name n-gram, code and price
+    index the backend loads for product search
+    pack_images: append images to product_images.pack instead of writing them
+    to product_images_corrected/ (not with incremental or derivatives, which
+    work on the loose files)
+    price_columns: also write price_columns.bin, the numeric fields as one
+    typed array each, and price_report.json with the rows whose 金额 isn't
+    价格 × 数量 and the price and markup outliers
+    checkpoint_interval: seconds between checkpoints of the products written
+    and media extracted so far
+    resume: continue after the last checkpoint left in output_dir by a run
+    that didn't finish, reusing its output and media
+    part_cache: PartCache holding the shared strings (raw engine) and drawing
+    anchors parsed by earlier runs in this process, see extraction_service.py
     """
+    if pack_images and (incremental or derivatives):
+        raise ValueError("Packed images can't be combined with incremental extraction or derivatives")
+    
     print(f"Extracting data with openpyxl (Improved)\n")
     print(f"Excel file: {excel_path}")
     print(f"Output directory: {output_dir}\n")
@@ -23,255 +177,659 @@ def extract_with_openpyxl_improved(excel_path, output_dir):
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
     
+    # Packed images keep their product_images_corrected/ paths as names in the pack
     images_dir = output_path / "product_images_corrected"
-    images_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Load workbook
-    print("=== Loading Excel file ===\n")
-    workbook = load_workbook(excel_path, data_only=True, keep_links=False)
-    worksheet = workbook.active
-    print(f"Worksheet: {worksheet.title}")
-    print(f"Max row: {worksheet.max_row}\n")
-    
-    # Step 1: Extract images from XLSX archive
-    print("=== Step 1: Extracting images from XLSX archive ===\n")
-    
-    xlsx_images = {}
-    image_files = []
-    
+    image_pack = None
+    # A run that fails or gives up releases these in the finally below
+    workbook = mongo_client = media_stage = None
+    finished = False
     try:
-        with ZipFile(excel_path, 'r') as zip_ref:
-            # Get all image files
-            all_files = zip_ref.namelist()
-            image_files = [f for f in all_files if f.startswith('xl/media/') and 
-                          any(f.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp'])]
-            
-            print(f"Found {len(image_files)} images in XLSX archive\n")
-            
-            # Read drawing relationships to map images to cells
-            # Look for drawing files
-            drawing_files = [f for f in all_files if 'xl/drawings/drawing' in f and f.endswith('.xml')]
-            rels_files = [f for f in all_files if 'xl/drawings/_rels/drawing' in f and f.endswith('.rels')]
+        if pack_images:
+            image_pack = ImagePackWriter(output_path / IMAGE_PACK_NAME)
+        else:
+            images_dir.mkdir(parents=True, exist_ok=True)
+        
+        metrics = StageMetrics()
+        pipeline_started = time.perf_counter()
+        if pipelined or engine == 'raw':
+            streaming = True
+        
+        manifest = None
+        if incremental:
+            dedupe = True
+            manifest = ExtractionManifest.load(output_path)
+            print(f"Incremental mode, previous run: {manifest.previous_date or 'none'}\n")
+        
+        json_path = output_path / products_filename(output_format)
+        identity = source_identity(excel_path, sheet=sheet_name, format=output_format, dedupe=dedupe,
+                                   incremental=incremental, packImages=pack_images)
+        checkpoint = ExtractionCheckpoint(output_path, identity, checkpoint_interval)
+        if resume:
+            checkpoint, reason = ExtractionCheckpoint.load(output_path, identity, checkpoint_interval)
+            if reason is None and (not json_path.exists() or json_path.stat().st_size < checkpoint.output_bytes):
+                checkpoint.state, reason = None, f"{json_path.name} is shorter than the checkpoint"
+            if reason:
+                print(f"Not resuming: {reason}, starting from row 1\n")
+            else:
+                print(f"Resuming after row {checkpoint.last_row} ({checkpoint.products} products already written)\n")
+        
+        # Load workbook
+        print("=== Loading Excel file ===\n")
+        stage_started = time.perf_counter()
+        if engine == 'raw':
+            workbook = worksheet = RawWorksheet(excel_path, sheet_name, cache=part_cache)
+            if worksheet.max_row is None or worksheet.max_column is None:
+                worksheet.calculate_dimension(force=True)
+        elif streaming:
+            workbook = load_workbook(excel_path, read_only=True, data_only=True, keep_links=False)
+            worksheet = workbook[sheet_name] if sheet_name else workbook.active
+            if worksheet.max_row is None or worksheet.max_column is None:
+                # No <dimension> element, size the sheet with one streaming pass
+                worksheet.calculate_dimension(force=True)
+        else:
+            workbook = load_workbook(excel_path, data_only=True, keep_links=False)
+            worksheet = workbook[sheet_name] if sheet_name else workbook.active
+        # Read-only loads don't parse rows, only full loads get a rows/sec rate
+        metrics.record('workbook_load', time.perf_counter() - stage_started,
+                       **({} if streaming else {'rows': worksheet.max_row}))
+        print(f"Worksheet: {worksheet.title}")
+        print(f"Max row: {worksheet.max_row}\n")
+        
+        # Step 1: Extract images from XLSX archive
+        print("=== Step 1: Extracting images from XLSX archive ===\n")
+        
+        xlsx_images = {}
+        image_files = []
+        image_anchors = []
+        stored_digests = set()
+        duplicate_images = 0
+        bytes_saved = 0
+        reused_images = 0
+        resumed_images = 0
+        bytes_extracted = 0
+        anchor_seconds = 0.0
+        stage_started = time.perf_counter()
+        
+        def add_image(idx, img_path, info, output_path_img, size, digest, action='Saved'):
+            nonlocal duplicate_images, bytes_saved
+            if dedupe:
+                if digest in stored_digests:
+                    duplicate_images += 1
+                    bytes_saved += size
+                stored_digests.add(digest)
             
-            print(f"Found {len(drawing_files)} drawing files")
-            print(f"Found {len(rels_files)} relationship files\n")
+            output_filename = output_path_img.name
+            xlsx_images[img_path] = {
+                'index': idx,
+                'original_path': img_path,
+                'filename': output_filename,
+                'path': f"product_images_corrected/{output_filename}",
+                'size': size,
+                'excel_row': None  # Will be filled from drawing anchors
+            }
+            if dedupe:
+                xlsx_images[img_path]['digest'] = digest
+            if manifest:
+                manifest.record_media(info, digest, output_filename)
             
-            # Extract images
-            for idx, img_path in enumerate(sorted(image_files)):
-                try:
-                    image_data = zip_ref.read(img_path)
+            if idx < 5:
+                print(f"  {action}: {output_filename} ({size/1024:.2f} KB)")
+        
+        try:
+            with ZipFile(excel_path, 'r') as zip_ref:
+                # Get all image files
+                all_files = zip_ref.namelist()
+                image_files = [f for f in all_files if f.startswith('xl/media/') and 
+                              any(f.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp'])]
+                
+                # Resolve each picture's r:embed id to its media member and cell
+                sheet_path = worksheet_path(zip_ref, worksheet.title)
+                if sheet_path:
+                    anchors_started = time.perf_counter()
+                    image_anchors = read_image_anchors(zip_ref, sheet_path, cache=part_cache)
+                    anchor_seconds = time.perf_counter() - anchors_started
+                
+                if sheet_name:
+                    # Other sheets' pictures belong to other extractions
+                    anchored_media = {anchor['media'] for anchor in image_anchors}
+                    image_files = [f for f in image_files if f in anchored_media]
+                
+                # Pictures are indexed by media member and resolved to their
+                # extracted file when a product is matched
+                anchors_started = time.perf_counter()
+                extractable = set(image_files)
+                image_index = ImageRowIndex((anchor, anchor['media']) for anchor in image_anchors
+                                            if anchor['media'] in extractable)
+                anchor_seconds += time.perf_counter() - anchors_started
+                
+                print(f"Found {len(image_files)} images in XLSX archive\n")
+                
+                # Read drawing relationships to map images to cells
+                # Look for drawing files
+                drawing_files = [f for f in all_files if 'xl/drawings/drawing' in f and f.endswith('.xml')]
+                rels_files = [f for f in all_files if 'xl/drawings/_rels/drawing' in f and f.endswith('.rels')]
+                
+                print(f"Found {len(drawing_files)} drawing files")
+                print(f"Found {len(rels_files)} relationship files\n")
+                
+                # Extract images
+                jobs = []
+                job_index = {}
+                infos = {}
+                for idx, img_path in enumerate(sorted(image_files)):
                     img_filename = Path(img_path).name
                     img_ext = Path(img_path).suffix or '.jpeg'
+                    infos[img_path] = zip_ref.getinfo(img_path)
                     
-                    output_filename = f"image_{idx + 1}_{img_filename}{img_ext}"
-                    output_path_img = images_dir / output_filename
-                    
-                    with open(output_path_img, 'wb') as f:
-                        f.write(image_data)
+                    # Incremental runs reuse members whose CRC and size are unchanged
+                    # without decompressing them again
+                    cached = manifest.cached_media(infos[img_path], images_dir) if manifest else None
+                    if cached:
+                        add_image(idx, img_path, infos[img_path], images_dir / cached['filename'],
+                                  cached['size'], cached['digest'], action='Reused')
+                        reused_images += 1
+                        continue
                     
-                    xlsx_images[img_path] = {
-                        'index': idx,
-                        'original_path': img_path,
-                        'filename': output_filename,
-                        'path': f"product_images_corrected/{output_filename}",
-                        'size': len(image_data),
-                        'excel_row': None  # Will be filled from worksheet images
-                    }
+                    # Media extracted before the checkpoint of an interrupted run
+                    resumed = checkpoint.cached_media(img_path, images_dir)
+                    if resumed:
+                        add_image(idx, img_path, infos[img_path], images_dir / resumed['filename'],
+                                  resumed['size'], resumed.get('digest'), action='Resumed')
+                        resumed_images += 1
+                        continue
                     
-                    if idx < 5:
-                        print(f"  Saved: {output_filename} ({len(image_data)/1024:.2f} KB)")
-                except Exception as e:
-                    print(f"  Warning: Could not extract {img_path}: {e}")
-    except Exception as e:
-        print(f"Error reading XLSX: {e}")
-        return None
-    
-    print(f"\nExtracted {len(xlsx_images)} images\n")
-    
-    # Step 2: Get image positions from worksheet
-    print("=== Step 2: Getting image positions from worksheet ===\n")
-    
-    row_to_image_map = {}
-    
-    # Access worksheet images
-    if hasattr(worksheet, '_images') and worksheet._images:
-        print(f"Found {len(worksheet._images)} images in worksheet._images\n")
+                    output_filename = f"image_{idx + 1}_{img_filename}{img_ext}"
+                    if dedupe:
+                        # Renamed to <digest><ext> once the content hash is known
+                        output_filename = f".{output_filename}.part"
+                    job_index[img_path] = idx
+                    jobs.append((img_path, images_dir / output_filename))
+                
+                if pipelined:
+                    # Extract images in the order the rows will ask for them
+                    first_row = {}
+                    for row, _, _, member, _ in image_index.between(None, None):
+                        first_row.setdefault(member, row)
+                    jobs.sort(key=lambda job: first_row.get(job[0], float('inf')))
+                
+                # Members are streamed to disk in chunks by a thread pool
+                results = extract_media(excel_path, jobs, workers=workers,
+                                        hash_name='sha256' if dedupe else None,
+                                        opener=image_pack.open if image_pack is not None else open)
+                media_ready = {img_path: threading.Event() for img_path, _ in jobs}
+                
+                def store_media(results):
+                    nonlocal bytes_extracted
+                    try:
+                        for img_path, output_path_img, size, digest, error in results:
+                            if error:
+                                print(f"  Warning: Could not extract {img_path}: {error}")
+                            else:
+                                bytes_extracted += size
+                                if dedupe:
+                                    store = image_pack.store_by_digest if image_pack is not None else store_by_digest
+                                    output_path_img, _ = store(output_path_img, digest, Path(img_path).suffix or '.jpeg')
+                                add_image(job_index[img_path], img_path, infos[img_path], output_path_img, size, digest)
+                            media_ready[img_path].set()
+                    finally:
+                        # Never leave the matcher waiting on an image that will not come
+                        for ready in media_ready.values():
+                            ready.set()
+                
+                if pipelined:
+                    media_stage = Background(store_media, results, name='media')
+                else:
+                    store_media(results)
+        except Exception as e:
+            print(f"Error reading XLSX: {e}")
+            return None
         
-        for idx, img_obj in enumerate(worksheet._images):
-            row = None
-            col = None
+        def finish_media(seconds):
+            # Keep images in archive order when some were reused from the previous run
+            ordered = sorted(xlsx_images.items(), key=lambda item: item[1]['index'])
+            xlsx_images.clear()
+            xlsx_images.update(ordered)
+            for row, _, _, member, _ in image_index.between(None, None):
+                if member in xlsx_images:
+                    xlsx_images[member]['excel_row'] = row
+            metrics.record('media', seconds, images=len(xlsx_images), bytes_written=bytes_extracted)
             
-            # Try to get anchor information
-            try:
-                anchor = img_obj.anchor
-                if hasattr(anchor, '_from'):
-                    # TwoCellAnchor
-                    row = anchor._from.row + 1  # Convert to 1-indexed
-                    col = anchor._from.col + 1
-                elif hasattr(anchor, 'row'):
-                    # OneCellAnchor
-                    row = anchor.row + 1
-                    col = anchor.col + 1
+            print(f"\nExtracted {len(xlsx_images)} images\n")
+            if incremental:
+                print(f"Reused {reused_images} unchanged images from the previous run\n")
+            if resumed_images:
+                print(f"Reused {resumed_images} images extracted before the checkpoint\n")
+            if dedupe:
+                print(f"Stored {len(stored_digests)} unique images, {duplicate_images} duplicates ({bytes_saved/1024:.2f} KB saved)\n")
+        
+        def resolve_image(member):
+            ready = media_ready.get(member)
+            if ready is not None:
+                ready.wait()
+            return xlsx_images.get(member)
+        
+        if not pipelined:
+            finish_media(time.perf_counter() - stage_started - anchor_seconds)
+        
+        # Step 2: Get image positions from worksheet
+        print("=== Step 2: Getting image positions from worksheet ===\n")
+        
+        stage_started = time.perf_counter()
+        
+        print(f"Found {len(image_anchors)} anchored images in worksheet drawings\n")
+        
+        # Anchors name their media member exactly, no index-order guessing; each
+        # picture is indexed under the row that holds most of it
+        for idx, (row, _, anchor, _, coverage) in enumerate(image_index.between(None, None)):
+            if idx < 10:
+                span = f"rows {anchor['from_row']}-{anchor['to_row']}" if len(coverage) > 1 else f"Row {row}"
+                print(f"  Image {idx + 1}: {anchor['media']} -> Row {row} ({span}), Column {anchor['from_col'] or 'N/A'}")
+        
+        # Drawing XML is parsed during step 1, count it here
+        metrics.record('anchor_mapping', time.perf_counter() - stage_started + anchor_seconds,
+                       images=len(image_anchors))
+        print(f"\nIndexed {len(image_index)} images by row\n")
+        
+        # Step 3: Extract product data
+        print("=== Step 3: Extracting product data ===\n")
+        
+        stage_started = time.perf_counter()
+        
+        # Columns come from the sheet's header row, found once
+        schema = detect_schema(worksheet.iter_rows(min_row=1, max_row=min(HEADER_SCAN_ROWS, worksheet.max_row),
+                                                   values_only=True))
+        decoder = RowDecoder(schema)
+        if schema.detected:
+            print(f"Header row {schema.header_row}: {schema.describe()}\n")
+        else:
+            print(f"No header row found, using the default columns: {schema.describe()}\n")
+        if schema.missing:
+            print(f"Columns not in this sheet: {', '.join(schema.missing)}\n")
+        
+        # A resumed run starts after the last row it wrote
+        first_row = checkpoint.last_row + 1
+        if streaming:
+            # Columns past the last product field are never read, don't decode them
+            max_column = min(worksheet.max_column, schema.max_column)
+            rows = enumerate(worksheet.iter_rows(min_row=first_row, max_row=worksheet.max_row,
+                                                 max_col=max_column, values_only=True), start=first_row)
+        else:
+            rows = ((row_num, tuple(cell.value for cell in worksheet[row_num]))
+                    for row_num in range(first_row, worksheet.max_row + 1))
+        
+        mongo_client = mongo_sink = None
+        if mongo_uri:
+            mongo_client, mongo_db = open_database(mongo_uri)
+            mongo_sink = MongoProductSink(mongo_db, output_path, batch_size=mongo_batch_size,
+                                          overwrite=mongo_overwrite, image_pack=image_pack)
+            print(f"Loading products into MongoDB database {mongo_db.name} ({mongo_batch_size} per batch)\n")
+        
+        index_builder = SearchIndexBuilder() if search_index else None
+        columns_builder = PriceColumnsBuilder() if price_columns else None
+        categorizer = ProductCategorizer()
+        
+        products = []
+        product_count = 0
+        products_with_images = 0
+        row_matched = 0
+        neighbour_matched = 0
+        images_matched = 0
+        first_product_seconds = None
+        
+        if checkpoint.state:
+            # Products written before the checkpoint go to the in-memory outputs
+            # again; the products file and MongoDB already have them
+            for product in iter_written_products(json_path, checkpoint.output_bytes):
+                categorizer.categorize(product)
+                if manifest:
+                    manifest.record_product(product)
+                if index_builder is not None:
+                    index_builder.add(product)
+                if columns_builder is not None:
+                    columns_builder.add(product)
+                if not streaming:
+                    products.append(product)
+            product_count = checkpoint.products
+            counters = checkpoint.value('counters', {})
+            products_with_images = counters.get('productsWithImages', 0)
+            row_matched = counters.get('rowMatched', 0)
+            neighbour_matched = counters.get('neighbourMatched', 0)
+            images_matched = counters.get('imagesMatched', 0)
+            decoder.errors.extend(CellError(**error) for error in checkpoint.value('cellErrors', []))
+            if mongo_sink:
+                mongo_sink.stats.update(checkpoint.value('mongo') or {})
+        
+        def media_state():
+            # The media thread may still be adding images in pipelined mode
+            return {member: {key: image[key] for key in ('filename', 'size', 'digest') if key in image}
+                    for member, image in list(xlsx_images.items())}
+        
+        # Products start below the header row
+        # Images start from row 8, but products might start earlier
+        with open(json_path, 'r+' if checkpoint.state else 'w', encoding='utf-8') as f:
+            if checkpoint.state:
+                # Drop whatever was written after the checkpoint
+                f.truncate(checkpoint.output_bytes)
+                f.seek(checkpoint.output_bytes)
+            products_writer = WRITERS[output_format](f)
+            products_writer.count = checkpoint.products
+            writer = TimedWriter(products_writer)
+            
+            def save_checkpoint(last_row):
+                # Everything up to last_row has to be durable before the checkpoint points at it
+                if mongo_sink:
+                    mongo_sink.flush()
+                checkpoint.save(f, last_row, product_count, media_state(),
+                                counters={'productsWithImages': products_with_images, 'rowMatched': row_matched,
+                                          'neighbourMatched': neighbour_matched, 'imagesMatched': images_matched},
+                                cellErrors=[error._asdict() for error in list(decoder.errors) if error.row <= last_row],
+                                mongo=dict(mongo_sink.stats) if mongo_sink else None)
+            
+            def emit(item):
+                nonlocal product_count, images_matched, products_with_images, row_matched, neighbour_matched
+                nonlocal first_product_seconds
+                product, matches = item
+                if first_product_seconds is None:
+                    first_product_seconds = time.perf_counter() - metrics.started
+                product_count += 1
+                images_matched += len(matches)
+                if product['图片']:
+                    products_with_images += 1
+                if any(m['method'] == 'anchor' for m in matches):
+                    row_matched += 1
+                elif matches:
+                    neighbour_matched += 1
                 
-                if row:
-                    # Map row to image
-                    # The image index in worksheet._images corresponds to the order in xlsx_images
-                    image_list = sorted(xlsx_images.keys())
-                    if idx < len(image_list):
-                        image_path = image_list[idx]
-                        # Store mapping: row -> image data
-                        row_to_image_map[row] = xlsx_images[image_path]
-                        xlsx_images[image_path]['excel_row'] = row
-                        
-                        if idx < 10:
-                            print(f"  Image {idx + 1}: Row {row}, Column {col or 'N/A'}")
-            except Exception as e:
-                if idx < 5:
-                    print(f"  Warning: Could not get position for image {idx + 1}: {e}")
-    
-    print(f"\nMapped {len(row_to_image_map)} images to rows\n")
-    
-    # Step 3: Extract product data
-    print("=== Step 3: Extracting product data ===\n")
-    
-    products = []
-    sequential_image_index = 0
-    image_list_sorted = sorted(xlsx_images.values(), key=lambda x: x['index'])
-    
-    # Extract products starting from row 3 (skip first 2 header rows)
-    # Images start from row 8, but products might start earlier
-    for row_num in range(1, worksheet.max_row + 1):
-        row = worksheet[row_num]
-        
-        # Skip first 2 rows (definitely headers)
-        if row_num <= 2:
-            continue
-        
-        # In openpyxl, row indexing starts from 1: row[1] = column A, row[2] = column B, etc.
-        # Get product code from column A (row[1]) and name from column B (row[2])
-        product_code = ''
-        product_name = ''
-        
-        if len(row) >= 1 and row[1].value:
-            product_code = str(row[1].value).strip()
-        if len(row) >= 2 and row[2].value:
-            product_name = str(row[2].value).strip()
-        
-        # Skip if no product name
-        if not product_name or product_name == '':
-            continue
-        
-        # Skip only obvious header rows (very strict - only exact matches)
-        if product_code == '序号' or product_name == '名称' or product_name == '产品图':
-            continue
-        
-        # Extract product data (columns: A=1, B=2, C=3, D=4, E=5, F=6, G=7, H=8, I=9, J=10, K=11, L=12)
-        battery_model = str(row[3].value).strip() if len(row) >= 3 and row[3].value else '无'
-        unit = str(row[4].value).strip() if len(row) >= 4 and row[4].value else ''
-        cost_price = float(row[5].value) if len(row) >= 5 and row[5].value else 0
-        quantity = int(row[6].value) if len(row) >= 6 and row[6].value else 0
-        specification = str(row[7].value).strip() if len(row) >= 7 and row[7].value else ''
-        amount = float(row[8].value) if len(row) >= 8 and row[8].value else 0
-        suggested_price = float(row[9].value) if len(row) >= 9 and row[9].value else 0
-        market_value = float(row[10].value) if len(row) >= 10 and row[10].value else 0
-        barcode = str(row[11].value).strip() if len(row) >= 11 and row[11].value else ''
-        weight = float(row[12].value) if len(row) >= 12 and row[12].value else 0
-        
-        # Match image to this row
-        matched_image = None
-        
-        # Method 1: Use row-based mapping if available (best method)
-        if row_num in row_to_image_map:
-            matched_image = row_to_image_map[row_num]
-        # Method 2: Check nearby rows (images might be slightly offset)
-        elif (row_num + 1) in row_to_image_map:
-            matched_image = row_to_image_map[row_num + 1]
-        elif (row_num - 1) in row_to_image_map:
-            matched_image = row_to_image_map[row_num - 1]
-        # Method 3: Use sequential index (fallback)
-        elif sequential_image_index < len(image_list_sorted):
-            matched_image = image_list_sorted[sequential_image_index]
-            sequential_image_index += 1
-        
-        # Build image array
-        matched_images = []
-        if matched_image:
-            matched_images.append({
-                'filename': matched_image['filename'],
-                'path': matched_image['path'],
-                'size': matched_image['size']
-            })
+                if manifest:
+                    manifest.record_product(product)
+                
+                # Products are written as they are produced in every mode
+                writer.write(product)
+                if mongo_sink:
+                    mongo_sink.write(product)
+                if index_builder is not None:
+                    index_builder.add(product)
+                if columns_builder is not None:
+                    columns_builder.add(product)
+                if checkpoint.due():
+                    save_checkpoint(product['rowNumber'])
+            
+            # Media extracted so far are recorded straight away
+            save_checkpoint(checkpoint.last_row)
+            
+            parsed = _parse_products(rows, decoder, categorizer)
+            if pipelined:
+                # Rows are decoded and products written in their own threads
+                parsed = Producer(parsed, name='row-decoding')
+                output = Consumer(emit, name='output')
+            
+            try:
+                for product, matches in _iter_products(parsed, image_index, resolve_image,
+                                                       after_row=checkpoint.last_row or None):
+                    if pipelined:
+                        output.put((product, matches))
+                    else:
+                        emit((product, matches))
+                    if not streaming:
+                        products.append(product)
+            except BaseException:
+                if pipelined:
+                    # A warm process outlives the run, don't leave the output thread waiting
+                    output.abort()
+                raise
+            
+            if pipelined:
+                output.close()
+            print(f"\nExtracted {product_count} products\n")
+            
+            # Step 4: Save results
+            print("=== Step 4: Saving results ===\n")
+            
+            writer.close()
+        
+        mongo_stats = None
+        if mongo_sink:
+            mongo_stats = mongo_sink.close()
+            mongo_client.close()
+        
+        index_path = None
+        if index_builder is not None:
+            index_path = output_path / SEARCH_INDEX_NAME
+            index_size = index_builder.save(index_path)
+            print(f"Search index saved to: {index_path} ({index_size/1024:.1f} KB)\n")
+        
+        price_report = None
+        if columns_builder is not None:
+            columns_size = columns_builder.save(output_path / PRICE_COLUMNS_NAME)
+            print(f"Price columns saved to: {output_path / PRICE_COLUMNS_NAME} ({columns_size/1024:.1f} KB)")
+            # The whole sheet is in the columns, check it in one pass
+            price_report = columns_builder.validate()
+            print(f"Price report saved to: {save_price_report(price_report, output_path)}\n")
         
-        product = {
-            'rowNumber': row_num,
-            '序号': product_code,
-            '名称': product_name,
-            '电池型号': battery_model,
-            '单位': unit,
-            '价格': cost_price,
-            '数量': quantity,
-            '规格': specification,
-            '金额': amount,
-            '建议价': suggested_price,
-            '市值': market_value,
-            '条码': barcode,
-            '重量KG': weight,
-            '图片': matched_images
+        sink_seconds = ((mongo_sink.seconds if mongo_sink else 0.0) + (index_builder.seconds if index_builder is not None else 0.0)
+                        + (columns_builder.seconds if columns_builder is not None else 0.0) + checkpoint.seconds)
+        if pipelined:
+            media_stage.join()
+            finish_media(media_stage.seconds)
+            # Stages overlap, each one records the time it was busy
+            metrics.record('row_parsing', parsed.seconds, rows=worksheet.max_row, products=product_count)
+        else:
+            # Rows are parsed lazily between writes, split the stages apart
+            metrics.record('row_parsing', time.perf_counter() - stage_started - writer.seconds - sink_seconds,
+                           rows=worksheet.max_row, products=product_count)
+        metrics.record('output_write', writer.seconds, products=product_count,
+                       bytes_written=json_path.stat().st_size)
+        if mongo_sink:
+            metrics.record('mongo_load', mongo_sink.seconds, products=product_count)
+        if index_builder is not None:
+            metrics.record('search_index', index_builder.seconds, products=product_count, bytes_written=index_size)
+        if columns_builder is not None:
+            metrics.record('price_columns', columns_builder.seconds, products=product_count, bytes_written=columns_size)
+        metrics.record('checkpoint', checkpoint.seconds, checkpoints=checkpoint.saves)
+        if image_pack is not None:
+            pack_size = image_pack.close()
+            print(f"Images packed into: {image_pack.path} ({len(image_pack)} images, {pack_size/1024:.1f} KB)\n")
+        if pipelined:
+            metrics.record('pipeline', time.perf_counter() - pipeline_started, products=product_count)
+        
+        if streaming:
+            workbook.close()
+        
+        print(f"Products data saved to: {json_path}\n")
+        
+        # Summary
+        summary = {
+            'totalProducts': product_count,
+            'totalImages': len(xlsx_images),
+            'productsWithImages': products_with_images,
+            'imagesMappedByPosition': row_matched,
+            'imagesMappedToNeighbourRows': neighbour_matched,
+            'unmatchedImages': len(image_index) - images_matched,
+            'extractionDate': datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+            'note': 'Images matched to the row holding most of each drawing anchor, with nearest-product fallback'
         }
+        if dedupe:
+            summary['uniqueImages'] = len(stored_digests)
+            summary['duplicateImages'] = duplicate_images
+            summary['bytesSaved'] = bytes_saved
         
-        products.append(product)
+        if manifest:
+            delta_path, delta = manifest.save(output_path, Path(excel_path).name)
+            summary['addedProducts'] = len(delta['added'])
+            summary['changedProducts'] = len(delta['changed'])
+            summary['removedProducts'] = len(delta['removed'])
+            summary['newImages'] = len(delta['newImages'])
+            summary['reusedImages'] = reused_images
+            print(f"Delta saved to: {delta_path}\n")
         
-        if len(products) <= 5:
-            img_info = matched_images[0]['filename'] if matched_images else 'None'
-            match_method = 'row' if row_num in row_to_image_map else 'index'
-            print(f"  Product {len(products)}: \"{product_name[:40]}...\" - Row {row_num}, Image: {img_info} ({match_method})")
-    
-    print(f"\nExtracted {len(products)} products\n")
-    
-    # Step 4: Save results
-    print("=== Step 4: Saving results ===\n")
-    
-    json_path = output_path / "extracted_products_with_images.json"
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(products, f, ensure_ascii=False, indent=2)
-    
-    print(f"Products data saved to: {json_path}\n")
-    
-    # Summary
-    products_with_images = sum(1 for p in products if p['图片'] and len(p['图片']) > 0)
-    row_matched = sum(1 for p in products if p['rowNumber'] in row_to_image_map)
-    
-    print("=== Extraction Summary ===")
-    print(f"Total products: {len(products)}")
-    print(f"Total images: {len(xlsx_images)}")
-    print(f"Products with images: {products_with_images}")
-    print(f"Images matched by row position: {row_matched}")
-    print(f"Images matched by sequential index: {products_with_images - row_matched}")
-    print(f"\nExtraction complete!")
-    
-    return {
-        'products': products,
-        'images': list(xlsx_images.values()),
-        'output_path': str(json_path)
-    }
+        if checkpoint.state:
+            summary['resumedAfterRow'] = checkpoint.last_row
+            summary['resumedImages'] = resumed_images
+        if mongo_stats:
+            summary['mongo'] = mongo_stats
+        if index_path:
+            summary['searchIndex'] = index_path.name
+        if price_report:
+            summary['priceColumns'] = PRICE_COLUMNS_NAME
+            summary['amountMismatches'] = len(price_report['amountMismatches'])
+            summary['priceOutliers'] = len(price_report['priceOutliers'])
+            summary['markupOutliers'] = len(price_report['markupOutliers'])
+        if image_pack is not None:
+            summary['imagePack'] = IMAGE_PACK_NAME
+            summary['imagePackBytes'] = pack_size
+        summary['columns'] = decoder.schema.letters()
+        summary['cellErrors'] = [error._asdict() for error in decoder.errors]
+        summary['categories'] = dict(categorizer.counts.most_common())
+        summary['ambiguousCategories'] = len(categorizer.ambiguous)
+        category_report_path = categorizer.save_report(output_path)
+        print(f"Category report saved to: {category_report_path}")
+        
+        summary_path = output_path / "extraction_summary.json"
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"Summary saved to: {summary_path}\n")
+        
+        metrics_report = metrics.save(output_path, excel_file=Path(excel_path).name, worksheet=worksheet.title,
+                                      engine=engine, streaming=streaming, pipelined=pipelined, workers=workers,
+                                      output_format=output_format,
+                                      first_product_seconds=None if first_product_seconds is None
+                                      else round(first_product_seconds, 4))
+        # The run is complete, a later --resume has nothing to continue
+        checkpoint.remove()
+        
+        print("=== Extraction Summary ===")
+        print(f"Total products: {product_count}")
+        print(f"Total images: {len(xlsx_images)}")
+        print(f"Products with images: {products_with_images}")
+        print(f"Images matched by row position: {row_matched}")
+        print(f"Images matched to a neighbouring row: {neighbour_matched}")
+        print(f"Anchored images without a product: {summary['unmatchedImages']}")
+        if first_product_seconds is not None:
+            print(f"Time to first product: {first_product_seconds:.3f}s")
+        if dedupe:
+            print(f"Unique images stored: {len(stored_digests)}")
+            print(f"Duplicate images: {duplicate_images} ({bytes_saved/1024:.2f} KB saved)")
+        if manifest:
+            print(f"Added products: {summary['addedProducts']}")
+            print(f"Changed products: {summary['changedProducts']}")
+            print(f"Removed products: {summary['removedProducts']}")
+            print(f"New images: {summary['newImages']}")
+        if decoder.errors:
+            print()
+            decoder.print_errors()
+        print()
+        categorizer.print_summary()
+        if price_report:
+            print()
+            print_price_report(price_report)
+        if mongo_stats:
+            print()
+            print_stats(mongo_stats)
+        print()
+        metrics.print_table()
+        print(f"\nExtraction complete!")
+        
+        if derivatives:
+            print()
+            build_derivatives(output_path, json_name=json_path.name)
+        
+        finished = True
+        return {
+            # Streaming mode never holds the full product list
+            'products': None if streaming else products,
+            'product_count': product_count,
+            'images': list(xlsx_images.values()),
+            'summary': summary,
+            'metrics': metrics_report,
+            'output_path': str(json_path)
+        }
+    finally:
+        if not finished:
+            _abandon_run(media_stage, image_pack, workbook, mongo_client)
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print("Usage: python extract_with_openpyxl_improved.py <excel-file> [output-dir]")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description='Extract products and images from an Excel price list')
+    parser.add_argument('excel_file', help='Path to the .xlsx file')
+    parser.add_argument('output_dir', nargs='?', default='../extracted_data_openpyxl',
+                        help='Output directory (default: ../extracted_data_openpyxl)')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Read rows with the read-only iterator and write products as they are parsed')
+    parser.add_argument('--pipelined', action='store_true',
+                        help='Overlap image extraction, row decoding, matching and writing (implies --streaming)')
+    parser.add_argument('--engine', choices=ENGINES, default='openpyxl',
+                        help='Row reader: openpyxl (default) or raw, which decodes the sheet XML directly (implies --streaming)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Threads used to extract images (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--dedupe', action='store_true',
+                        help='Store each distinct image once under its SHA-256 digest')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only re-extract changed images and write a delta against the previous run (implies --dedupe)')
+    parser.add_argument('--derivatives', action='store_true',
+                        help='Render thumbnail/card/detail WebP variants of every image after extraction')
+    parser.add_argument('--sheet', dest='sheet_name', default=None,
+                        help='Worksheet to extract (default: the active sheet)')
+    parser.add_argument('--format', dest='output_format', choices=sorted(WRITERS), default='json',
+                        help='Products file format: json (pretty, default), compact or ndjson')
+    parser.add_argument('--mongo-uri', default=None,
+                        help='Also upsert products into MongoDB (e.g. mongodb://localhost:27017/cms_ecommerce)')
+    parser.add_argument('--mongo-batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f'Products per MongoDB bulk write (default: {DEFAULT_BATCH_SIZE})')
+    parser.add_argument('--mongo-overwrite', action='store_true',
+                        help='Update products that already exist in MongoDB')
+    parser.add_argument('--search-index', action='store_true',
+                        help=f'Also write {SEARCH_INDEX_NAME} (name n-grams, 条码/序号 and 建议价 index) for the backend')
+    parser.add_argument('--price-columns', action='store_true',
+                        help=f'Also write {PRICE_COLUMNS_NAME} (typed 价格/数量/金额/建议价/市值/重量KG columns) and check the prices')
+    parser.add_argument('--pack-images', action='store_true',
+                        help=f'Write images into one {IMAGE_PACK_NAME} blob with an offset index instead of one file each')
+    parser.add_argument('--checkpoint-interval', type=float, default=DEFAULT_CHECKPOINT_INTERVAL,
+                        help=f'Seconds between checkpoints of the output written so far (default: {DEFAULT_CHECKPOINT_INTERVAL:g})')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue an interrupted run from its last checkpoint in the output directory')
+    parser.add_argument('--profile', action='store_true',
+                        help=f'Write a cProfile dump to {PROFILE_NAME} in the output directory')
+    args = parser.parse_args()
     
-    excel_path = sys.argv[1]
-    output_dir = sys.argv[2] if len(sys.argv) > 2 else '../extracted_data_openpyxl'
+    excel_path = args.excel_file
+    output_dir = args.output_dir
     
     if not os.path.exists(excel_path):
         print(f"Error: Excel file not found: {excel_path}")
         sys.exit(1)
+    if args.checkpoint_interval < 0:
+        print("Error: --checkpoint-interval can't be negative")
+        sys.exit(1)
+    if args.pack_images and (args.incremental or args.derivatives):
+        print("Error: --pack-images can't be combined with --incremental or --derivatives")
+        sys.exit(1)
+    
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
     
     try:
-        extract_with_openpyxl_improved(excel_path, output_dir)
+        extract_with_openpyxl_improved(excel_path, output_dir, streaming=args.streaming, pipelined=args.pipelined,
+                                       engine=args.engine,
+                                       workers=args.workers,
+                                       dedupe=args.dedupe, incremental=args.incremental,
+                                       derivatives=args.derivatives, output_format=args.output_format,
+                                       sheet_name=args.sheet_name, mongo_uri=args.mongo_uri,
+                                       mongo_batch_size=args.mongo_batch_size,
+                                       mongo_overwrite=args.mongo_overwrite,
+                                       search_index=args.search_index, pack_images=args.pack_images,
+                                       price_columns=args.price_columns,
+                                       checkpoint_interval=args.checkpoint_interval, resume=args.resume)
     except Exception as e:
         print(f"\nError: {e}")
         import traceback
         traceback.print_exc()
         sys.exit(1)
-
+    finally:
+        if profiler:
+            profiler.disable()
+            profile_path = Path(output_dir) / PROFILE_NAME
+            profiler.dump_stats(profile_path)
+            print(f"Profile saved to: {profile_path} (view with: python -m pstats {profile_path})")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Per-stage instrumentation for the extractors
+Records wall time, throughput (rows/sec, images/sec), bytes written and the
+resident set size when it finished for each stage, plus the peak RSS of the
+whole run, and saves them as extraction_metrics.json next to
+extraction_summary.json. The peak (ru_maxrss) only ever grows over the life of
+the process, so it is reported once for the run, not per stage.
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRICS_NAME = 'extraction_metrics.json'
+PROFILE_NAME = 'extraction_profile.prof'
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None if unavailable)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    peak = round(peak / divisor, 2)
+    # Linux only updates ru_maxrss now and then, it can trail the current size
+    current = current_rss_mb()
+    return max(peak, current) if current is not None else peak
+
+
+def current_rss_mb():
+    """Resident set size of this process right now, in MB (None where /proc isn't available)"""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 2)
+
+
+class TimedWriter:
+    """Wrap a products writer and accumulate the time spent writing"""
+    def __init__(self, writer):
+        self.writer = writer
+        self.seconds = 0.0
+
+    def write(self, product):
+        started = time.perf_counter()
+        self.writer.write(product)
+        self.seconds += time.perf_counter() - started
+
+    def close(self):
+        started = time.perf_counter()
+        self.writer.close()
+        self.seconds += time.perf_counter() - started
+
+
+class StageMetrics:
+    """
+    Collects one entry per stage; counters named rows/products/images get a
+    matching per-second rate
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    def record(self, name, seconds, **counters):
+        stage = {'seconds': round(seconds, 4)}
+        for key, value in counters.items():
+            stage[key] = value
+            if key in ('rows', 'products', 'images') and seconds > 0:
+                stage[f"{key}_per_sec"] = round(value / seconds, 1)
+        stage['rss_mb'] = current_rss_mb()
+        self.stages[name] = stage
+        return stage
+
+    def peak_rss_mb(self):
+        """Peak RSS of the run, at least as high as any stage's RSS"""
+        sizes = [size for size in (peak_rss_mb(), *(s['rss_mb'] for s in self.stages.values())) if size is not None]
+        return max(sizes) if sizes else None
+
+    def report(self, **extra):
+        stages_bytes = sum(s.get('bytes_written', 0) for s in self.stages.values())
+        return {
+            'date': datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+            'total_seconds': round(time.perf_counter() - self.started, 4),
+            'bytes_written': stages_bytes,
+            'peak_rss_mb': self.peak_rss_mb(),
+            **extra,
+            'stages': self.stages
+        }
+
+    def save(self, output_dir, **extra):
+        """Write the report to extraction_metrics.json and return it"""
+        report = self.report(**extra)
+        with open(Path(output_dir) / METRICS_NAME, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return report
+
+    def print_table(self):
+        print("=== Stage Metrics ===")
+        for name, stage in self.stages.items():
+            rates = ', '.join(f"{v} {k.replace('_per_sec', '')}/s" for k, v in stage.items() if k.endswith('_per_sec'))
+            rss = f"  {stage['rss_mb']} MB" if stage['rss_mb'] is not None else ''
+            print(f"  {name:<14} {stage['seconds']:>9.3f}s{rss}" + (f"  ({rates})" if rates else ''))
+        print(f"  Peak RSS: {self.peak_rss_mb()} MB")
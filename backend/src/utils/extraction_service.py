@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Long-running extraction service for the daily supplier updates
+A run of extract_with_openpyxl_improved.py starts an interpreter and imports
+openpyxl before it reads a single row, which is most of the time a small
+update takes. The service keeps one process with the extraction modules
+loaded and a PartCache (part_cache.py) of the shared strings and drawing
+anchors parsed so far, keyed by part digest, so a workbook that only changed
+its prices skips those parts too. Workbooks come in two ways:
+
+- dropped into an inbox directory (--inbox): each new .xlsx is extracted
+  into <output root>/<workbook name>/ once its size stops changing, then
+  moved to inbox/done/ (or inbox/failed/)
+- as requests on a Unix socket (--socket, readable by its owner only) or a
+  local TCP port (--port, with the shared token of --token-file): one JSON
+  line per connection, {"workbook": ..., "output_dir": ..., options},
+  answered with one JSON line reporting the job. `submit` sends one.
+  output_dir must lie under the output root
+
+Jobs run one at a time. Each one reports its total time and its time to
+first product. The submit client doesn't import the extractor at all, so it
+starts as fast as plain Python.
+"""
+import argparse
+import contextlib
+import hmac
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+
+from output_writers import WRITERS
+from part_cache import DEFAULT_MAX_ENTRIES, PartCache
+
+DEFAULT_PORT = 8765
+DEFAULT_POLL_SECONDS = 1.0
+DONE_DIR = 'done'
+FAILED_DIR = 'failed'
+LOG_NAME = 'extract.log'
+# extract_with_openpyxl_improved keyword arguments a request may set
+REQUEST_OPTIONS = ('sheet_name', 'engine', 'dedupe', 'incremental', 'output_format', 'search_index',
+                   'price_columns', 'pack_images', 'workers')
+
+
+class ExtractionService:
+    """
+    Runs extractions in this process, one at a time, sharing one PartCache
+    options are passed to every extraction; a job's own options override them
+    """
+    def __init__(self, output_root, max_cache_entries=DEFAULT_MAX_ENTRIES, **options):
+        started = time.perf_counter()
+        # Loaded once here instead of at the top, so submit never pays for openpyxl
+        from extract_with_openpyxl_improved import extract_with_openpyxl_improved
+        self.extract_workbook = extract_with_openpyxl_improved
+        self.import_seconds = time.perf_counter() - started
+        self.output_root = Path(output_root)
+        self.options = options
+        self.cache = PartCache(max_cache_entries)
+        self.lock = threading.Lock()
+        # Extraction progress is redirected into each job's log, service messages are not
+        self.out = sys.stdout
+        self.jobs = 0
+
+    def log(self, message):
+        print(message, file=self.out, flush=True)
+
+    def output_dir(self, workbook, output_dir=None):
+        """
+        Where a job writes: output_dir (relative to the output root, or
+        absolute) or <output root>/<workbook stem>. Raises ValueError for a
+        directory that doesn't resolve to one inside the output root
+        """
+        root = self.output_root.resolve()
+        target = (root / (output_dir or Path(workbook).stem)).resolve()
+        if target == root or not target.is_relative_to(root):
+            raise ValueError(f"Output directory is not inside {root}: {output_dir}")
+        return target
+
+    def extract(self, workbook, output_dir=None, **options):
+        """
+        Extract one workbook into output_dir (see output_dir()), with its
+        progress in extract.log there. Returns the job report
+        """
+        workbook = Path(workbook)
+        output_dir = self.output_dir(workbook, output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            hits, misses = self.cache.hits, self.cache.misses
+            started = time.perf_counter()
+            result = error = None
+            with open(output_dir / LOG_NAME, 'w', encoding='utf-8') as log, contextlib.redirect_stdout(log):
+                try:
+                    result = self.extract_workbook(workbook, output_dir, part_cache=self.cache,
+                                                   **{**self.options, **options})
+                    if result is None:
+                        error = f"extraction failed, see {output_dir / LOG_NAME}"
+                except Exception as e:
+                    traceback.print_exc(file=log)
+                    error = str(e)
+            self.jobs += 1
+            report = {
+                'workbook': str(workbook),
+                'outputDir': str(output_dir),
+                'products': result['product_count'] if result else 0,
+                'seconds': round(time.perf_counter() - started, 4),
+                'firstProductSeconds': result['metrics'].get('first_product_seconds') if result else None,
+                'cachedParts': self.cache.hits - hits,
+                'parsedParts': self.cache.misses - misses,
+                'error': error
+            }
+            self.log(describe(report))
+        return report
+
+
+def describe(report):
+    """One line about a finished job"""
+    name = Path(report['workbook']).name
+    if report['error']:
+        return f"  {name}: failed after {report['seconds']:.2f}s: {report['error']}"
+    first = report['firstProductSeconds']
+    first = f"first product after {first:.3f}s" if first is not None else "no products"
+    return (f"  {name}: {report['products']} products in {report['seconds']:.2f}s ({first}, "
+            f"{report['cachedParts']} parts from cache, {report['parsedParts']} parsed)")
+
+
+def _workbook_states(inbox):
+    """(size, modification time) of every workbook in inbox, Excel lock files skipped"""
+    states = {}
+    for path in sorted(inbox.glob('*.xlsx')):
+        if path.name.startswith(('~$', '.')):
+            continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        states[path] = (stat.st_size, stat.st_mtime_ns)
+    return states
+
+
+def watch_inbox(service, inbox, poll=DEFAULT_POLL_SECONDS, stop=None):
+    """
+    Extract every workbook that appears in inbox once its size and
+    modification time held still for one poll (a copy has finished), then
+    move it to inbox/done/ or inbox/failed/. Runs until stop is set
+    """
+    inbox = Path(inbox)
+    for name in (DONE_DIR, FAILED_DIR):
+        (inbox / name).mkdir(parents=True, exist_ok=True)
+    stop = stop or threading.Event()
+    previous = {}
+    while not stop.is_set():
+        states = _workbook_states(inbox)
+        for path, state in states.items():
+            if previous.get(path) != state:
+                continue
+            report = service.extract(path)
+            os.replace(path, inbox / (FAILED_DIR if report['error'] else DONE_DIR) / path.name)
+        previous = states
+        stop.wait(poll)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """One JSON request line in, one JSON report line out"""
+    def handle(self):
+        service = self.server.service
+        try:
+            request = json.loads(self.rfile.readline())
+            if not isinstance(request, dict):
+                raise ValueError("Request is not a JSON object")
+            token = request.pop('token', None)
+            if self.server.token is not None and not (
+                    isinstance(token, str) and hmac.compare_digest(token.encode('utf-8'), self.server.token)):
+                raise ValueError("Missing or wrong token")
+            if 'workbook' not in request:
+                raise ValueError("Request has no workbook")
+            workbook = request.pop('workbook')
+            output_dir = request.pop('output_dir', None)
+            unknown = sorted(set(request) - set(REQUEST_OPTIONS))
+            if unknown:
+                raise ValueError(f"Unknown options: {', '.join(unknown)}")
+            if not os.path.exists(workbook):
+                raise ValueError(f"Excel file not found: {workbook}")
+            report = service.extract(workbook, output_dir, **request)
+        except ValueError as e:
+            report = {'error': str(e)}
+            service.log(f"  Rejected request: {e}")
+        self.wfile.write((json.dumps(report, ensure_ascii=False) + '\n').encode('utf-8'))
+
+
+class _RequestServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _UnixRequestServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        # Created owner-only, so there is no moment another user can connect
+        with _umask(0o177):
+            super().server_bind()
+
+    def server_close(self):
+        super().server_close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.server_address)
+
+
+@contextlib.contextmanager
+def _umask(mask):
+    previous = os.umask(mask)
+    try:
+        yield
+    finally:
+        os.umask(previous)
+
+
+def read_token(token_file):
+    """The shared token in token_file, without surrounding whitespace"""
+    token = Path(token_file).read_text(encoding='utf-8').strip()
+    if not token:
+        raise ValueError(f"Token file is empty: {token_file}")
+    return token
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def listen(service, port=None, socket_path=None, token=None):
+    """
+    Request servers for service on the Unix socket socket_path and on
+    127.0.0.1:port, not serving yet. Anyone on the machine can reach the
+    port, so it needs token
+    """
+    if port is not None and not token:
+        raise ValueError("Requests on a TCP port need a token")
+    servers = []
+    if socket_path is not None:
+        server = _UnixRequestServer(str(socket_path), _RequestHandler)
+        server.token = None
+        servers.append(server)
+    if port is not None:
+        server = _RequestServer(('127.0.0.1', port), _RequestHandler)
+        server.token = token.encode('utf-8')
+        servers.append(server)
+    for server in servers:
+        server.service = service
+    return servers
+
+
+def serve(service, inbox=None, port=None, poll=DEFAULT_POLL_SECONDS, socket_path=None, token=None):
+    """
+    Watch inbox and/or answer requests on socket_path and 127.0.0.1:port
+    (see listen()) until interrupted (Ctrl+C, or SIGTERM from a process manager)
+    """
+    servers = listen(service, port, socket_path, token)
+    signal.signal(signal.SIGTERM, _interrupt)
+    for server in servers:
+        address = server.server_address
+        service.log(f"Listening on {address if isinstance(address, str) else f'{address[0]}:{address[1]}'}")
+    if inbox is not None:
+        service.log(f"Watching {inbox} (every {poll:g}s)")
+    try:
+        for server in servers[1:] if inbox is None else servers:
+            threading.Thread(target=server.serve_forever, name='requests', daemon=True).start()
+        if inbox is None:
+            servers[0].serve_forever()
+        else:
+            watch_inbox(service, inbox, poll)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+    service.log(f"Stopped after {service.jobs} jobs")
+
+
+def submit(workbook, output_dir=None, port=DEFAULT_PORT, timeout=None, socket_path=None, token=None,
+           **options):
+    """
+    Ask a running service to extract a workbook and wait for its report,
+    through socket_path when given, otherwise through port with token
+    """
+    request = {'workbook': str(Path(workbook).resolve()), **options}
+    if output_dir:
+        request['output_dir'] = str(Path(output_dir).resolve())
+    if token:
+        request['token'] = token
+    if socket_path is not None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(str(socket_path))
+        except OSError:
+            sock.close()
+            raise
+    else:
+        sock = socket.create_connection(('127.0.0.1', port), timeout=timeout)
+    with sock:
+        sock.sendall((json.dumps(request, ensure_ascii=False) + '\n').encode('utf-8'))
+        with sock.makefile('r', encoding='utf-8') as reply:
+            return json.loads(reply.readline())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Keep an extraction process warm and feed it workbooks')
+    sub = parser.add_subparsers(dest='command', required=True)
+    run = sub.add_parser('serve', help='Run the service')
+    run.add_argument('output_root', help='Each workbook is extracted into <output_root>/<workbook name>/')
+    run.add_argument('--inbox', default=None, help='Directory to watch for new .xlsx files')
+    run.add_argument('--socket', dest='socket_path', default=None,
+                     help='Take requests on this Unix socket, created readable by its owner only')
+    run.add_argument('--port', type=int, default=None,
+                     help='Take requests on this 127.0.0.1 port (needs --token-file)')
+    run.add_argument('--token-file', default=None, help='File holding the token requests on --port must carry')
+    run.add_argument('--poll', type=float, default=DEFAULT_POLL_SECONDS,
+                     help=f'Seconds between inbox scans (default: {DEFAULT_POLL_SECONDS:g})')
+    run.add_argument('--engine', choices=('openpyxl', 'raw'), default='raw',
+                     help='Row reader (default: raw, the engine whose shared strings are cached)')
+    run.add_argument('--format', dest='output_format', choices=sorted(WRITERS), default='json',
+                     help='Products file format: json (pretty, default), compact or ndjson')
+    run.add_argument('--dedupe', action='store_true', help='Store each distinct image once under its SHA-256 digest')
+    run.add_argument('--incremental', action='store_true',
+                     help="Write a delta against the workbook's previous extraction (implies --dedupe)")
+    run.add_argument('--search-index', action='store_true', help='Also write the search index')
+    run.add_argument('--price-columns', action='store_true', help='Also write the price columns and check the prices')
+    run.add_argument('--cache-entries', type=int, default=DEFAULT_MAX_ENTRIES,
+                     help=f'Parsed parts kept in memory (default: {DEFAULT_MAX_ENTRIES})')
+    send = sub.add_parser('submit', help='Send a workbook to a running service')
+    send.add_argument('excel_file')
+    send.add_argument('output_dir', nargs='?', default=None,
+                      help="Output directory (default: the service's <output_root>/<workbook name>)")
+    send.add_argument('--socket', dest='socket_path', default=None, help="The service's Unix socket")
+    send.add_argument('--port', type=int, default=DEFAULT_PORT,
+                      help=f'Service port, when there is no --socket (default: {DEFAULT_PORT})')
+    send.add_argument('--token-file', default=None, help="File holding the service's token, for --port")
+    send.add_argument('--sheet', dest='sheet_name', default=None, help='Worksheet (default: the active sheet)')
+    args = parser.parse_args()
+
+    if args.command == 'submit':
+        if not os.path.exists(args.excel_file):
+            print(f"Error: Excel file not found: {args.excel_file}")
+            sys.exit(1)
+        options = {'sheet_name': args.sheet_name} if args.sheet_name else {}
+        try:
+            token = read_token(args.token_file) if args.token_file else None
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not read the token: {e}")
+            sys.exit(1)
+        address = args.socket_path or f"port {args.port}"
+        try:
+            report = submit(args.excel_file, args.output_dir, port=args.port, socket_path=args.socket_path,
+                            token=token, **options)
+        except OSError as e:
+            print(f"Error: No extraction service on {address}: {e}")
+            sys.exit(1)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        sys.exit(1 if report.get('error') else 0)
+
+    if args.inbox is None and args.port is None and args.socket_path is None:
+        print("Error: Give --inbox, --socket, --port or several of them")
+        sys.exit(1)
+    token = None
+    if args.port is not None:
+        if not args.token_file:
+            print("Error: --port needs --token-file, anyone on this machine can reach the port")
+            sys.exit(1)
+        try:
+            token = read_token(args.token_file)
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not read the token: {e}")
+            sys.exit(1)
+    if args.inbox is not None and not os.path.isdir(args.inbox):
+        print(f"Error: Directory not found: {args.inbox}")
+        sys.exit(1)
+
+    service = ExtractionService(args.output_root, max_cache_entries=args.cache_entries, engine=args.engine,
+                                output_format=args.output_format, dedupe=args.dedupe,
+                                incremental=args.incremental, search_index=args.search_index,
+                                price_columns=args.price_columns)
+    service.log(f"Extraction modules loaded in {service.import_seconds:.2f}s")
+    serve(service, args.inbox, args.port, args.poll, socket_path=args.socket_path, token=token)
@@ -0,0 +1,120 @@
+/**
+ * Reader for the packed image archive written by image_pack.py
+ * All images live in one blob; the <pack>.json index gives each file name's
+ * offset, length, content type and SHA-256. Images are served with range
+ * reads on one open file descriptor instead of one file per picture.
+ */
+
+const fs = require('fs');
+const path = require('path');
+
+const VERSION = 1;
+
+class ImagePack {
+  constructor(packPath, index) {
+    if (index.version !== VERSION) {
+      throw new Error(`Not a version ${VERSION} image pack`);
+    }
+    this.packPath = packPath;
+    this.fd = fs.openSync(packPath, 'r');
+    this.entries = new Map(Object.entries(index.entries));
+    // mongo_loader.py names uploaded copies <sha256><ext>, serve those names too
+    for (const [name, entry] of Object.entries(index.entries)) {
+      const alias = `${entry.digest}${path.extname(name).toLowerCase() || '.jpeg'}`;
+      if (!this.entries.has(alias)) {
+        this.entries.set(alias, entry);
+      }
+    }
+  }
+
+  get size() {
+    return this.entries.size;
+  }
+
+  entry(name) {
+    return this.entries.get(path.basename(name));
+  }
+
+  read(name) {
+    const entry = this.entry(name);
+    if (!entry) {
+      return null;
+    }
+    const data = Buffer.alloc(entry.length);
+    fs.readSync(this.fd, data, 0, entry.length, entry.offset);
+    return data;
+  }
+
+  /**
+   * Express handler for GET /<name>, honouring a single Range header.
+   * Names that aren't in the pack go on to the next handler.
+   */
+  middleware() {
+    return (req, res, next) => {
+      if (req.method !== 'GET' && req.method !== 'HEAD') {
+        return next();
+      }
+      let entry;
+      try {
+        entry = this.entry(decodeURIComponent(req.path));
+      } catch (error) {
+        return next();
+      }
+      if (!entry) {
+        return next();
+      }
+      const etag = `"${entry.digest}"`;
+      if (req.headers['if-none-match'] === etag) {
+        res.status(304).set('ETag', etag).end();
+        return;
+      }
+
+      let start = 0;
+      let end = entry.length - 1;
+      const range = /^bytes=(\d*)-(\d*)$/.exec(req.headers.range || '');
+      if (range && (range[1] || range[2])) {
+        if (range[1]) {
+          start = Number(range[1]);
+          end = range[2] ? Math.min(Number(range[2]), end) : end;
+        } else {
+          start = Math.max(entry.length - Number(range[2]), 0);
+        }
+        if (start > end) {
+          res.status(416).set('Content-Range', `bytes */${entry.length}`).end();
+          return;
+        }
+        res.status(206).set('Content-Range', `bytes ${start}-${end}/${entry.length}`);
+      }
+
+      res.set({
+        'Content-Type': entry.contentType,
+        'Content-Length': end - start + 1,
+        'Accept-Ranges': 'bytes',
+        ETag: etag
+      });
+      if (req.method === 'HEAD' || entry.length === 0) {
+        res.end();
+        return;
+      }
+      fs.createReadStream(null, {
+        fd: this.fd,
+        autoClose: false,
+        start: entry.offset + start,
+        end: entry.offset + end
+      }).on('error', next).pipe(res);
+    };
+  }
+}
+
+/**
+ * Load a pack, or return null when no path is given or it doesn't exist
+ */
+function loadImagePack(packPath) {
+  const indexPath = `${packPath}.json`;
+  if (!packPath || !fs.existsSync(packPath) || !fs.existsSync(indexPath)) {
+    return null;
+  }
+  return new ImagePack(packPath, JSON.parse(fs.readFileSync(indexPath, 'utf8')));
+}
+
+module.exports = { ImagePack, loadImagePack };
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Build resized WebP derivatives of extracted product images
+Runs after extraction: each distinct source image is rendered at thumbnail,
+card and detail sizes in a process pool and the variants are recorded in every
+product's 图片 entry. Sources whose digest is unchanged since the last run
+are skipped.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from lazy_import import lazy_import
+from output_writers import WRITERS, read_products
+
+# Pillow is only loaded once an image is opened
+Image = lazy_import('PIL.Image')
+
+# Longest side in pixels; sources are never upscaled
+DERIVATIVE_SIZES = {
+    'detail': 1000,
+    'card': 400,
+    'thumbnail': 160
+}
+WEBP_QUALITY = 80
+DERIVATIVES_DIR = 'product_images_derivatives'
+MANIFEST_NAME = 'derivatives_manifest.json'
+PRODUCTS_JSON = 'extracted_products_with_images.json'
+
+
+def file_digest(path, chunk_size=64 * 1024):
+    """SHA-256 of a file, read in chunks"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _render(job):
+    """
+    Render every derivative size for one source image (runs in a worker process)
+    Returns (digest, variants, error)
+    """
+    source_path, digest, derivatives_dir = job
+    variants = {}
+    try:
+        with Image.open(source_path) as img:
+            img.load()
+            if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+                img = img.convert('RGBA')
+            elif img.mode != 'RGB':
+                img = img.convert('RGB')
+
+            # Largest first, each size is resized from the previous one
+            for name, max_side in sorted(DERIVATIVE_SIZES.items(), key=lambda item: -item[1]):
+                img = img.copy()
+                img.thumbnail((max_side, max_side), Image.LANCZOS)
+
+                filename = f"{digest}_{name}.webp"
+                output_path = Path(derivatives_dir) / filename
+                img.save(output_path, 'WEBP', quality=WEBP_QUALITY, method=4)
+
+                variants[name] = {
+                    'filename': filename,
+                    'path': f"{DERIVATIVES_DIR}/{filename}",
+                    'width': img.width,
+                    'height': img.height,
+                    'size': output_path.stat().st_size
+                }
+        return digest, variants, None
+    except Exception as e:
+        return digest, None, str(e)
+
+
+def _detect_format(json_path):
+    """Tell ndjson, compact and pretty products files apart"""
+    if json_path.suffix == '.ndjson':
+        return 'ndjson'
+    with open(json_path, 'r', encoding='utf-8') as f:
+        return 'json' if f.read(2) in ('[\n', '[]') else 'compact'
+
+
+def _variants_exist(output_path, variants):
+    return all((output_path / v['path']).exists() for v in variants.values())
+
+
+def build_derivatives(output_dir, workers=None, json_name=PRODUCTS_JSON):
+    """
+    Render derivatives for every image referenced by the extracted products
+    and add a 'variants' dict to each 图片 entry
+
+    workers: size of the process pool (default: CPU count)
+    """
+    if Image is None:
+        print("Error: Pillow is required for image derivatives (pip install Pillow)")
+        return None
+
+    output_path = Path(output_dir)
+    json_path = output_path / json_name
+    derivatives_dir = output_path / DERIVATIVES_DIR
+    derivatives_dir.mkdir(parents=True, exist_ok=True)
+
+    print("=== Building image derivatives ===\n")
+
+    products = read_products(json_path)
+
+    manifest_path = output_path / MANIFEST_NAME
+    manifest = {}
+    if manifest_path.exists():
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+    # Hash each distinct source once, many products share the same file
+    digests = {}
+    for product in products:
+        for img in product.get('图片', []):
+            source = img.get('path')
+            if source and source not in digests and (output_path / source).exists():
+                digests[source] = file_digest(output_path / source)
+
+    jobs = []
+    queued = set()
+    for source, digest in digests.items():
+        if digest in queued:
+            continue
+        if digest in manifest and _variants_exist(output_path, manifest[digest]):
+            continue
+        queued.add(digest)
+        jobs.append((str(output_path / source), digest, str(derivatives_dir)))
+
+    print(f"Source images: {len(digests)} ({len(set(digests.values()))} unique)")
+    print(f"Unchanged (skipped): {len(set(digests.values())) - len(jobs)}")
+    print(f"To render: {len(jobs)}\n")
+
+    failed = 0
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 4))
+            for digest, variants, error in pool.map(_render, jobs, chunksize=chunksize):
+                if error:
+                    failed += 1
+                    print(f"  Warning: Could not render {digest[:12]}: {error}")
+                    continue
+                manifest[digest] = variants
+
+    for product in products:
+        for img in product.get('图片', []):
+            digest = digests.get(img.get('path'))
+            if digest in manifest:
+                img['variants'] = manifest[digest]
+
+    # Rewrite atomically (in the same format) so a crash never leaves a truncated products file
+    tmp_path = json_path.with_name(f".{json_name}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        writer = WRITERS[_detect_format(json_path)](f)
+        for product in products:
+            writer.write(product)
+        writer.close()
+    os.replace(tmp_path, json_path)
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    source_bytes = sum((output_path / s).stat().st_size for s in digests)
+    card_bytes = sum(manifest[d]['card']['size'] for d in set(digests.values()) if d in manifest)
+    print(f"Rendered: {len(jobs) - failed}, failed: {failed}")
+    print(f"Derivatives saved to: {derivatives_dir}")
+    print(f"Card variants total {card_bytes/1024:.2f} KB vs {source_bytes/1024:.2f} KB of source images\n")
+
+    return {
+        'rendered': len(jobs) - failed,
+        'skipped': len(set(digests.values())) - len(jobs),
+        'failed': failed,
+        'manifest_path': str(manifest_path)
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Build thumbnail/card/detail WebP derivatives for extracted product images')
+    parser.add_argument('output_dir', nargs='?', default='../extracted_data_openpyxl',
+                        help='Extraction output directory (default: ../extracted_data_openpyxl)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: CPU count)')
+    parser.add_argument('--products', default=PRODUCTS_JSON,
+                        help=f'Products file inside output_dir (default: {PRODUCTS_JSON})')
+    args = parser.parse_args()
+
+    if not (Path(args.output_dir) / args.products).exists():
+        print(f"Error: {args.products} not found in {args.output_dir}")
+        sys.exit(1)
+
+    if build_derivatives(args.output_dir, workers=args.workers, json_name=args.products) is None:
+        sys.exit(1)
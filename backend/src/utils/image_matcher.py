@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Match anchored pictures to product rows through a sorted row index
+Each picture covers the rows from_row..to_row of its anchor. It belongs to the
+row holding most of it, and the index keeps pictures sorted by that row so
+each product is resolved with a bisect instead of probing neighbouring rows.
+Pictures whose row has no product go to the nearest product they overlap or
+that lies within max_distance rows. Every match carries a confidence score.
+"""
+from bisect import bisect_left, bisect_right
+
+# Excel's default row height (15pt) in EMU, used where a drawing gives no size
+DEFAULT_ROW_HEIGHT_EMU = 190500
+# Confidence of a picture given to a product next to its row, halved per extra row
+NEIGHBOUR_CONFIDENCE = 0.5
+DEFAULT_MAX_DISTANCE = 1
+
+
+def row_coverage(anchor):
+    """
+    Estimate the share of the picture that lies in each row of its anchor
+    Returns {row: share}, shares sum to 1
+    """
+    first, last = anchor['from_row'], anchor['to_row']
+    if last is None or last <= first:
+        return {first: 1.0}
+
+    coverage = {row: DEFAULT_ROW_HEIGHT_EMU for row in range(first + 1, last)}
+    coverage[last] = anchor.get('to_row_off') or 0
+    if anchor.get('height'):
+        # Whatever the other rows don't hold sits in the first row
+        coverage[first] = max(anchor['height'] - sum(coverage.values()), 0)
+    else:
+        coverage[first] = max(DEFAULT_ROW_HEIGHT_EMU - (anchor.get('from_row_off') or 0), 0)
+
+    total = sum(coverage.values())
+    if total == 0:
+        return {first: 1.0}
+    return {row: share / total for row, share in coverage.items() if share > 0}
+
+
+class ImageRowIndex:
+    """
+    Pictures sorted by the row that holds most of them
+
+    entries: (anchor, image) pairs from xlsx_anchors.read_image_anchors;
+    absolute anchors (no row) are left out
+    """
+    def __init__(self, entries):
+        indexed = []
+        for order, (anchor, image) in enumerate(entries):
+            if image is None or anchor['from_row'] is None:
+                continue
+            coverage = row_coverage(anchor)
+            # Ties go to the upper row
+            owner = min(coverage, key=lambda row: (-coverage[row], row))
+            indexed.append((owner, order, anchor, image, coverage))
+        indexed.sort(key=lambda entry: (entry[0], entry[1]))
+        self._rows = [entry[0] for entry in indexed]
+        self._entries = indexed
+
+    def __len__(self):
+        return len(self._entries)
+
+    def at(self, row):
+        """Pictures owned by row"""
+        return self._entries[bisect_left(self._rows, row):bisect_right(self._rows, row)]
+
+    def between(self, low, high):
+        """Pictures owned by rows strictly between low and high (either may be None)"""
+        start = 0 if low is None else bisect_right(self._rows, low)
+        end = len(self._rows) if high is None else bisect_left(self._rows, high)
+        return self._entries[start:end]
+
+
+def _claim(entry, rows, max_distance):
+    """
+    Pick which of the candidate product rows an unowned picture goes to
+    Returns (index into rows, confidence) or None
+    """
+    owner, _, _, _, coverage = entry
+    best = None
+    for i, row in enumerate(rows):
+        if row is None:
+            continue
+        if row in coverage:
+            # Overlapping a product's row beats merely being next to it
+            confidence = NEIGHBOUR_CONFIDENCE + coverage[row] * (1 - NEIGHBOUR_CONFIDENCE)
+        elif abs(owner - row) <= max_distance:
+            confidence = NEIGHBOUR_CONFIDENCE / abs(owner - row)
+        else:
+            continue
+        # Equal scores go to the earlier product
+        if best is None or confidence > best[1]:
+            best = (i, confidence)
+    return best
+
+
+def match_images(products, index, max_distance=DEFAULT_MAX_DISTANCE, after_row=None):
+    """
+    Yield (product, matches) for products in row order
+
+    matches is a list of dicts {image, anchor, confidence, method} where method
+    is 'anchor' for pictures owned by the product's row and 'neighbour' for
+    pictures claimed from a row without a product. Products are yielded one
+    behind the input so pictures between two products can go to either.
+
+    after_row continues a run whose products up to that row are already
+    written: pictures that would have gone to that last product are skipped
+    """
+    pending = None
+    pending_row = after_row
+
+    def add(matches, entry, confidence, method):
+        _, _, anchor, image, _ = entry
+        matches.append({'image': image, 'anchor': anchor, 'confidence': round(confidence, 2), 'method': method})
+
+    for product in products:
+        row = product['rowNumber']
+        matches = []
+        for entry in index.at(row):
+            add(matches, entry, entry[4][row], 'anchor')
+
+        for entry in index.between(pending_row, row):
+            claim = _claim(entry, (pending_row, row), max_distance)
+            if claim and claim[0] == 0 and pending is None:
+                continue
+            if claim:
+                add(pending[1] if claim[0] == 0 else matches, entry, claim[1], 'neighbour')
+
+        if pending is not None:
+            yield pending
+        pending = (product, matches)
+        pending_row = row
+
+    if pending is not None:
+        for entry in index.between(pending_row, None):
+            claim = _claim(entry, (pending_row,), max_distance)
+            if claim:
+                add(pending[1], entry, claim[1], 'neighbour')
+        yield pending
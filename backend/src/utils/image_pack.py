@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Packed image archive: every extracted image in one blob file
+Instead of one file per picture in product_images_corrected/, images are
+appended to product_images.pack and located through product_images.pack.json,
+which maps each file name to its offset, length, content type and SHA-256.
+Identical pictures are stored once. The reader memory-maps the blob and hands
+out zero-copy views, and the backend serves the same entries with range reads
+from one open file (imagePack.js).
+
+Products keep their product_images_corrected/<name> paths; readers resolve
+them by file name.
+"""
+import argparse
+import hashlib
+import io
+import json
+import mimetypes
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+IMAGE_PACK_NAME = 'product_images.pack'
+VERSION = 1
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+# Larger images spill from memory to a temporary file until they are appended
+SPOOL_SIZE = 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def index_path(pack_path):
+    """The index sits next to the blob: <pack>.json"""
+    pack_path = Path(pack_path)
+    return pack_path.with_name(f"{pack_path.name}.json")
+
+
+def content_type(name):
+    return mimetypes.guess_type(name)[0] or DEFAULT_CONTENT_TYPE
+
+
+class _EntryWriter(io.RawIOBase):
+    """
+    Spools one image, hashing it as the chunks arrive, and appends it to the
+    pack when closed without an error. Only SPOOL_SIZE bytes of an image are
+    held in memory, the rest go to a temporary file
+    """
+    def __init__(self, pack, name):
+        super().__init__()
+        self.pack = pack
+        self.entry_name = name
+        self.spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        self.hasher = hashlib.sha256()
+        self.length = 0
+
+    def writable(self):
+        return True
+
+    def write(self, chunk):
+        self.hasher.update(chunk)
+        self.length += len(chunk)
+        return self.spool.write(chunk)
+
+    def close(self):
+        self.spool.close()
+        super().close()
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.spool.seek(0)
+                self.pack.append(self.entry_name, self.spool, self.length, self.hasher.hexdigest())
+        finally:
+            self.close()
+        return False
+
+
+class ImagePackWriter:
+    """
+    Appends images to a pack as they are extracted; safe to use from the
+    media extraction threads. open() stands in for the builtin open() of a
+    loose output file. The blob and index replace the previous pack on close()
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        self.file = open(self.tmp_path, 'w+b')
+        self.entries = {}
+        self.by_digest = {}
+        self.size = 0
+        self.bytes_saved = 0
+        self.lock = threading.Lock()
+
+    def open(self, path, mode='wb'):
+        return _EntryWriter(self, Path(path).name)
+
+    def add(self, name, data):
+        """Store data under name; content that is already packed is not written again"""
+        self.append(name, io.BytesIO(data), len(data), hashlib.sha256(data).hexdigest())
+
+    def append(self, name, src, length, digest):
+        """
+        Copy length bytes with the given SHA-256 from the file object src into
+        the blob and store them under name. The entry is only recorded once the
+        copy has succeeded; a failed copy is cut off the end of the blob again
+        """
+        with self.lock:
+            stored = self.by_digest.get(digest)
+            if stored is None:
+                stored = self.size
+                try:
+                    shutil.copyfileobj(src, self.file, COPY_CHUNK_SIZE)
+                except BaseException:
+                    self.file.seek(stored)
+                    self.file.truncate()
+                    raise
+                self.by_digest[digest] = stored
+                self.size += length
+            else:
+                self.bytes_saved += length
+            self.entries[name] = {'offset': stored, 'length': length,
+                                  'contentType': content_type(name), 'digest': digest}
+
+    def store_by_digest(self, temp_path, digest, ext):
+        """
+        Rename an entry to <digest><ext>, like media_extraction.store_by_digest
+        does for loose files. Returns (final path, True if the name is new)
+        """
+        temp_path = Path(temp_path)
+        final_path = temp_path.with_name(f"{digest}{ext}")
+        with self.lock:
+            entry = self.entries.pop(temp_path.name)
+            is_new = final_path.name not in self.entries
+            if is_new:
+                entry['contentType'] = content_type(final_path.name)
+                self.entries[final_path.name] = entry
+        return final_path, is_new
+
+    def __contains__(self, name):
+        return Path(name).name in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, name):
+        """Bytes of an entry written so far (read back from the unfinished blob)"""
+        with self.lock:
+            entry = self.entries[Path(name).name]
+            self.file.flush()
+            return os.pread(self.file.fileno(), entry['length'], entry['offset'])
+
+    def close(self):
+        """Write the index, move the pack into place and return the blob size in bytes"""
+        with self.lock:
+            self.file.close()
+            os.replace(self.tmp_path, self.path)
+            index = {'version': VERSION, 'pack': self.path.name, 'size': self.size,
+                     'entries': dict(sorted(self.entries.items()))}
+            target = index_path(self.path)
+            tmp_index = target.with_name(f".{target.name}.tmp")
+            with open(tmp_index, 'w', encoding='utf-8') as f:
+                json.dump(index, f, ensure_ascii=False)
+            os.replace(tmp_index, target)
+            return self.size
+
+    def abort(self):
+        """Drop the unfinished pack, leaving the previous one (if any) in place"""
+        with self.lock:
+            self.file.close()
+            self.tmp_path.unlink(missing_ok=True)
+
+
+class ImagePack:
+    """
+    Read-only view of a pack through mmap. get() returns a memoryview into the
+    mapping, so release the views before close()
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(index_path(self.path), encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') != VERSION:
+            raise ValueError(f"{self.path} is not a version {VERSION} image pack")
+        self.entries = index['entries']
+        self.buffer = None
+        if index['size']:
+            with open(self.path, 'rb') as f:
+                self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.buffer if self.buffer is not None else b'')
+
+    def close(self):
+        self.view.release()
+        if self.buffer is not None:
+            self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __contains__(self, name):
+        return Path(name).name in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def names(self):
+        return iter(self.entries)
+
+    def entry(self, name):
+        """{'offset', 'length', 'contentType', 'digest'} of an image, or None"""
+        return self.entries.get(Path(name).name)
+
+    def get(self, name):
+        """Zero-copy view of an image; name may be a product_images_corrected/ path"""
+        entry = self.entries[Path(name).name]
+        return self.view[entry['offset']:entry['offset'] + entry['length']]
+
+    def extract(self, output_dir):
+        """Write every image back out as a loose file; returns the number written"""
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        for name in self.entries:
+            with self.get(name) as data, open(output_dir / name, 'wb') as f:
+                f.write(data)
+        return len(self.entries)
+
+
+def pack_directory(images_dir, pack_path):
+    """Pack the loose images of an existing extraction; returns (images, blob bytes)"""
+    writer = ImagePackWriter(pack_path)
+    for image in sorted(Path(images_dir).iterdir()):
+        if image.is_file() and not image.name.startswith('.'):
+            with open(image, 'rb') as src, writer.open(image) as dst:
+                shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+    return len(writer), writer.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pack, list or unpack extracted product images')
+    sub = parser.add_subparsers(dest='command', required=True)
+    pack = sub.add_parser('pack', help='Pack a product_images_corrected/ directory')
+    pack.add_argument('images_dir')
+    pack.add_argument('-o', '--output', default=None,
+                      help=f'Pack file (default: {IMAGE_PACK_NAME} next to the directory)')
+    listing = sub.add_parser('list', help='List the images in a pack')
+    listing.add_argument('pack_file')
+    unpack = sub.add_parser('unpack', help='Write the images of a pack back out as files')
+    unpack.add_argument('pack_file')
+    unpack.add_argument('output_dir')
+    args = parser.parse_args()
+
+    if args.command == 'pack':
+        if not os.path.isdir(args.images_dir):
+            print(f"Error: Directory not found: {args.images_dir}")
+            sys.exit(1)
+        output = args.output or Path(args.images_dir).resolve().parent / IMAGE_PACK_NAME
+        count, size = pack_directory(args.images_dir, output)
+        print(f"Packed {count} images into {output} ({size/1024:.1f} KB)")
+        sys.exit(0)
+
+    if not os.path.exists(args.pack_file):
+        print(f"Error: File not found: {args.pack_file}")
+        sys.exit(1)
+    with ImagePack(args.pack_file) as image_pack:
+        if args.command == 'list':
+            for name in image_pack.names():
+                entry = image_pack.entry(name)
+                print(f"  {name}: {entry['length']} bytes at {entry['offset']} ({entry['contentType']})")
+            print(f"{len(image_pack)} images")
+        else:
+            count = image_pack.extract(args.output_dir)
+            print(f"Unpacked {count} images into {args.output_dir}")
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Verify image-to-product matching with perceptual hashes
+Every extracted image (and, given the workbook, every anchored picture) gets
+a 64-bit difference hash computed in a process pool. Hashes go into a BK-tree
+so near-duplicates are found without comparing every pair. The report flags
+near-duplicate images given to different products, and products whose image
+looks like the picture anchored on another product's row. Hashes are cached
+by SHA-256 of the image bytes, so re-runs only hash new images.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from zipfile import ZipFile
+
+from image_matcher import ImageRowIndex
+from lazy_import import lazy_import
+from output_writers import products_filename, read_products
+from xlsx_anchors import active_worksheet_path, read_image_anchors, worksheet_path
+
+# Pillow is only loaded once an image is opened
+Image = lazy_import('PIL.Image')
+
+HASH_CACHE_NAME = 'image_hash_cache.json'
+REPORT_NAME = 'image_verification_report.json'
+# Bits out of 64 that may differ for two images to count as the same picture
+DEFAULT_THRESHOLD = 6
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def difference_hash(data):
+    """64-bit dHash: compare neighbouring pixels of a 9x8 greyscale thumbnail"""
+    with Image.open(io.BytesIO(data)) as img:
+        pixels = img.convert('L').resize((9, 8), Image.LANCZOS).tobytes()
+    value = 0
+    for y in range(8):
+        for x in range(8):
+            value = (value << 1) | (pixels[y * 9 + x] > pixels[y * 9 + x + 1])
+    return value
+
+
+_local = threading.local()
+
+
+def read_source(source):
+    """
+    Bytes of an image source: a file path, or (workbook path, media member)
+    read through one ZipFile per thread
+    """
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            return f.read()
+    excel_path, member = source
+    archives = _local.__dict__.setdefault('archives', {})
+    if excel_path not in archives:
+        archives[excel_path] = ZipFile(excel_path, 'r')
+    return archives[excel_path].read(member)
+
+
+def _hash_job(job):
+    """Hash one image source (runs in a worker process); returns (digest, hash, error)"""
+    digest, source = job
+    try:
+        return digest, difference_hash(read_source(source)), None
+    except Exception as e:
+        return digest, None, str(e)
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes with Hamming distance"""
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        node = [value, [item], {}]
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming(value, current[0])
+            if distance == 0:
+                current[1].append(item)
+                return
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, value, max_distance):
+        """Return [(distance, item)] for every item within max_distance, nearest first"""
+        found = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= max_distance:
+                found.extend((distance, item) for item in items)
+            # Triangle inequality: only subtrees at distance +- max_distance can match
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+
+class HashCache:
+    """{sha256: dhash hex} kept in the output directory between runs"""
+    def __init__(self, path):
+        self.path = Path(path)
+        self.hashes = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.hashes = json.load(f)
+        self.hits = 0
+
+    def get(self, digest):
+        value = self.hashes.get(digest)
+        if value is not None:
+            self.hits += 1
+            return int(value, 16)
+        return None
+
+    def put(self, digest, value):
+        self.hashes[digest] = f"{value:016x}"
+
+    def save(self):
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.hashes, f)
+        os.replace(tmp_path, self.path)
+
+
+def hash_images(sources, cache, workers=None):
+    """
+    sources: {key: file path or (workbook path, media member)}
+    Returns {key: hash}; sources that can't be read or decoded are left out
+    """
+    # Digests first (threads, hashlib releases the GIL), then decode only what the cache misses
+    def digest_of(key):
+        try:
+            return key, hashlib.sha256(read_source(sources[key])).hexdigest()
+        except (OSError, KeyError) as e:
+            print(f"  Warning: Could not read {key}: {e}")
+            return key, None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        digests = [(key, digest) for key, digest in pool.map(digest_of, sources) if digest]
+
+    hashes = {}
+    pending = {}
+    for key, digest in digests:
+        value = cache.get(digest)
+        if value is not None:
+            hashes[key] = value
+        else:
+            pending.setdefault(digest, []).append(key)
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            jobs = [(digest, sources[keys[0]]) for digest, keys in pending.items()]
+            chunksize = max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 4))
+            for digest, value, error in pool.map(_hash_job, jobs, chunksize=chunksize):
+                if error:
+                    print(f"  Warning: Could not hash {pending[digest][0]}: {error}")
+                    continue
+                cache.put(digest, value)
+                for key in pending[digest]:
+                    hashes[key] = value
+    return hashes
+
+
+def _describe(product, image):
+    return {'rowNumber': product['rowNumber'], '序号': product.get('序号', ''),
+            '名称': product.get('名称', ''), 'image': image}
+
+
+def verify_image_matching(output_dir, excel_path=None, sheet_name=None, json_name=None,
+                          threshold=DEFAULT_THRESHOLD, workers=None):
+    """
+    Check the products of an extraction in output_dir against their images
+    (and against the workbook's anchored pictures when excel_path is given)
+    and write image_verification_report.json
+    """
+    if Image is None:
+        print("Error: Pillow is required for image verification (pip install Pillow)")
+        return None
+
+    output_path = Path(output_dir)
+    json_path = output_path / (json_name or products_filename('json'))
+    print("=== Verifying image-to-product matching ===\n")
+    products = list(read_products(json_path))
+    cache = HashCache(output_path / HASH_CACHE_NAME)
+
+    # Extracted images, each distinct file hashed once
+    image_paths = {img['path'] for product in products for img in product.get('图片', [])
+                   if (output_path / img['path']).exists()}
+    image_hashes = hash_images({p: str(output_path / p) for p in image_paths}, cache, workers)
+    print(f"Products: {len(products)}")
+    print(f"Images hashed: {len(image_hashes)} ({cache.hits} from cache)")
+
+    # Near-duplicates: group the products whose images are within threshold of each other
+    tree = BKTree()
+    owners = {}
+    for product in products:
+        for img in product.get('图片', []):
+            value = image_hashes.get(img['path'])
+            if value is None:
+                continue
+            if value not in owners:
+                tree.add(value, value)
+                owners[value] = []
+            owners[value].append(_describe(product, img['filename']))
+
+    near_duplicates = []
+    seen = set()
+    for value in owners:
+        if value in seen:
+            continue
+        group = [(d, v) for d, v in tree.search(value, threshold) if v not in seen]
+        seen.update(v for _, v in group)
+        members = [dict(entry, distance=d) for d, v in group for entry in owners[v]]
+        if len({m['rowNumber'] for m in members}) > 1:
+            near_duplicates.append({
+                'identical': all(d == 0 for d, _ in group),
+                'products': members
+            })
+
+    # Anchor mismatches: the product's image looks like a picture anchored on another product's row
+    anchor_mismatches = []
+    anchors_checked = 0
+    if excel_path:
+        with ZipFile(excel_path, 'r') as zip_ref:
+            sheet_path = worksheet_path(zip_ref, sheet_name) if sheet_name else active_worksheet_path(zip_ref)
+            anchors = read_image_anchors(zip_ref, sheet_path) if sheet_path else []
+        members = {a['media'] for a in anchors}
+        member_hashes = hash_images({m: (str(excel_path), m) for m in members}, cache, workers)
+        anchors_checked = len(anchors)
+        print(f"Anchored pictures hashed: {len(member_hashes)} ({len(anchors)} anchors)")
+
+        index = ImageRowIndex((anchor, anchor['media']) for anchor in anchors)
+        anchor_tree = BKTree()
+        for row, _, _, member, _ in index.between(None, None):
+            if member in member_hashes:
+                anchor_tree.add(member_hashes[member], (row, member))
+
+        product_rows = {product['rowNumber'] for product in products}
+        for product in products:
+            row = product['rowNumber']
+            own = [member_hashes[e[3]] for e in index.at(row) if e[3] in member_hashes]
+            for img in product.get('图片', []):
+                value = image_hashes.get(img['path'])
+                if value is None or any(hamming(value, h) <= threshold for h in own):
+                    continue
+                others = [(d, item) for d, item in anchor_tree.search(value, threshold) if item[0] != row]
+                # A picture from a row without a product is a legitimate neighbour match
+                if others and (own or others[0][1][0] in product_rows):
+                    distance, (_, member) = others[0]
+                    # The same picture may be anchored on several rows
+                    matched_rows = sorted(item[0] for d, item in others if d == distance)
+                    anchor_mismatches.append(dict(_describe(product, img['filename']), matchedRows=matched_rows,
+                                                  matchedMedia=member, distance=distance))
+
+    cache.save()
+    report = {
+        'products': len(products),
+        'imagesHashed': len(image_hashes),
+        'anchorsChecked': anchors_checked,
+        'threshold': threshold,
+        'nearDuplicateGroups': len(near_duplicates),
+        'anchorMismatches': len(anchor_mismatches),
+        'nearDuplicates': near_duplicates,
+        'mismatches': anchor_mismatches
+    }
+    report_path = output_path / REPORT_NAME
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    identical = sum(1 for group in near_duplicates if group['identical'])
+    print(f"\nNear-duplicate groups across products: {len(near_duplicates)} "
+          f"({identical} identical, {len(near_duplicates) - identical} similar)")
+    print(f"Products whose image matches another row's anchor: {len(anchor_mismatches)}")
+    for mismatch in anchor_mismatches[:10]:
+        print(f"  Row {mismatch['rowNumber']} \"{mismatch['名称'][:30]}\": {mismatch['image']} "
+              f"looks like row {', '.join(map(str, mismatch['matchedRows']))} ({mismatch['matchedMedia']}, distance {mismatch['distance']})")
+    print(f"\nReport saved to: {report_path}")
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Flag near-duplicate and mismatched product images using perceptual hashes')
+    parser.add_argument('output_dir', nargs='?', default='../extracted_data_openpyxl',
+                        help='Extraction output directory (default: ../extracted_data_openpyxl)')
+    parser.add_argument('--excel', default=None,
+                        help='Source workbook, to check each product image against the anchored pictures')
+    parser.add_argument('--sheet', dest='sheet_name', default=None,
+                        help='Worksheet the products came from (default: the active one)')
+    parser.add_argument('--products', default=None,
+                        help='Products file inside output_dir (default: extracted_products_with_images.json)')
+    parser.add_argument('--threshold', type=int, default=DEFAULT_THRESHOLD,
+                        help=f'Max differing hash bits for two images to match (default: {DEFAULT_THRESHOLD})')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    args = parser.parse_args()
+
+    if args.excel and not os.path.exists(args.excel):
+        print(f"Error: Excel file not found: {args.excel}")
+        sys.exit(1)
+
+    if verify_image_matching(args.output_dir, excel_path=args.excel, sheet_name=args.sheet_name,
+                             json_name=args.products, threshold=args.threshold, workers=args.workers) is None:
+        sys.exit(1)
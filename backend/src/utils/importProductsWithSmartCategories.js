@@ -147,9 +147,24 @@ async function importProductsWithSmartCategories(jsonFilePath, dryRun = false, o
     // Read JSON file
     console.log(`Reading JSON file: ${jsonFilePath}`);
     const jsonData = fs.readFileSync(jsonFilePath, 'utf8');
-    const products = JSON.parse(jsonData);
+    // NDJSON output from the Python extractor has one product per line
+    const parsedData = jsonFilePath.endsWith('.ndjson')
+      ? jsonData.split('\n').filter(line => line.trim() !== '').map(line => JSON.parse(line))
+      : JSON.parse(jsonData);
+
+    // Incremental extraction writes a delta with only added and changed products
+    const isDelta = !Array.isArray(parsedData);
+    const products = isDelta
+      ? [...(parsedData.added || []), ...(parsedData.changed || [])]
+      : parsedData;
     
     console.log(`Found ${products.length} products in JSON file`);
+    if (isDelta) {
+      console.log(`Delta file: ${(parsedData.added || []).length} added, ${(parsedData.changed || []).length} changed, ${(parsedData.removed || []).length} removed (removed products are not deleted)`);
+      if (!overwrite && (parsedData.changed || []).length > 0) {
+        console.log('⚠️  Changed products are only updated with --overwrite');
+      }
+    }
 
     let successCount = 0;
     let errorCount = 0;
@@ -187,8 +202,10 @@ async function importProductsWithSmartCategories(jsonFilePath, dryRun = false, o
         // Handle images for categorization
         const productImagesForAnalysis = images && images.length > 0 ? images : null;
         
-        // Smart categorization based on product code (序号), name, and images
-        const categoryInfo = categorizeProductByCode(productCode, productName, productImagesForAnalysis);
+        // Category written by the extractor, else smart categorization based on product code (序号), name, and images
+        const categoryInfo = productData.category && productData.category.en
+          ? productData.category
+          : categorizeProductByCode(productCode, productName, productImagesForAnalysis);
         const categoryEn = categoryInfo.en;
         const categoryCn = categoryInfo.cn;
         
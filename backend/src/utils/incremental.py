@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Manifest of a previous extraction run, used for incremental re-extraction
+Products are fingerprinted by 序号/条码 plus a hash of their content, and media
+members by their ZIP CRC/size plus SHA-256 digest, so a new supplier release
+only costs work for the rows and images that changed
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+MANIFEST_NAME = 'extraction_manifest.json'
+DELTA_NAME = 'extracted_products_delta.json'
+
+
+def product_fingerprint(product):
+    """
+    Hash everything about a product except its row number, so rows that only
+    moved up or down the sheet are not reported as changed
+    """
+    content = {k: v for k, v in product.items() if k != 'rowNumber'}
+    text = json.dumps(content, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ExtractionManifest:
+    """
+    Compares the current run against the previous manifest and records the new one
+    """
+    def __init__(self, previous=None):
+        previous = previous or {}
+        self.previous_date = previous.get('extractionDate')
+        self.previous_products = previous.get('products', {})
+        self.previous_media = previous.get('media', {})
+        self.previous_digests = {m['digest'] for m in self.previous_media.values()}
+
+        self.products = {}
+        self.media = {}
+        self.added = []
+        self.changed = []
+        self.new_images = []
+        self._new_image_set = set()
+
+    @classmethod
+    def load(cls, output_dir):
+        """Load the manifest from a previous run, or start empty"""
+        manifest_path = Path(output_dir) / MANIFEST_NAME
+        if not manifest_path.exists():
+            return cls()
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def cached_media(self, info, images_dir):
+        """
+        Return the previous entry for a ZIP member if its CRC and size are
+        unchanged and the stored file still exists, so it can be reused
+        without decompressing it again
+        """
+        entry = self.previous_media.get(info.filename)
+        if not entry or entry['crc'] != info.CRC or entry['size'] != info.file_size:
+            return None
+        if not (Path(images_dir) / entry['filename']).exists():
+            return None
+        return entry
+
+    def record_media(self, info, digest, filename):
+        """Remember a media member for the next run and track new content"""
+        self.media[info.filename] = {
+            'crc': info.CRC,
+            'size': info.file_size,
+            'digest': digest,
+            'filename': filename
+        }
+        if digest not in self.previous_digests and digest not in self._new_image_set:
+            self._new_image_set.add(digest)
+            self.new_images.append(filename)
+
+    def record_product(self, product):
+        """
+        Fingerprint a product and classify it against the previous run
+        Returns 'added', 'changed' or None if it is unchanged
+        """
+        base_key = f"{product['序号']}\t{product['条码']}"
+        key = base_key
+        occurrence = 1
+        while key in self.products:
+            # Same code and barcode on several rows, keep them apart by occurrence
+            occurrence += 1
+            key = f"{base_key}#{occurrence}"
+
+        fingerprint = product_fingerprint(product)
+        self.products[key] = {
+            'fingerprint': fingerprint,
+            '序号': product['序号'],
+            '条码': product['条码']
+        }
+
+        previous = self.previous_products.get(key)
+        if previous is None:
+            self.added.append(product)
+            return 'added'
+        if previous['fingerprint'] != fingerprint:
+            self.changed.append(product)
+            return 'changed'
+        return None
+
+    def removed(self):
+        """Products present in the previous run but missing from this one"""
+        return [
+            {'key': key, '序号': entry['序号'], '条码': entry['条码']}
+            for key, entry in self.previous_products.items()
+            if key not in self.products
+        ]
+
+    def save(self, output_dir, source):
+        """
+        Write the delta for this run and replace the manifest atomically
+        Returns (delta path, delta dict)
+        """
+        output_path = Path(output_dir)
+        extraction_date = datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+        delta = {
+            'source': source,
+            'previousExtractionDate': self.previous_date,
+            'extractionDate': extraction_date,
+            'added': self.added,
+            'changed': self.changed,
+            'removed': self.removed(),
+            'newImages': self.new_images
+        }
+        delta_path = output_path / DELTA_NAME
+        with open(delta_path, 'w', encoding='utf-8') as f:
+            json.dump(delta, f, ensure_ascii=False, indent=2)
+
+        manifest = {
+            'source': source,
+            'extractionDate': extraction_date,
+            'products': self.products,
+            'media': self.media
+        }
+        manifest_path = output_path / MANIFEST_NAME
+        tmp_path = manifest_path.with_name(f".{MANIFEST_NAME}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, manifest_path)
+
+        return delta_path, delta
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Optional dependencies imported on first use
+pymongo, Pillow and NumPy each add tens of milliseconds to the start of
+every script that imports the module needing them, even when the run never
+touches MongoDB, images or the price checks. lazy_import() hands back a
+module that is only executed when one of its attributes is first read
+(importlib's LazyLoader), or None when it isn't installed, so the
+`module is None` fallbacks of the optional imports keep working.
+"""
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """
+    The module name, loaded on first attribute access, or None when it isn't
+    installed. A submodule's parent packages are imported straight away
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    try:
+        spec = importlib.util.find_spec(name)
+    except ImportError:
+        # A parent package is missing
+        return None
+    if spec is None:
+        return None
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
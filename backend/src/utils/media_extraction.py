@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Concurrent extraction of xl/media/ members from an XLSX archive
+Each member is streamed to disk in fixed-size chunks by a pool of worker
+threads, so whole images are never held in memory. Members can be hashed
+while they are copied to build a content-addressed image store.
+"""
+import hashlib
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from zipfile import ZipFile
+
+# zlib releases the GIL while inflating, so threads overlap decompression and disk writes
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+CHUNK_SIZE = 64 * 1024
+
+
+class _ChunkCounter:
+    """File wrapper that counts (and optionally hashes) the bytes written through it"""
+    def __init__(self, f, hasher=None):
+        self.f = f
+        self.hasher = hasher
+        self.size = 0
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.hasher:
+            self.hasher.update(chunk)
+        return self.f.write(chunk)
+
+
+def extract_media(excel_path, jobs, workers=DEFAULT_WORKERS, chunk_size=CHUNK_SIZE, hash_name=None,
+                  opener=open):
+    """
+    Extract archive members to disk concurrently
+
+    jobs: list of (member path, output path) pairs
+    hash_name: hashlib algorithm used to digest each member while it is written
+    opener: opens an output path for writing, e.g. ImagePackWriter.open to
+    append members to an image pack instead of writing loose files
+    Yields (member, output path, size, digest, error) in job order; size is the
+    number of bytes written, digest is None unless hash_name is set and error
+    is the exception raised for a failed member
+    """
+    local = threading.local()
+    archives = []
+    archives_lock = threading.Lock()
+
+    def archive():
+        # One ZipFile per thread so workers don't contend on a shared file handle
+        if not hasattr(local, 'zip_ref'):
+            local.zip_ref = ZipFile(excel_path, 'r')
+            with archives_lock:
+                archives.append(local.zip_ref)
+        return local.zip_ref
+
+    def extract_one(job):
+        member, output_path = job
+        try:
+            with archive().open(member) as src, opener(output_path, 'wb') as dst:
+                counter = _ChunkCounter(dst, hashlib.new(hash_name) if hash_name else None)
+                shutil.copyfileobj(src, counter, chunk_size)
+            digest = counter.hasher.hexdigest() if counter.hasher else None
+            return member, output_path, counter.size, digest, None
+        except Exception as e:
+            return member, output_path, 0, None, e
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            yield from pool.map(extract_one, jobs)
+    finally:
+        for zip_ref in archives:
+            zip_ref.close()
+
+
+def store_by_digest(temp_path, digest, ext):
+    """
+    Move an extracted file to its content-addressed name <digest><ext> in the
+    same directory. Returns (final path, True if the content was not stored yet)
+    """
+    final_path = temp_path.with_name(f"{digest}{ext}")
+    if final_path.exists():
+        temp_path.unlink()
+        return final_path, False
+    os.replace(temp_path, final_path)
+    return final_path, True
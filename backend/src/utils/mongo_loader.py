@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Bulk-load extracted products straight into MongoDB
+Writes the products and categories collections used by the backend models
+with batched upserts instead of one findOne/create round-trip per product.
+Categories are resolved once per batch and cached for the whole load.
+
+Used as an optional sink by extract_with_openpyxl_improved.py (--mongo-uri)
+or on its own against an existing products file. Any database object with
+pymongo's collection API works, so a mongomock database can stand in for a
+real mongod (--in-memory), with or without pymongo installed.
+"""
+import argparse
+import hashlib
+import math
+import os
+import random
+import re
+import shutil
+import string
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from image_derivatives import file_digest
+from image_pack import IMAGE_PACK_NAME, ImagePack
+from lazy_import import lazy_import
+from output_writers import read_products
+from product_categorizer import ProductCategorizer
+
+# pymongo is only loaded once a database is used; the extractor imports this
+# module for every run
+pymongo = lazy_import('pymongo')
+# Only needed for --in-memory
+mongomock = lazy_import('mongomock')
+# Installed with pymongo
+bson = lazy_import('bson')
+
+# Same defaults as importProductsWithSmartCategories.js
+DEFAULT_MONGODB_URI = 'mongodb://localhost:27017/cms_ecommerce'
+CNY_TO_MYR_RATE = 0.58
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_UPLOADS_DIR = Path(__file__).resolve().parents[2] / 'uploads' / 'products'
+# Random suffix of a taken product slug, like Math.random().toString(36) in Product.js
+SLUG_SUFFIX_CHARS = string.ascii_lowercase + string.digits
+SLUG_SUFFIX_LENGTH = 7
+
+
+def convert_cny_to_myr(cny_amount):
+    """CNY to MYR rounded to a whole number, rounding halves up like Math.round"""
+    if not cny_amount:
+        return 0
+    return int(math.floor(float(cny_amount) * CNY_TO_MYR_RATE + 0.5))
+
+
+def slugify(text, fallback):
+    """Same rule as the models' pre-save hooks: lowercase a-z0-9 runs joined by '-'"""
+    slug = re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+    return slug or fallback
+
+
+def is_in_memory(db):
+    """Whether db is a mongomock database rather than a pymongo one"""
+    return type(db).__module__.startswith('mongomock')
+
+
+def open_database(uri=None, in_memory=False):
+    """
+    Connect and return (client, database)
+    The database name comes from the URI path (default: cms_ecommerce)
+    """
+    uri = uri or os.environ.get('MONGODB_URI') or DEFAULT_MONGODB_URI
+    if in_memory:
+        if mongomock is None:
+            raise RuntimeError("mongomock is required for an in-memory database (pip install mongomock)")
+        client = mongomock.MongoClient(uri)
+    else:
+        if pymongo is None:
+            raise RuntimeError("pymongo is required to load into MongoDB (pip install pymongo)")
+        client = pymongo.MongoClient(uri)
+    return client, client.get_default_database('cms_ecommerce')
+
+
+class MongoProductSink:
+    """
+    Buffers products and upserts them batch_size at a time
+
+    An existing product is found the way the JS importer finds it: by sku
+    (条码, or 序号 when there is no barcode), then by name, so a product stored
+    under the same name with another sku or none is not inserted twice. Both
+    are looked up for the whole batch in one query and writes go by _id.
+    Existing products are left alone unless overwrite is set; a record that
+    matches one written earlier in the same batch counts as existing too. New
+    products get their slug as the Product.js pre-save hook would make it,
+    and like the hook an update keeps the slug the product already has.
+    The category is the one the extractor wrote into the record; records
+    without one go through categorize (by default the compiled code/keyword
+    rules of product_categorizer.py). Images are copied into uploads_dir
+    under their SHA-256 so repeated loads never duplicate files; images_root is the extraction
+    output directory the 图片 paths are relative to. Images that aren't loose
+    files there are read from image_pack (an ImagePack or ImagePackWriter).
+    A mongomock database doesn't need pymongo: its batches go through
+    mongomock's own bulk builder.
+    """
+    def __init__(self, db, images_root, batch_size=DEFAULT_BATCH_SIZE, overwrite=False,
+                 categorize=None, uploads_dir=DEFAULT_UPLOADS_DIR, image_pack=None):
+        if pymongo is None and not is_in_memory(db):
+            raise RuntimeError("pymongo is required to load into MongoDB (pip install pymongo)")
+        # mongomock re-exports pymongo's error when pymongo is installed
+        self.bulk_write_error = mongomock.BulkWriteError if pymongo is None else pymongo.errors.BulkWriteError
+        self.object_id = mongomock.ObjectId if pymongo is None else bson.ObjectId
+        self.products = db['products']
+        self.categories = db['categories']
+        self.images_root = Path(images_root)
+        self.batch_size = batch_size
+        self.overwrite = overwrite
+        self.categorize = categorize or ProductCategorizer()
+        self.uploads_dir = Path(uploads_dir) if uploads_dir else None
+        self.image_pack = image_pack
+        self.category_ids = {}
+        self.image_urls = {}
+        self.buffer = []
+        self.seconds = 0.0
+        self.stats = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'errors': 0,
+                      'categoriesCreated': 0, 'batches': 0}
+
+    def write(self, product):
+        self.buffer.append(product)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def close(self):
+        self.flush()
+        self.stats['seconds'] = round(self.seconds, 3)
+        return self.stats
+
+    def flush(self):
+        if not self.buffer:
+            return
+        started = time.perf_counter()
+        batch, self.buffer = self.buffer, []
+        now = datetime.now(timezone.utc)
+
+        categories = {}
+        valid = []
+        for product in batch:
+            if not (product.get('名称') or '').strip() or (product.get('建议价') or 0) <= 0:
+                # Same rules as the JS importer: no name or no price is not importable
+                self.stats['skipped'] += 1
+                continue
+            category = self.categorize(product)
+            categories[category['en']] = category
+            valid.append((product, category['en']))
+        self._resolve_categories(categories, now)
+
+        updates = self._product_updates([self._fields(product, self.category_ids[category_name])
+                                         for product, category_name in valid], now)
+        if updates:
+            result = self._bulk_upsert(self.products, updates)
+            self.stats['errors'] += len(result['writeErrors'])
+            for error in result['writeErrors'][:5]:
+                print(f"  Warning: Could not upsert product: {error.get('errmsg')}")
+            self.stats['inserted'] += result['nUpserted']
+            self.stats['updated'] += result['nModified']
+            self.stats['unchanged'] += result['nMatched'] - result['nModified']
+
+        self.stats['batches'] += 1
+        self.seconds += time.perf_counter() - started
+
+    def _bulk_upsert(self, collection, updates):
+        """
+        Upsert (filter, update) pairs in one unordered bulk write and return the
+        raw counts: nUpserted, nMatched, nModified and writeErrors
+        """
+        try:
+            if pymongo is not None:
+                requests = [pymongo.UpdateOne(key, update, upsert=True) for key, update in updates]
+                return collection.bulk_write(requests, ordered=False).bulk_api_result
+            bulk = collection.initialize_unordered_bulk_op()
+            for key, update in updates:
+                bulk.find(key).upsert().update_one(update)
+            return bulk.execute()
+        except self.bulk_write_error as e:
+            return e.details
+
+    def _resolve_categories(self, categories, now):
+        """Look up every category of the batch in one query and create the missing ones"""
+        missing = [name for name in categories if name not in self.category_ids]
+        if not missing:
+            return
+        for doc in self.categories.find({'name': {'$in': missing}}, {'_id': 1, 'name': 1}):
+            self.category_ids[doc['name']] = doc['_id']
+
+        to_create = [name for name in missing if name not in self.category_ids]
+        if to_create:
+            updates = [({'name': name}, {'$setOnInsert': self._category_doc(categories[name], now)})
+                       for name in to_create]
+            if self._bulk_upsert(self.categories, updates)['writeErrors']:
+                # Slug taken by a differently named category, retry with a unique slug
+                for name in to_create:
+                    doc = self._category_doc(categories[name], now)
+                    doc['slug'] = f"{doc['slug']}-{int(time.time() * 1000)}"
+                    self.categories.update_one({'name': name}, {'$setOnInsert': doc}, upsert=True)
+            for doc in self.categories.find({'name': {'$in': to_create}}, {'_id': 1, 'name': 1}):
+                self.category_ids[doc['name']] = doc['_id']
+            self.stats['categoriesCreated'] += len(to_create)
+            print(f"  Created categories: {', '.join(to_create)}")
+
+    @staticmethod
+    def _category_doc(category, now):
+        return {
+            'description': category.get('cn', ''),
+            'slug': slugify(category['en'], 'default-category'),
+            'image': '',
+            'parent': None,
+            'order': 0,
+            'isActive': True,
+            'createdAt': now,
+            'updatedAt': now,
+            '__v': 0
+        }
+
+    def _copy_image(self, img):
+        """Copy one image into the uploads directory once and return its URL"""
+        source = self.images_root / img['path']
+        if source in self.image_urls:
+            return self.image_urls[source]
+        url = None
+        if source.exists():
+            name = f"{file_digest(source)}{source.suffix.lower() or '.jpeg'}"
+            target = self.uploads_dir / name
+            if not target.exists():
+                self.uploads_dir.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(source, target)
+            url = f"/uploads/products/{name}"
+        elif self.image_pack is not None and source.name in self.image_pack:
+            data = self.image_pack.get(source.name)
+            name = f"{hashlib.sha256(data).hexdigest()}{source.suffix.lower() or '.jpeg'}"
+            target = self.uploads_dir / name
+            if not target.exists():
+                self.uploads_dir.mkdir(parents=True, exist_ok=True)
+                target.write_bytes(data)
+            url = f"/uploads/products/{name}"
+        else:
+            print(f"  Warning: Image file not found: {source}")
+        self.image_urls[source] = url
+        return url
+
+    def _product_updates(self, records, now):
+        """
+        (filter, update) pairs by _id for a batch of (sku, name, fields):
+        matched against the stored products by sku, then by name
+        """
+        skus = list({sku for sku, _, _ in records if sku})
+        names = list({name for _, name, _ in records})
+        by_sku, by_name = {}, {}
+        for doc in self.products.find({'$or': [{'sku': {'$in': skus}}, {'name': {'$in': names}}]},
+                                      {'_id': 1, 'sku': 1, 'name': 1}):
+            if doc.get('sku'):
+                by_sku.setdefault(doc['sku'], doc['_id'])
+            by_name.setdefault(doc['name'], doc['_id'])
+        bases = list({slugify(name, 'product') for name in names})
+        taken_slugs = {doc['slug'] for doc in self.products.find({'slug': {'$in': bases}}, {'slug': 1})}
+
+        updates = {}
+        for sku, name, fields in records:
+            existing = (by_sku.get(sku) if sku else None) or by_name.get(name)
+            if existing is None:
+                _id = self.object_id()
+                doc = {**fields, 'slug': self._new_slug(name, taken_slugs), 'createdAt': now, 'updatedAt': now,
+                       '__v': 0}
+                updates[_id] = {'$setOnInsert': doc}
+                if sku:
+                    by_sku[sku] = _id
+                by_name.setdefault(name, _id)
+            elif not self.overwrite:
+                # Already stored, or new earlier in this batch
+                self.stats['unchanged'] += 1
+            elif '$setOnInsert' in updates.get(existing, {}):
+                updates[existing]['$setOnInsert'].update(fields)
+            else:
+                updates[existing] = {'$set': {**fields, 'updatedAt': now}}
+        return [({'_id': _id}, update) for _id, update in updates.items()]
+
+    @staticmethod
+    def _new_slug(name, taken):
+        """The Product.js pre-save hook's slug: the name's, with a random suffix when that one is taken"""
+        base = slugify(name, 'product')
+        slug = base
+        while slug in taken:
+            slug = f"{base}-{''.join(random.choices(SLUG_SUFFIX_CHARS, k=SLUG_SUFFIX_LENGTH))}"
+        taken.add(slug)
+        return slug
+
+    def _fields(self, product, category_id):
+        """(sku, name, fields) for one product, mirroring the JS importer's fields"""
+        name = product['名称'].strip()
+        code = str(product.get('序号') or '').strip()
+        sku = str(product.get('条码') or code).strip()
+        specification = (product.get('规格') or '').strip()
+        weight = product.get('重量KG') or 0
+
+        description_parts = []
+        if specification:
+            description_parts.append(f"规格: {specification}")
+        if weight and weight > 0:
+            description_parts.append(f"重量: {weight} KG")
+
+        fields = {
+            'name': name,
+            'description': '\n'.join(description_parts) if description_parts else name,
+            'shortDescription': specification or name,
+            'price': convert_cny_to_myr(product.get('建议价')),
+            'category': category_id,
+            'stock': int(product.get('数量') or 0),
+            'weight': float(weight or 0),
+            'status': 'active'
+        }
+        if self.uploads_dir and product.get('图片'):
+            images = [{'url': url, 'alt': name}
+                      for url in (self._copy_image(img) for img in product['图片'] if img.get('path')) if url]
+            if images:
+                fields['images'] = images
+
+        if sku:
+            fields['sku'] = sku
+        return sku, name, fields
+
+
+def load_products(products_path, db, batch_size=DEFAULT_BATCH_SIZE, overwrite=False, uploads_dir=DEFAULT_UPLOADS_DIR):
+    """
+    Upsert every product of an extracted products file (json, compact or ndjson)
+    Images are read from the extraction's image pack when there is one
+    """
+    products_path = Path(products_path)
+    pack_path = products_path.parent / IMAGE_PACK_NAME
+    image_pack = ImagePack(pack_path) if uploads_dir and pack_path.exists() else None
+    sink = MongoProductSink(db, products_path.parent, batch_size=batch_size, overwrite=overwrite,
+                            uploads_dir=uploads_dir, image_pack=image_pack)
+    count = 0
+    try:
+        for product in read_products(products_path):
+            sink.write(product)
+            count += 1
+        stats = sink.close()
+    finally:
+        if image_pack is not None:
+            image_pack.close()
+    stats['products'] = count
+    return stats
+
+
+def print_stats(stats):
+    print("=== MongoDB Load Summary ===")
+    print(f"Inserted: {stats['inserted']}")
+    print(f"Updated: {stats['updated']}")
+    print(f"Unchanged: {stats['unchanged']}")
+    print(f"Skipped (no name or price): {stats['skipped']}")
+    print(f"Errors: {stats['errors']}")
+    print(f"Categories created: {stats['categoriesCreated']}")
+    print(f"Batches: {stats['batches']} in {stats['seconds']:.2f}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk-load extracted products into MongoDB')
+    parser.add_argument('products_file', help='extracted_products_with_images.json / .ndjson')
+    parser.add_argument('--uri', default=None,
+                        help=f'MongoDB URI (default: $MONGODB_URI or {DEFAULT_MONGODB_URI})')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f'Products per bulk write (default: {DEFAULT_BATCH_SIZE})')
+    parser.add_argument('--overwrite', action='store_true', help='Update products that already exist')
+    parser.add_argument('--no-images', action='store_true', help='Do not copy images into backend/uploads/products')
+    parser.add_argument('--in-memory', action='store_true',
+                        help='Load into an in-memory mongomock database (dry run / testing)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.products_file):
+        print(f"Error: File not found: {args.products_file}")
+        sys.exit(1)
+
+    try:
+        client, db = open_database(args.uri, in_memory=args.in_memory)
+        print(f"Loading {args.products_file} into {db.name}\n")
+        stats = load_products(args.products_file, db, batch_size=args.batch_size, overwrite=args.overwrite,
+                              uploads_dir=None if args.no_images else DEFAULT_UPLOADS_DIR)
+        print(f"\nProducts read: {stats['products']}")
+        print_stats(stats)
+        client.close()
+    except Exception as e:
+        print(f"\nError: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Incremental writers for extracted products
+Every writer takes one product at a time, so nothing has to hold the full
+result list or its serialised form in memory
+
+  json     pretty-printed array, identical to json.dump(products, f, indent=2)
+  compact  array without indentation or spaces
+  ndjson   one product per line, flushed as soon as it is written
+"""
+import json
+from pathlib import Path
+
+PRODUCTS_BASENAME = 'extracted_products_with_images'
+
+
+class JsonArrayWriter:
+    """
+    Write products to a JSON array one at a time
+    Produces the same bytes as json.dump(products, f, ensure_ascii=False, indent=2)
+    """
+    def __init__(self, f):
+        self.f = f
+        self.count = 0
+
+    def write(self, product):
+        text = json.dumps(product, ensure_ascii=False, indent=2)
+        self.f.write('[\n  ' if self.count == 0 else ',\n  ')
+        self.f.write(text.replace('\n', '\n  '))
+        self.count += 1
+
+    def close(self):
+        self.f.write('\n]' if self.count else '[]')
+
+
+class CompactJsonArrayWriter:
+    """
+    Write products to a JSON array without whitespace
+    Produces the same bytes as json.dump(products, f, ensure_ascii=False, separators=(',', ':'))
+    """
+    def __init__(self, f):
+        self.f = f
+        self.count = 0
+
+    def write(self, product):
+        self.f.write('[' if self.count == 0 else ',')
+        self.f.write(json.dumps(product, ensure_ascii=False, separators=(',', ':')))
+        self.count += 1
+
+    def close(self):
+        self.f.write(']' if self.count else '[]')
+
+
+class NdjsonWriter:
+    """
+    Write one compact JSON product per line and flush it, so a consumer can
+    read records while extraction is still running
+    """
+    def __init__(self, f):
+        self.f = f
+        self.count = 0
+
+    def write(self, product):
+        self.f.write(json.dumps(product, ensure_ascii=False, separators=(',', ':')))
+        self.f.write('\n')
+        self.f.flush()
+        self.count += 1
+
+    def close(self):
+        pass
+
+
+WRITERS = {
+    'json': JsonArrayWriter,
+    'compact': CompactJsonArrayWriter,
+    'ndjson': NdjsonWriter
+}
+
+
+def products_filename(output_format):
+    """extracted_products_with_images.json, or .ndjson for the ndjson writer"""
+    return f"{PRODUCTS_BASENAME}.{'ndjson' if output_format == 'ndjson' else 'json'}"
+
+
+def read_products(path):
+    """Load products written by any of the writers"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if Path(path).suffix == '.ndjson':
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def iter_written_products(path, size):
+    """
+    Yield the products in the first size bytes of a file written by any of
+    the writers, e.g. the part of an interrupted run's output a checkpoint
+    covers. The array is still open there, so it is decoded one object at a time
+    """
+    with open(path, 'rb') as f:
+        text = f.read(size).decode('utf-8')
+    if Path(path).suffix == '.ndjson':
+        for line in text.splitlines():
+            if line.strip():
+                yield json.loads(line)
+        return
+    decoder = json.JSONDecoder()
+    pos = text.find('[') + 1
+    if pos == 0:
+        return
+    while True:
+        while pos < len(text) and text[pos] in ' \t\r\n,':
+            pos += 1
+        if pos >= len(text) or text[pos] == ']':
+            return
+        product, pos = decoder.raw_decode(text, pos)
+        yield product
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Parsed workbook parts kept between extractions
+A long-running extraction service sees the same supplier workbook again and
+again with only some parts changed: a price update rewrites the sheet XML
+but usually leaves the shared strings and the drawings alone. PartCache keeps
+what was parsed from a part (the shared string table, a drawing's anchors)
+under the parts' digests from the ZIP directory, name, CRC-32 and size, so an
+unchanged part is neither decompressed nor parsed again. The least recently
+used entries are dropped beyond max_entries.
+"""
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 64
+
+
+def part_digest(zip_ref, path):
+    """(name, CRC-32, size) of a package part, with None for a missing part"""
+    try:
+        info = zip_ref.getinfo(path)
+    except KeyError:
+        return path, None, None
+    return path, info.CRC, info.file_size
+
+
+class PartCache:
+    """
+    Results of parsing package parts, keyed by what was parsed and the digests
+    of the parts it was parsed from. Cached results are shared between
+    extractions, so callers must not modify them
+    """
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, kind, zip_ref, paths, parse):
+        """
+        parse(), or its result from an earlier call for the same kind of data
+        when none of paths (every part the result depends on) has changed
+        """
+        key = (kind, *(part_digest(zip_ref, path) for path in paths))
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+        value = parse()
+        with self.lock:
+            self.misses += 1
+            self.entries[key] = value
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return value
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
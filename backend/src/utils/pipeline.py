@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Bounded producer/consumer stages for pipelined extraction
+Each stage runs in its own thread and hands items to the next one through a
+fixed-size queue, so a fast stage blocks instead of buffering the whole sheet
+(backpressure). An exception raised in a stage is re-raised in the thread
+that reads from or writes to it. Every stage records its busy time, i.e. the
+time spent working rather than waiting on a neighbour.
+"""
+import queue
+import threading
+import time
+
+DEFAULT_QUEUE_SIZE = 256
+_DONE = object()
+_POLL_SECONDS = 0.1
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+class Producer:
+    """
+    Iterate an iterable in a background thread; iterate the Producer to get
+    its items in order. Closing the iterator early stops the thread.
+    """
+    def __init__(self, iterable, maxsize=DEFAULT_QUEUE_SIZE, name=None):
+        self.queue = queue.Queue(maxsize)
+        self.stopped = threading.Event()
+        self.seconds = 0.0
+        self.thread = threading.Thread(target=self._run, args=(iterable,), name=name, daemon=True)
+        self.thread.start()
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self, iterable):
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self._put(_DONE)
+                return
+            except Exception as e:
+                self._put(_Failure(e))
+                return
+            finally:
+                self.seconds += time.perf_counter() - started
+            if not self._put(item):
+                return
+
+    def __iter__(self):
+        try:
+            while True:
+                item = self.queue.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield item
+        finally:
+            self.stopped.set()
+
+
+class Consumer:
+    """
+    Call func(item) in a background thread for every item put(); close()
+    waits for the queue to drain and re-raises the first error, abort() stops
+    the thread when the caller gives up
+    """
+    def __init__(self, func, maxsize=DEFAULT_QUEUE_SIZE, name=None):
+        self.func = func
+        self.queue = queue.Queue(maxsize)
+        self.stopped = threading.Event()
+        self.error = None
+        self.seconds = 0.0
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _DONE:
+                return
+            if self.error is not None or self.stopped.is_set():
+                # Keep draining so put() never blocks on a dead consumer
+                continue
+            started = time.perf_counter()
+            try:
+                self.func(item)
+            except Exception as e:
+                self.error = e
+            self.seconds += time.perf_counter() - started
+
+    def put(self, item):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(item)
+
+    def close(self):
+        self.queue.put(_DONE)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def abort(self):
+        """Skip the items still queued and wait for the thread to end, without re-raising"""
+        self.stopped.set()
+        self.queue.put(_DONE)
+        self.thread.join()
+
+
+class Background:
+    """Run func(*args) in a thread; join() returns its result or re-raises its error"""
+    def __init__(self, func, *args, name=None):
+        self.result = None
+        self.error = None
+        self.seconds = 0.0
+        self.thread = threading.Thread(target=self._run, args=(func, args), name=name, daemon=True)
+        self.thread.start()
+
+    def _run(self, func, args):
+        started = time.perf_counter()
+        try:
+            self.result = func(*args)
+        except Exception as e:
+            self.error = e
+        self.seconds = time.perf_counter() - started
+
+    def join(self):
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.result
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Columnar copy of the numeric product fields, with a whole-sheet price check
+价格, 数量, 金额, 建议价, 市值 and 重量KG are stored as one typed array per field,
+next to the row numbers, in price_columns.bin. Analytics read a column
+straight out of the file (a NumPy array through mmap when NumPy is installed,
+a typed memoryview otherwise) instead of reloading the nested product JSON.
+
+validate() checks every row at once: 金额 that doesn't equal 价格 × 数量, and
+价格 or 建议价/价格 markups far outside the rest of the sheet. Outliers lie
+beyond Tukey's far-out fences on the log scale (3 interquartile ranges below
+the first or above the third quartile), so a handful of wrong prices can't
+shift the bounds the way they would a mean and standard deviation, and a 2
+yuan cable and a 2000 yuan doll are judged on the same ratio scale. NumPy is
+optional; without it the same checks run as plain loops.
+
+Layout (little-endian): a header with the product count and the offset of
+each column, then the columns in COLUMNS order, each 8-byte aligned.
+"""
+import argparse
+import json
+import math
+import mmap
+import os
+import statistics
+import struct
+import sys
+import time
+from array import array
+from pathlib import Path
+
+from lazy_import import lazy_import
+from output_writers import read_products
+
+# NumPy is only loaded once columns are read or checked
+np = lazy_import('numpy')
+
+PRICE_COLUMNS_NAME = 'price_columns.bin'
+PRICE_REPORT_NAME = 'price_report.json'
+MAGIC = b'PLPC'
+VERSION = 1
+
+# (field, array typecode) in file order; 数量 is an integer column
+COLUMNS = (
+    ('rowNumber', 'I'),
+    ('价格', 'd'),
+    ('数量', 'q'),
+    ('金额', 'd'),
+    ('建议价', 'd'),
+    ('市值', 'd'),
+    ('重量KG', 'd'),
+)
+_DTYPES = {'I': '<u4', 'd': '<f8', 'q': '<i8'}
+
+# magic, version, products, then the offset of each column
+HEADER = struct.Struct(f'<4sII{len(COLUMNS)}Q')
+
+# 金额 is rounded to the fen in the sheet
+AMOUNT_TOLERANCE = 0.01
+# Interquartile ranges of log10 values beyond the quartiles that make an outlier
+OUTLIER_FENCE = 3.0
+# Fewer priced products than this and there's no distribution to compare with
+MIN_OUTLIER_SAMPLE = 10
+
+
+def _align(buffer):
+    buffer.extend(b'\0' * (-len(buffer) % 8))
+    return len(buffer)
+
+
+def _little_endian(values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+class PriceColumnsBuilder:
+    """Collects the numeric fields as products are extracted and writes the columns file"""
+    def __init__(self):
+        self.columns = {field: array(typecode) for field, typecode in COLUMNS}
+        self.seconds = 0.0
+
+    def add(self, product):
+        started = time.perf_counter()
+        columns = self.columns
+        columns['rowNumber'].append(product.get('rowNumber') or 0)
+        columns['数量'].append(int(product.get('数量') or 0))
+        for field in ('价格', '金额', '建议价', '市值', '重量KG'):
+            columns[field].append(float(product.get(field) or 0))
+        self.seconds += time.perf_counter() - started
+
+    def __len__(self):
+        return len(self.columns['rowNumber'])
+
+    def save(self, path):
+        """Write the columns atomically and return the file size in bytes"""
+        started = time.perf_counter()
+        body = bytearray(HEADER.size)
+        offsets = []
+        for field, _ in COLUMNS:
+            offsets.append(_align(body))
+            body.extend(_little_endian(self.columns[field]))
+        HEADER.pack_into(body, 0, MAGIC, VERSION, len(self), *offsets)
+        path = Path(path)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+        self.seconds += time.perf_counter() - started
+        return len(body)
+
+    def validate(self, **options):
+        """validate() over the columns collected so far"""
+        started = time.perf_counter()
+        report = validate(self.columns, **options)
+        self.seconds += time.perf_counter() - started
+        return report
+
+
+class PriceColumns:
+    """
+    Read-only view of a columns file through mmap. Columns are NumPy arrays
+    (or memoryviews without NumPy) into the mapping, so drop them before close()
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, *offsets = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            self.buffer.close()
+            raise ValueError(f"{path} is not a version {VERSION} price columns file")
+        self.offsets = dict(zip((field for field, _ in COLUMNS), offsets))
+
+    def close(self):
+        self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, field):
+        typecode = dict(COLUMNS)[field]
+        offset = self.offsets[field]
+        if np is not None:
+            return np.frombuffer(self.buffer, dtype=_DTYPES[typecode], count=self.count, offset=offset)
+        size = array(typecode).itemsize * self.count
+        return memoryview(self.buffer)[offset:offset + size].cast(typecode)
+
+    def columns(self):
+        return {field: self[field] for field, _ in COLUMNS}
+
+
+def _outliers_numpy(values, fence):
+    """(indices of the positive values outside the bounds, (low, high) bounds or None)"""
+    positive = np.flatnonzero(values > 0)
+    if len(positive) < MIN_OUTLIER_SAMPLE:
+        return positive[:0], None
+    logs = np.log10(values[positive])
+    first, third = np.percentile(logs, [25, 75])
+    low, high = first - fence * (third - first), third + fence * (third - first)
+    return positive[(logs < low) | (logs > high)], (10 ** low, 10 ** high)
+
+
+def _outliers_python(values, fence):
+    positive = [i for i, value in enumerate(values) if value > 0]
+    if len(positive) < MIN_OUTLIER_SAMPLE:
+        return [], None
+    logs = [math.log10(values[i]) for i in positive]
+    # 'inclusive' interpolates like numpy.percentile
+    first, _, third = statistics.quantiles(logs, n=4, method='inclusive')
+    low, high = first - fence * (third - first), third + fence * (third - first)
+    return [i for i, value in zip(positive, logs) if value < low or value > high], (10 ** low, 10 ** high)
+
+
+def _check_numpy(columns, tolerance, fence):
+    price = np.asarray(columns['价格'], dtype=np.float64)
+    quantity = np.asarray(columns['数量'], dtype=np.float64)
+    amount = np.asarray(columns['金额'], dtype=np.float64)
+    suggested = np.asarray(columns['建议价'], dtype=np.float64)
+    expected = price * quantity
+    mismatched = np.flatnonzero(np.abs(amount - expected) > tolerance)
+    markup = np.divide(suggested, price, out=np.zeros_like(price), where=(price > 0) & (suggested > 0))
+    priced = price[price > 0]
+    return {
+        'mismatched': mismatched.tolist(),
+        'expected': expected[mismatched].tolist(),
+        'priceOutliers': _outliers_numpy(price, fence),
+        'markup': markup,
+        'markupOutliers': _outliers_numpy(markup, fence),
+        'priced': len(priced),
+        'medianPrice': float(np.median(priced)) if len(priced) else 0.0,
+        'amountTotal': float(amount.sum()),
+        'marketValueTotal': float(np.asarray(columns['市值'], dtype=np.float64).sum())
+    }
+
+
+def _check_python(columns, tolerance, fence):
+    price, quantity, amount, suggested = (columns[field] for field in ('价格', '数量', '金额', '建议价'))
+    expected = [p * q for p, q in zip(price, quantity)]
+    mismatched = [i for i, (a, e) in enumerate(zip(amount, expected)) if abs(a - e) > tolerance]
+    markup = [s / p if p > 0 and s > 0 else 0.0 for p, s in zip(price, suggested)]
+    priced = [p for p in price if p > 0]
+    return {
+        'mismatched': mismatched,
+        'expected': [expected[i] for i in mismatched],
+        'priceOutliers': _outliers_python(price, fence),
+        'markup': markup,
+        'markupOutliers': _outliers_python(markup, fence),
+        'priced': len(priced),
+        'medianPrice': statistics.median(priced) if priced else 0.0,
+        'amountTotal': math.fsum(amount),
+        'marketValueTotal': math.fsum(columns['市值'])
+    }
+
+
+def _bounds(bounds):
+    return [round(bound, 4) for bound in bounds] if bounds else None
+
+
+def validate(columns, tolerance=AMOUNT_TOLERANCE, fence=OUTLIER_FENCE):
+    """
+    Check a whole sheet's columns (a mapping of field to array, as held by
+    PriceColumnsBuilder or read by PriceColumns) in one pass and return the
+    report: rows whose 金额 is off 价格 × 数量 by more than tolerance, and rows
+    whose 价格 or 建议价/价格 markup lies more than fence interquartile ranges
+    outside the quartiles of the sheet's log values
+    """
+    check = _check_numpy if np is not None else _check_python
+    checked = check(columns, tolerance, fence)
+    rows, price, quantity, amount, suggested = (columns[field] for field in
+                                                ('rowNumber', '价格', '数量', '金额', '建议价'))
+
+    amount_mismatches = [{
+        'rowNumber': int(rows[i]),
+        '价格': float(price[i]),
+        '数量': int(quantity[i]),
+        '金额': float(amount[i]),
+        'expected': round(expected, 2)
+    } for i, expected in zip(checked['mismatched'], checked['expected'])]
+    outliers, price_bounds = checked['priceOutliers']
+    price_outliers = [{
+        'rowNumber': int(rows[i]),
+        '价格': float(price[i])
+    } for i in outliers]
+    outliers, markup_bounds = checked['markupOutliers']
+    markup_outliers = [{
+        'rowNumber': int(rows[i]),
+        '价格': float(price[i]),
+        '建议价': float(suggested[i]),
+        'markup': round(float(checked['markup'][i]), 3)
+    } for i in outliers]
+
+    return {
+        'products': len(rows),
+        'pricedProducts': checked['priced'],
+        'medianPrice': round(checked['medianPrice'], 2),
+        'amountTotal': round(checked['amountTotal'], 2),
+        'marketValueTotal': round(checked['marketValueTotal'], 2),
+        'amountTolerance': tolerance,
+        'outlierFence': fence,
+        'priceBounds': _bounds(price_bounds),
+        'markupBounds': _bounds(markup_bounds),
+        'amountMismatches': amount_mismatches,
+        'priceOutliers': price_outliers,
+        'markupOutliers': markup_outliers
+    }
+
+
+def save_report(report, output_dir):
+    report_path = Path(output_dir) / PRICE_REPORT_NAME
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report_path
+
+
+def _describe(bounds):
+    return f"{bounds[0]:g}-{bounds[1]:g}" if bounds else "(too few prices)"
+
+
+def print_report(report, limit=5):
+    print("=== Price check ===")
+    print(f"  Products: {report['products']} ({report['pricedProducts']} priced, "
+          f"median 价格 {report['medianPrice']})")
+    print(f"  Total 金额: {report['amountTotal']}, total 市值: {report['marketValueTotal']}")
+    mismatches = report['amountMismatches']
+    print(f"  金额 != 价格 × 数量: {len(mismatches)}")
+    for item in mismatches[:limit]:
+        print(f"    Row {item['rowNumber']}: {item['价格']} × {item['数量']} = {item['expected']}, "
+              f"金额 is {item['金额']}")
+    outliers = report['priceOutliers']
+    print(f"  价格 outside {_describe(report['priceBounds'])}: {len(outliers)}")
+    for item in outliers[:limit]:
+        print(f"    Row {item['rowNumber']}: {item['价格']}")
+    outliers = report['markupOutliers']
+    print(f"  建议价/价格 outside {_describe(report['markupBounds'])}: {len(outliers)}")
+    for item in outliers[:limit]:
+        print(f"    Row {item['rowNumber']}: {item['价格']} -> {item['建议价']} (x{item['markup']})")
+
+
+def build_price_columns(products, path):
+    """Columns of an iterable of products written to path; returns the builder and the file size"""
+    builder = PriceColumnsBuilder()
+    for product in products:
+        builder.add(product)
+    return builder, builder.save(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build price columns or check the prices in them')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help='Write the columns of an extracted products file (json, compact or ndjson)')
+    build.add_argument('products_file')
+    build.add_argument('-o', '--output', default=None,
+                       help=f'Columns file (default: {PRICE_COLUMNS_NAME} next to the products file)')
+    check = sub.add_parser('check', help='Check amounts and price outliers in a columns file')
+    check.add_argument('columns_file')
+    check.add_argument('--tolerance', type=float, default=AMOUNT_TOLERANCE,
+                       help=f'Allowed 金额 difference (default: {AMOUNT_TOLERANCE})')
+    check.add_argument('--fence', type=float, default=OUTLIER_FENCE,
+                       help=f'Interquartile ranges past the quartiles that make an outlier (default: {OUTLIER_FENCE:g})')
+    check.add_argument('--limit', type=int, default=20, help='Rows listed per check')
+    check.add_argument('--json', action='store_true', help='Print the full report as JSON')
+    args = parser.parse_args()
+
+    source = args.products_file if args.command == 'build' else args.columns_file
+    if not os.path.exists(source):
+        print(f"Error: File not found: {source}")
+        sys.exit(1)
+
+    if args.command == 'build':
+        output = args.output or Path(args.products_file).parent / PRICE_COLUMNS_NAME
+        builder, size = build_price_columns(read_products(args.products_file), output)
+        print(f"Wrote {len(builder)} products to {output} ({size/1024:.1f} KB)")
+    else:
+        with PriceColumns(args.columns_file) as columns:
+            started = time.perf_counter()
+            report = validate(columns.columns(), tolerance=args.tolerance, fence=args.fence)
+            elapsed = (time.perf_counter() - started) * 1000
+        if args.json:
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            print_report(report, limit=args.limit)
+            print(f"\nChecked {report['products']} products in {elapsed:.1f} ms "
+                  f"({'NumPy' if np is not None else 'without NumPy'})")
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Assign store categories to extracted products in one pass per product
+The rules are the ones importProductsWithSmartCategories.js applies through
+categorizeProductByCode.js: 序号 code-prefix rules first, then the name
+keywords of categorizeByNameOnly(), where the first category (in rule order)
+with a matching keyword wins. Instead of testing keywords one at a time, all
+of them are compiled into one Aho-Corasick automaton, so categorising a name
+costs one scan of the name whatever the number of rules. Code prefixes are
+walked through a trie of the same kind, anchored at the start of the code.
+
+Products whose name also matches keywords of other categories (or whose name
+disagrees with their code) are reported as ambiguous.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from bisect import bisect_right
+from collections import Counter
+from pathlib import Path
+
+from output_writers import read_products
+
+CATEGORY_REPORT_NAME = 'categorization_report.json'
+
+CATEGORIES = {
+    'Condoms & Protection': '避孕套/安全套',
+    'Lubricants': '润滑剂',
+    'Female Toys': '女性玩具',
+    'Male Toys': '男性玩具',
+    'Lingerie & Clothing': '情趣内衣/服装',
+    'BDSM & Accessories': 'BDSM用品',
+    'Dolls & Figures': '娃娃/充气',
+    'Enhancement Products': '延时/增强',
+    'Health & Care': '健康护理',
+    'Accessories & Others': '配件/其他'
+}
+DEFAULT_CATEGORY_NAME = 'Accessories & Others'
+
+# Name keywords in priority order, as in categorizeByNameOnly()
+NAME_KEYWORDS = [
+    ('Condoms & Protection', ['套', 'condom', '安全套', '避孕套', '套套', '水晶套', '狼牙套', '加长套', '加粗套',
+                              '龟头套', '包皮环', '锁紧环', '锁精环', 'durex', '杜蕾斯', 'double one', '双一',
+                              'momo', '陌陌', '第六感', '杰士邦', '冈本', 'okamoto']),
+    ('Lubricants', ['润滑', 'lubricant', '润滑液', '润滑啫喱', '润滑剂', '润滑膏', '润滑油']),
+    ('Female Toys', ['跳蛋', '震动棒', 'av棒', '女用', '女性', '按摩器', '按摩棒', '按摩仪', '阳具', '仿真阳具',
+                     '震动阳具']),
+    ('Male Toys', ['飞机杯', '名器', '男用', '男性用品', '男根', '男用软胶', '极致名器', '男用腿模']),
+    ('Lingerie & Clothing', ['丝袜', '连裤袜', '内衣', '制服', '旗袍', '情趣内衣', '套装', '裙', '连身袜', '网袜',
+                             '渔网', '蕾丝', '吊带']),
+    ('BDSM & Accessories', ['束缚', '调教', 'sm', 'bdsm', '捆绑', '情趣用品', '道具', '骰子', '扑克', '飞行棋',
+                            '摇签']),
+    ('Dolls & Figures', ['娃娃', '充气', '实体', '仿真', '人型', '1:1', '实体娃娃', '充气娃娃', '画皮娃娃', '腿模',
+                         '半身', '分体']),
+    ('Enhancement Products', ['延时', '喷剂', '增强', '持久', '延时喷剂', '外用', '湿巾', '快感', '增感', '修护',
+                              'penis extender', 'extender']),
+    ('Health & Care', ['医用', '测试', '试纸', '消毒', '护理', '凝胶', '洗涤器', '绷带', '创口贴', '退热', '晕车',
+                       '酒精', '碘伏', 'pregnant', '怀孕', '早早孕'])
+]
+
+_UNBOUNDED = float('inf')
+
+# 序号 rules in the order categorizeProductByCode() tries them:
+# (prefix, what must follow it, category or [(first number, last number, category)])
+# 'any' accepts any rest, 'exact' an empty rest, 'integer' digits only and
+# 'decimal' digits with an optional fraction; numbers outside every range fall through
+CODE_RULES = [
+    ('T-A', 'any', 'Condoms & Protection'),
+    ('T-B', 'any', 'Condoms & Protection'),
+    ('T-C', 'any', 'Condoms & Protection'),
+    ('T-D', 'any', 'Condoms & Protection'),
+    ('R-E', 'any', 'Lubricants'),
+    ('R-F', 'any', 'Lubricants'),
+    ('N-G-', 'integer', [(0, _UNBOUNDED, 'Female Toys')]),
+    ('N-H-', 'integer', [(0, 179, 'Female Toys'), (180, 439, 'Lingerie & Clothing'),
+                         (440, 495, 'BDSM & Accessories'), (500, 599, 'Lingerie & Clothing'),
+                         (600, 606, 'Accessories & Others'), (607, _UNBOUNDED, 'Lingerie & Clothing')]),
+    ('G-I', 'any', 'Dolls & Figures'),
+    ('G-J', 'any', 'Dolls & Figures'),
+    ('G-K', 'any', 'Dolls & Figures'),
+    ('G-L', 'any', 'Dolls & Figures'),
+    ('G-M', 'any', 'Dolls & Figures'),
+    ('Q-N-001', 'exact', 'Health & Care'),
+    ('Q-N-002', 'exact', 'Health & Care'),
+    ('Q-N-003', 'exact', 'Health & Care'),
+    ('Q-N-004', 'exact', 'Health & Care'),
+    ('Q-N-0', 'decimal', [(5, 19, 'Condoms & Protection')]),
+    ('Q-N-020', 'exact', 'Male Toys'),
+    ('Q-N-021', 'exact', 'Male Toys'),
+    ('Q-N-022', 'exact', 'Male Toys'),
+    ('Q-N-023', 'exact', 'Condoms & Protection'),
+    ('Q-N-024', 'any', 'Male Toys')
+]
+
+_INTEGER = re.compile(r'[0-9]+')
+_DECIMAL = re.compile(r'([0-9]+)(?:\.[0-9]+)?')
+
+
+def category(name):
+    """{'en', 'cn'} of a category name"""
+    return {'en': name, 'cn': CATEGORIES[name]}
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over a set of keywords
+
+    Every keyword carries a value. search() yields the value of each keyword
+    occurrence in one left-to-right scan; walk() follows the trie from the
+    start of the text only, yielding (end position, value) for each keyword
+    that is a prefix of it.
+    """
+    def __init__(self, keywords):
+        # Node i: goto[i] {char: node}, fail[i], out[i] [values of keywords ending here]
+        self.goto = [{}]
+        self.out = [[]]
+        for keyword, value in keywords:
+            node = 0
+            for ch in keyword:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.out.append([])
+                node = nxt
+            self.out[node].append(value)
+
+        # walk() only reports keywords ending exactly at a node, search() also
+        # those ending there as a suffix, merged in from the failure links
+        self.own = [list(values) for values in self.out]
+        self.fail = [0] * len(self.goto)
+        queue = list(self.goto[0].values())
+        for node in queue:
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                fallback = self.fail[node]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(ch, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def search(self, text):
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                yield from out[node]
+
+    def walk(self, text):
+        node = 0
+        for position, ch in enumerate(text, start=1):
+            node = self.goto[node].get(ch)
+            if node is None:
+                return
+            for value in self.own[node]:
+                yield position, value
+
+
+class ProductCategorizer:
+    """
+    Categorise products with the compiled code and keyword rules
+
+    categorize(product) writes product['category'] = {'en', 'cn'} and keeps
+    counts per category and method, plus the ambiguous products for the report.
+    """
+    def __init__(self, code_rules=CODE_RULES, name_keywords=NAME_KEYWORDS):
+        self.priority = {name: i for i, (name, _) in enumerate(name_keywords)}
+        self.names = KeywordAutomaton((keyword.lower(), (name, keyword))
+                                      for name, keywords in name_keywords for keyword in keywords)
+        # Number ranges get their lower bounds precomputed for bisect
+        self.codes = KeywordAutomaton(
+            (prefix, (order, rest, target, [r[0] for r in target] if isinstance(target, list) else None))
+            for order, (prefix, rest, target) in enumerate(code_rules))
+        self.counts = Counter()
+        self.methods = Counter()
+        self.ambiguous = []
+
+    def _by_code(self, code):
+        """Category the first matching 序号 rule gives, or None"""
+        best = None
+        for end, (order, rest_kind, target, lows) in self.codes.walk(code):
+            if best is not None and order > best[0]:
+                continue
+            rest = code[end:]
+            if rest_kind == 'exact' and rest:
+                continue
+            if rest_kind in ('integer', 'decimal'):
+                match = (_INTEGER if rest_kind == 'integer' else _DECIMAL).fullmatch(rest)
+                if not match:
+                    continue
+                number = int(match.group(0) if rest_kind == 'integer' else match.group(1))
+                i = bisect_right(lows, number) - 1
+                if i < 0 or number > target[i][1]:
+                    continue
+                best = (order, target[i][2])
+            else:
+                best = (order, target)
+        return best[1] if best else None
+
+    def _by_name(self, name):
+        """{category: [keywords found]} for every category the name matches"""
+        found = {}
+        for category_name, keyword in self.names.search(name.lower()):
+            keywords = found.setdefault(category_name, [])
+            if keyword not in keywords:
+                keywords.append(keyword)
+        return found
+
+    def classify(self, code, name):
+        """(category name, method, {category: keywords}) for one product"""
+        code = (code or '').strip().upper()
+        by_code = self._by_code(code) if code else None
+        by_name = self._by_name(name or '')
+        if by_code:
+            return by_code, 'code', by_name
+        if by_name:
+            return min(by_name, key=self.priority.get), 'name', by_name
+        return DEFAULT_CATEGORY_NAME, 'default', by_name
+
+    def categorize(self, product):
+        code = str(product.get('序号') or '')
+        chosen, method, by_name = self.classify(code, product.get('名称'))
+        product['category'] = category(chosen)
+        self.counts[chosen] += 1
+        self.methods[method] += 1
+
+        others = {k: v for k, v in by_name.items() if k != chosen}
+        if others:
+            self.ambiguous.append({
+                'rowNumber': product.get('rowNumber'),
+                '序号': code,
+                '名称': product.get('名称', ''),
+                'category': chosen,
+                'method': method,
+                'keywords': by_name.get(chosen, []),
+                'alsoMatched': others
+            })
+        return product['category']
+
+    def __call__(self, product):
+        """Category of a product, computing it when the record has none (MongoProductSink hook)"""
+        existing = product.get('category')
+        if isinstance(existing, dict) and existing.get('en'):
+            return existing
+        return self.categorize(product)
+
+    def report(self):
+        return {
+            'categories': dict(self.counts.most_common()),
+            'methods': dict(self.methods),
+            'ambiguousProducts': len(self.ambiguous),
+            'ambiguous': self.ambiguous
+        }
+
+    def save_report(self, output_dir):
+        report_path = Path(output_dir) / CATEGORY_REPORT_NAME
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        return report_path
+
+    def print_summary(self):
+        print("=== Categories ===")
+        for name, count in self.counts.most_common():
+            print(f"  {name} ({CATEGORIES[name]}): {count}")
+        print(f"  By code: {self.methods['code']}, by name: {self.methods['name']}, "
+              f"default: {self.methods['default']}")
+        print(f"  Ambiguous: {len(self.ambiguous)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Categorise an extracted products file and report ambiguous matches')
+    parser.add_argument('products_file', help='extracted_products_with_images.json / .ndjson')
+    parser.add_argument('--show', type=int, default=10, help='Ambiguous products to print (default: 10)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.products_file):
+        print(f"Error: File not found: {args.products_file}")
+        sys.exit(1)
+
+    categorizer = ProductCategorizer()
+    for product in read_products(args.products_file):
+        categorizer.categorize(product)
+    categorizer.print_summary()
+    for entry in categorizer.ambiguous[:args.show]:
+        others = ', '.join(f"{k} ({'/'.join(v)})" for k, v in entry['alsoMatched'].items())
+        print(f"  Row {entry['rowNumber']} \"{entry['名称'][:30]}\": {entry['category']} by {entry['method']}, also {others}")
+    report_path = categorizer.save_report(Path(args.products_file).parent)
+    print(f"\nReport saved to: {report_path}")
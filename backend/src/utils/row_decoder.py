@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Header-driven decoding of price-list rows into product dicts
+The columns are found once per sheet from its header row (序号, 名称,
+电池型号 … 重量KG), so a supplier moving or inserting columns doesn't shift
+every field. RowDecoder compiles a decode function for that layout, so a row
+costs one index and one conversion per field. A numeric cell that can't be
+read, like '24个/箱' under 数量, is recorded as a CellError and the field falls
+back to 0 instead of aborting the extraction.
+"""
+import argparse
+import os
+import sys
+import unicodedata
+from collections import namedtuple
+
+from openpyxl.utils import get_column_letter
+
+# (header, converter, default) in product record order
+FIELDS = (
+    ('序号', str, ''),
+    ('名称', str, ''),
+    ('电池型号', str, '无'),
+    ('单位', str, ''),
+    ('价格', float, 0),
+    ('数量', int, 0),
+    ('规格', str, ''),
+    ('金额', float, 0),
+    ('建议价', float, 0),
+    ('市值', float, 0),
+    ('条码', str, ''),
+    ('重量KG', float, 0),
+)
+HEADERS = tuple(header for header, _, _ in FIELDS)
+
+# Layout of the current 报价单 (picture in A, 序号..重量KG in B..M under a
+# header in row 2), used when no header row is found
+DEFAULT_HEADER_ROW = 2
+DEFAULT_COLUMNS = {header: index + 1 for index, header in enumerate(HEADERS)}
+HEADER_SCAN_ROWS = 10
+
+CellError = namedtuple('CellError', 'row column field value expected')
+
+
+def _header_key(value):
+    """Header cells compare without whitespace, brackets, width or case differences: 重量（kg） is 重量KG"""
+    text = unicodedata.normalize('NFKC', str(value)).upper()
+    return ''.join(ch for ch in text if not ch.isspace() and ch not in '()[]')
+
+
+_HEADER_KEYS = {_header_key(header): header for header in HEADERS}
+
+
+class RowSchema:
+    """Column index (0-based) of each field found in a sheet, and its header row"""
+    def __init__(self, columns, header_row, detected):
+        self.columns = dict(columns)
+        self.header_row = header_row
+        self.detected = detected
+
+    @property
+    def max_column(self):
+        """Number of columns a row needs to be read up to (1-based last column)"""
+        return max(self.columns.values()) + 1
+
+    @property
+    def missing(self):
+        return [header for header in HEADERS if header not in self.columns]
+
+    def letters(self):
+        return {header: get_column_letter(self.columns[header] + 1)
+                for header in HEADERS if header in self.columns}
+
+    def describe(self):
+        return ', '.join(f"{header}={letter}" for header, letter in self.letters().items())
+
+
+def detect_schema(rows, scan_rows=HEADER_SCAN_ROWS, default_columns=DEFAULT_COLUMNS,
+                  default_header_row=DEFAULT_HEADER_ROW):
+    """
+    Find the header row among the first scan_rows value tuples: the first row
+    holding both 序号 and 名称. Falls back to default_columns under
+    default_header_row (0 decodes every row), the layout the caller's sheets have
+    """
+    for row_num, row in enumerate(rows, start=1):
+        if row_num > scan_rows:
+            break
+        columns = {}
+        for index, value in enumerate(row):
+            if value is None:
+                continue
+            header = _HEADER_KEYS.get(_header_key(value))
+            if header is not None:
+                columns.setdefault(header, index)
+        if '序号' in columns and '名称' in columns:
+            return RowSchema(columns, row_num, detected=True)
+    return RowSchema(default_columns, default_header_row, detected=False)
+
+
+class RowDecoder:
+    """
+    Product dicts from value tuples, compiled for one RowSchema
+
+    The decode function is generated from the schema with every column index
+    and converter written in, like namedtuple does for its classes: a row is
+    padded to the schema width once, then each field is a plain index and
+    conversion with no per-field length checks or table lookups. Cells that
+    don't convert are collected in errors
+    """
+    def __init__(self, schema):
+        self.schema = schema
+        self.errors = []
+        self.source = self._source(schema)
+        namespace = {'error': self._error}
+        exec(compile(self.source, '<row decoder>', 'exec'), namespace)
+        self.decode = namespace['decode']
+        self.decode.__doc__ = "Product dict (without images) for one row, None for header and empty rows"
+
+    def _error(self, row_num, column, header, value, expected):
+        self.errors.append(CellError(row_num, get_column_letter(column + 1), header, str(value), expected))
+
+    @staticmethod
+    def _source(schema):
+        columns = schema.columns
+        width = schema.max_column
+        code = f"row[{columns['序号']}]" if '序号' in columns else 'None'
+        lines = [
+            'def decode(row_num, row):',
+            f'    if row_num <= {schema.header_row}:',
+            '        return None',
+            f'    if len(row) < {width}:',
+            f'        row = (*row, *(None,) * ({width} - len(row)))',
+            f"    name = row[{columns['名称']}]",
+            "    name = str(name).strip() if name else ''",
+            '    if not name:',
+            '        return None',
+            f'    code = {code}',
+            "    code = str(code).strip() if code else ''",
+            '    # Header rows repeated further down the sheet',
+            "    if code == '序号' or name == '名称' or name == '产品图':",
+            '        return None',
+            "    product = {'rowNumber': row_num, '序号': code, '名称': name}",
+        ]
+        for header, convert, default in FIELDS[2:]:
+            column = columns.get(header)
+            if column is None:
+                lines.append(f'    product[{header!r}] = {default!r}')
+            elif convert is str:
+                lines.append(f'    value = row[{column}]')
+                lines.append(f'    product[{header!r}] = str(value).strip() if value else {default!r}')
+            else:
+                lines += [
+                    f'    value = row[{column}]',
+                    '    if not value:',
+                    f'        product[{header!r}] = {default!r}',
+                    '    else:',
+                    '        try:',
+                    f'            product[{header!r}] = {convert.__name__}(value)',
+                    '        except (TypeError, ValueError):',
+                    f'            product[{header!r}] = {default!r}',
+                    f'            error(row_num, {column}, {header!r}, value, {convert.__name__!r})',
+                ]
+        lines += ["    product['图片'] = []", '    return product']
+        return '\n'.join(lines) + '\n'
+
+    def print_errors(self, limit=10):
+        print(f"Cells that could not be converted: {len(self.errors)}")
+        for error in self.errors[:limit]:
+            print(f"  Row {error.row}, {error.field} ({error.column}{error.row}): "
+                  f"{error.value!r} is not {'an' if error.expected == 'int' else 'a'} {error.expected}")
+        if len(self.errors) > limit:
+            print(f"  ... and {len(self.errors) - limit} more")
+
+
+if __name__ == '__main__':
+    from openpyxl import load_workbook
+
+    parser = argparse.ArgumentParser(description='Show the column layout detected for a price list')
+    parser.add_argument('excel_file', help='Path to the .xlsx file')
+    parser.add_argument('--sheet', default=None, help='Worksheet (default: the active sheet)')
+    parser.add_argument('--check', action='store_true', help='Decode every row and list the cells that fail')
+    parser.add_argument('--source', action='store_true', help='Print the decoder generated for the sheet')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.excel_file):
+        print(f"Error: Excel file not found: {args.excel_file}")
+        sys.exit(1)
+
+    workbook = load_workbook(args.excel_file, read_only=True, data_only=True, keep_links=False)
+    worksheet = workbook[args.sheet] if args.sheet else workbook.active
+    schema = detect_schema(worksheet.iter_rows(max_row=HEADER_SCAN_ROWS, values_only=True))
+    if schema.detected:
+        print(f"Header row {schema.header_row}: {schema.describe()}")
+    else:
+        print(f"No header row found, default layout: {schema.describe()}")
+    if schema.missing:
+        print(f"Missing columns: {', '.join(schema.missing)}")
+
+    decoder = RowDecoder(schema)
+    if args.source:
+        print(decoder.source)
+    if args.check:
+        products = 0
+        for row_num, row in enumerate(worksheet.iter_rows(max_col=schema.max_column, values_only=True), start=1):
+            if decoder.decode(row_num, row) is not None:
+                products += 1
+        print(f"Products: {products}")
+        decoder.print_errors(limit=50)
+    workbook.close()
@@ -0,0 +1,194 @@
+/**
+ * Reader for the product search index written by search_index.py
+ * The file is a set of fixed-width sorted tables, so it is used as one Buffer
+ * without parsing: name substring search over character pairs, exact
+ * 条码/序号 lookup and 建议价 ranges are all binary searches.
+ */
+
+const fs = require('fs');
+
+const MAGIC = 'PLSI';
+const VERSION = 1;
+const HEADER_SIZE = 72;
+const RECORD_SIZE = 40;
+const ENTRY_SIZE = 16; // n-gram, code and price entries
+const FNV_OFFSET = 0xcbf29ce484222325n;
+const FNV_PRIME = 0x100000001b3n;
+const MASK64 = 0xffffffffffffffffn;
+
+// Must match normalize() in search_index.py
+function normalize(text) {
+  return String(text || '').normalize('NFKC').toLowerCase().replace(/\s+/g, '');
+}
+
+function gramKey(chars) {
+  const first = BigInt(chars[0].codePointAt(0));
+  const second = chars.length > 1 ? BigInt(chars[1].codePointAt(0)) : 0n;
+  return (first << 21n) | second;
+}
+
+function codeHash(code) {
+  let value = FNV_OFFSET;
+  for (const byte of Buffer.from(normalize(code), 'utf8')) {
+    value = ((value ^ BigInt(byte)) * FNV_PRIME) & MASK64;
+  }
+  return value;
+}
+
+class SearchIndex {
+  constructor(buffer) {
+    if (buffer.toString('latin1', 0, 4) !== MAGIC || buffer.readUInt32LE(4) !== VERSION) {
+      throw new Error(`Not a version ${VERSION} search index`);
+    }
+    this.buffer = buffer;
+    this.recordCount = buffer.readUInt32LE(8);
+    this.gramCount = buffer.readUInt32LE(12);
+    this.codeCount = buffer.readUInt32LE(16);
+    [this.recordsAt, this.stringsAt, this.gramsAt, this.postingsAt, this.codesAt, this.pricesAt] =
+      [0, 1, 2, 3, 4, 5].map(i => Number(buffer.readBigUInt64LE(24 + i * 8)));
+  }
+
+  get length() {
+    return this.recordCount;
+  }
+
+  // First entry of a sorted table whose leading field is >= value
+  lowerBound(at, count, read, value) {
+    let low = 0;
+    let high = count;
+    while (low < high) {
+      const mid = (low + high) >> 1;
+      if (read(at + mid * ENTRY_SIZE) < value) {
+        low = mid + 1;
+      } else {
+        high = mid;
+      }
+    }
+    return low;
+  }
+
+  text(offset, length) {
+    const start = this.stringsAt + offset;
+    return this.buffer.toString('utf8', start, start + length);
+  }
+
+  record(id) {
+    const at = this.recordsAt + id * RECORD_SIZE;
+    const b = this.buffer;
+    return {
+      rowNumber: b.readUInt32LE(at),
+      sku: this.text(b.readUInt32LE(at + 4), b.readUInt32LE(at + 8)),
+      name: this.text(b.readUInt32LE(at + 12), b.readUInt32LE(at + 16)),
+      price: b.readDoubleLE(at + 32)
+    };
+  }
+
+  postings(key) {
+    const b = this.buffer;
+    const i = this.lowerBound(this.gramsAt, this.gramCount, at => b.readBigUInt64LE(at), key);
+    const at = this.gramsAt + i * ENTRY_SIZE;
+    if (i === this.gramCount || b.readBigUInt64LE(at) !== key) {
+      return [];
+    }
+    const start = this.postingsAt + b.readUInt32LE(at + 8) * 4;
+    const ids = new Array(b.readUInt32LE(at + 12));
+    for (let j = 0; j < ids.length; j++) {
+      ids[j] = b.readUInt32LE(start + j * 4);
+    }
+    return ids;
+  }
+
+  // Ids of the products whose name contains text, in extraction order
+  search(text) {
+    const norm = normalize(text);
+    const chars = Array.from(norm);
+    if (chars.length === 0) {
+      return [];
+    }
+    if (chars.length === 1) {
+      return this.postings(gramKey(chars));
+    }
+    const lists = [];
+    for (let i = 0; i < chars.length - 1; i++) {
+      lists.push(this.postings(gramKey(chars.slice(i, i + 2))));
+    }
+    lists.sort((a, b) => a.length - b.length);
+    let candidates = new Set(lists[0]);
+    for (const ids of lists.slice(1)) {
+      if (candidates.size === 0) break;
+      const next = new Set(ids);
+      candidates = new Set([...candidates].filter(id => next.has(id)));
+    }
+    // Every pair occurring somewhere doesn't make the whole string occur
+    return [...candidates].sort((a, b) => a - b).filter(id => {
+      const at = this.recordsAt + id * RECORD_SIZE;
+      return chars.length === 2 ||
+        this.text(this.buffer.readUInt32LE(at + 20), this.buffer.readUInt32LE(at + 24)).includes(norm);
+    });
+  }
+
+  // Ids of the products whose 条码 or 序号 equals code
+  lookup(code) {
+    const b = this.buffer;
+    const value = codeHash(code);
+    const ids = [];
+    for (let i = this.lowerBound(this.codesAt, this.codeCount, at => b.readBigUInt64LE(at), value);
+      i < this.codeCount && b.readBigUInt64LE(this.codesAt + i * ENTRY_SIZE) === value; i++) {
+      ids.push(b.readUInt32LE(this.codesAt + i * ENTRY_SIZE + 8));
+    }
+    return ids;
+  }
+
+  // Ids of the products with low <= 建议价 <= high, cheapest first
+  priceRange(low, high) {
+    const b = this.buffer;
+    const readPrice = at => b.readDoubleLE(at);
+    const start = low == null ? 0 : this.lowerBound(this.pricesAt, this.recordCount, readPrice, low);
+    let end = this.recordCount;
+    if (high != null) {
+      end = start;
+      while (end < this.recordCount && readPrice(this.pricesAt + end * ENTRY_SIZE) <= high) {
+        end++;
+      }
+    }
+    const ids = [];
+    for (let i = start; i < end; i++) {
+      ids.push(b.readUInt32LE(this.pricesAt + i * ENTRY_SIZE + 8));
+    }
+    return ids;
+  }
+}
+
+/**
+ * Load an index file, or return null when no path is given or it doesn't exist
+ */
+function loadSearchIndex(indexPath) {
+  if (!indexPath || !fs.existsSync(indexPath)) {
+    return null;
+  }
+  return new SearchIndex(fs.readFileSync(indexPath));
+}
+
+// Command line: node searchIndex.js <search_index.bin> <name text>
+if (require.main === module) {
+  const [indexPath, ...words] = process.argv.slice(2);
+  if (!indexPath || words.length === 0) {
+    console.log('Usage: node searchIndex.js <search_index.bin> <name text>');
+    process.exit(1);
+  }
+  const index = loadSearchIndex(indexPath);
+  if (!index) {
+    console.error(`Error: File not found: ${indexPath}`);
+    process.exit(1);
+  }
+  const started = process.hrtime.bigint();
+  const ids = index.search(words.join(' '));
+  const elapsed = Number(process.hrtime.bigint() - started) / 1e6;
+  console.log(`${ids.length} of ${index.length} products (${elapsed.toFixed(3)} ms)`);
+  ids.slice(0, 20).forEach(id => {
+    const r = index.record(id);
+    console.log(`  Row ${r.rowNumber}: ${r.sku} ${r.name} (${r.price})`);
+  });
+}
+
+module.exports = { SearchIndex, loadSearchIndex, normalize, codeHash };
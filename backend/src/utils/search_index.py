@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Precomputed product search index, written next to the extracted products
+One binary file of fixed-width, sorted tables that is read in place through
+mmap (or a Node Buffer, see searchIndex.js), so loading it costs no parsing:
+
+- name n-grams: every character and character pair of the normalised 名称,
+  with a posting list of product ids. A substring query intersects the
+  postings of its pairs and checks the candidates against the stored name
+- exact codes: FNV-1a hashes of the normalised 条码 and 序号
+- prices: product ids sorted by 建议价, for range queries
+
+Layout (little-endian): a header with the table sizes and offsets, then the
+record, string, n-gram, posting, code and price tables, each 8-byte aligned.
+"""
+import argparse
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+import unicodedata
+from pathlib import Path
+
+from output_writers import read_products
+
+SEARCH_INDEX_NAME = 'search_index.bin'
+MAGIC = b'PLSI'
+VERSION = 1
+
+# magic, version, records, grams, codes, postings, then the offsets of the
+# records, strings, grams, postings, codes and prices tables
+HEADER = struct.Struct('<4sIIIII6Q')
+# rowNumber, sku (offset, length), name, normalised name, 建议价
+RECORD = struct.Struct('<I6I4xd')
+# n-gram key, postings offset (in ids), postings count
+GRAM = struct.Struct('<QII')
+# code hash, product id
+CODE = struct.Struct('<QI4x')
+# 建议价, product id
+PRICE = struct.Struct('<dI4x')
+POSTING = struct.Struct('<I')
+
+_FNV_OFFSET = 0xcbf29ce484222325
+_FNV_PRIME = 0x100000001b3
+_MASK64 = 0xffffffffffffffff
+
+
+def normalize(text):
+    """NFKC, lowercase, whitespace removed: full-width and half-width forms search alike"""
+    return ''.join(unicodedata.normalize('NFKC', str(text or '')).lower().split())
+
+
+def gram_key(chars):
+    """Pack one or two code points into a sortable 64-bit key"""
+    first = ord(chars[0])
+    second = ord(chars[1]) if len(chars) > 1 else 0
+    return (first << 21) | second
+
+
+def name_grams(norm):
+    """Keys of every character and every adjacent pair of a normalised name"""
+    keys = {gram_key(ch) for ch in norm}
+    keys.update(gram_key(norm[i:i + 2]) for i in range(len(norm) - 1))
+    return keys
+
+
+def code_hash(code):
+    """64-bit FNV-1a of the normalised code's UTF-8 bytes"""
+    value = _FNV_OFFSET
+    for byte in normalize(code).encode('utf-8'):
+        value = ((value ^ byte) * _FNV_PRIME) & _MASK64
+    return value
+
+
+def product_sku(product):
+    """Same key the importers give the product document: 条码, else 序号"""
+    code = str(product.get('序号') or '').strip()
+    return str(product.get('条码') or code).strip()
+
+
+def _align(buffer):
+    buffer.extend(b'\0' * (-len(buffer) % 8))
+    return len(buffer)
+
+
+class SearchIndexBuilder:
+    """Collects products as they are extracted and writes the index file"""
+    def __init__(self):
+        self.records = []
+        self.strings = bytearray()
+        self._string_offsets = {}
+        self.grams = {}
+        self.codes = []
+        self.prices = []
+        self.seconds = 0.0
+
+    def _string(self, text):
+        data = text.encode('utf-8')
+        offset = self._string_offsets.get(data)
+        if offset is None:
+            offset = self._string_offsets[data] = len(self.strings)
+            self.strings.extend(data)
+        return offset, len(data)
+
+    def add(self, product):
+        started = time.perf_counter()
+        product_id = len(self.records)
+        name = (product.get('名称') or '').strip()
+        norm = normalize(name)
+        price = float(product.get('建议价') or 0)
+        self.records.append((product.get('rowNumber') or 0, *self._string(product_sku(product)),
+                             *self._string(name), *self._string(norm), price))
+        for key in name_grams(norm):
+            self.grams.setdefault(key, []).append(product_id)
+        codes = {normalize(product.get('条码')), normalize(product.get('序号'))}
+        self.codes.extend((code_hash(code), product_id) for code in codes if code)
+        self.prices.append((price, product_id))
+        self.seconds += time.perf_counter() - started
+
+    def __len__(self):
+        return len(self.records)
+
+    def save(self, path):
+        """Write the index atomically and return its size in bytes"""
+        started = time.perf_counter()
+        body = bytearray(HEADER.size)
+        offsets = [_align(body)]
+        for record in self.records:
+            body.extend(RECORD.pack(*record))
+
+        offsets.append(_align(body))
+        body.extend(self.strings)
+
+        offsets.append(_align(body))
+        postings = []
+        for key in sorted(self.grams):
+            ids = self.grams[key]
+            body.extend(GRAM.pack(key, len(postings), len(ids)))
+            postings.extend(ids)
+
+        offsets.append(_align(body))
+        body.extend(struct.pack(f'<{len(postings)}I', *postings))
+
+        offsets.append(_align(body))
+        for value, product_id in sorted(set(self.codes)):
+            body.extend(CODE.pack(value, product_id))
+
+        offsets.append(_align(body))
+        for price, product_id in sorted(self.prices):
+            body.extend(PRICE.pack(price, product_id))
+
+        HEADER.pack_into(body, 0, MAGIC, VERSION, len(self.records), len(self.grams),
+                         len(set(self.codes)), len(postings), *offsets)
+        path = Path(path)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+        self.seconds += time.perf_counter() - started
+        return len(body)
+
+
+class SearchIndex:
+    """
+    Read-only view of an index file through mmap; every lookup is a binary
+    search over one of the sorted tables
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.record_count, self.gram_count, self.code_count, _,
+         self.records_at, self.strings_at, self.grams_at, self.postings_at,
+         self.codes_at, self.prices_at) = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            self.buffer.close()
+            raise ValueError(f"{path} is not a version {VERSION} search index")
+
+    def close(self):
+        self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.record_count
+
+    def _lower_bound(self, at, count, layout, value):
+        """First entry of a sorted table whose leading field is >= value"""
+        low, high = 0, count
+        while low < high:
+            mid = (low + high) // 2
+            if layout.unpack_from(self.buffer, at + mid * layout.size)[0] < value:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def _text(self, offset, length):
+        start = self.strings_at + offset
+        return self.buffer[start:start + length].decode('utf-8')
+
+    def record(self, product_id):
+        """{'rowNumber', 'sku', '名称', '建议价'} of one product"""
+        row, sku_at, sku_len, name_at, name_len, _, _, price = RECORD.unpack_from(
+            self.buffer, self.records_at + product_id * RECORD.size)
+        return {'rowNumber': row, 'sku': self._text(sku_at, sku_len),
+                '名称': self._text(name_at, name_len), '建议价': price}
+
+    def _postings(self, key):
+        i = self._lower_bound(self.grams_at, self.gram_count, GRAM, key)
+        if i == self.gram_count:
+            return []
+        found, start, count = GRAM.unpack_from(self.buffer, self.grams_at + i * GRAM.size)
+        if found != key:
+            return []
+        return struct.unpack_from(f'<{count}I', self.buffer, self.postings_at + start * POSTING.size)
+
+    def search(self, text):
+        """Ids of the products whose name contains text, in extraction order"""
+        norm = normalize(text)
+        if not norm:
+            return []
+        if len(norm) == 1:
+            return list(self._postings(gram_key(norm)))
+        # Rarest pair first, so the intersection shrinks as fast as possible
+        postings = sorted((self._postings(gram_key(norm[i:i + 2])) for i in range(len(norm) - 1)), key=len)
+        candidates = set(postings[0])
+        for ids in postings[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(ids)
+        result = []
+        for product_id in sorted(candidates):
+            # Every pair occurring somewhere doesn't make the whole string occur
+            _, _, _, _, _, norm_at, norm_len, _ = RECORD.unpack_from(
+                self.buffer, self.records_at + product_id * RECORD.size)
+            if len(norm) == 2 or norm in self._text(norm_at, norm_len):
+                result.append(product_id)
+        return result
+
+    def lookup(self, code):
+        """Ids of the products whose 条码 or 序号 equals code"""
+        value = code_hash(code)
+        i = self._lower_bound(self.codes_at, self.code_count, CODE, value)
+        ids = []
+        while i < self.code_count:
+            found, product_id = CODE.unpack_from(self.buffer, self.codes_at + i * CODE.size)
+            if found != value:
+                break
+            ids.append(product_id)
+            i += 1
+        return ids
+
+    def price_range(self, low=None, high=None):
+        """Ids of the products with low <= 建议价 <= high, cheapest first"""
+        start = 0 if low is None else self._lower_bound(self.prices_at, self.record_count, PRICE, low)
+        end = self.record_count
+        if high is not None:
+            # First entry above high: lower bound of the next representable price
+            end = self._lower_bound(self.prices_at, self.record_count, PRICE, math.nextafter(float(high), math.inf))
+        return [PRICE.unpack_from(self.buffer, self.prices_at + i * PRICE.size)[1] for i in range(start, end)]
+
+    def query(self, text=None, code=None, min_price=None, max_price=None):
+        """Combine the filters that are given; returns product ids in extraction order"""
+        result = None
+        for ids in (self.search(text) if text else None,
+                    self.lookup(code) if code else None,
+                    self.price_range(min_price, max_price) if min_price is not None or max_price is not None else None):
+            if ids is not None:
+                result = set(ids) if result is None else result.intersection(ids)
+        return sorted(result) if result is not None else list(range(self.record_count))
+
+
+def build_search_index(products, path):
+    """Index an iterable of products into path; returns (products indexed, bytes)"""
+    builder = SearchIndexBuilder()
+    for product in products:
+        builder.add(product)
+    return len(builder), builder.save(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build or query the product search index')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help='Index an extracted products file (json, compact or ndjson)')
+    build.add_argument('products_file')
+    build.add_argument('-o', '--output', default=None,
+                       help=f'Index file (default: {SEARCH_INDEX_NAME} next to the products file)')
+    query = sub.add_parser('query', help='Look products up in an index')
+    query.add_argument('index_file')
+    query.add_argument('text', nargs='?', default=None, help='Substring of the product name')
+    query.add_argument('--code', default=None, help='Exact 条码 or 序号')
+    query.add_argument('--min-price', type=float, default=None)
+    query.add_argument('--max-price', type=float, default=None)
+    query.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        if not os.path.exists(args.products_file):
+            print(f"Error: File not found: {args.products_file}")
+            sys.exit(1)
+        output = args.output or Path(args.products_file).parent / SEARCH_INDEX_NAME
+        count, size = build_search_index(read_products(args.products_file), output)
+        print(f"Indexed {count} products into {output} ({size/1024:.1f} KB)")
+    else:
+        with SearchIndex(args.index_file) as index:
+            started = time.perf_counter()
+            ids = index.query(args.text, args.code, args.min_price, args.max_price)
+            elapsed = (time.perf_counter() - started) * 1000
+            print(f"{len(ids)} of {len(index)} products ({elapsed:.3f} ms)")
+            for product_id in ids[:args.limit]:
+                record = index.record(product_id)
+                print(f"  Row {record['rowNumber']}: {record['sku']} {record['名称']} ({record['建议价']})")
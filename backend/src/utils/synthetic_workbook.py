@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic supplier price-list workbooks for benchmarking
+The workbook uses the same layout as the real 报价单 (title row, header row,
+then 序号, 名称, 电池型号 … 重量KG) with embedded PNG pictures anchored by
+one-cell and two-cell anchors. The XLSX parts are written directly, so even
+100k-row workbooks take seconds to build. A <workbook>.truth.json sidecar
+records which media member belongs to each row for accuracy checks.
+"""
+import argparse
+import json
+import random
+import struct
+import sys
+import zlib
+from pathlib import Path
+from xml.sax.saxutils import escape
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+
+HEADERS = ['序号', '名称', '电池型号', '单位', '价格', '数量', '规格', '金额', '建议价', '市值', '条码', '重量KG']
+
+# 'improved': picture in column A, data in B..M (extract_with_openpyxl_improved)
+# 'legacy': data in A..L, picture in column M (extract_with_openpyxl)
+LAYOUTS = {
+    'improved': {'data_col': 2, 'picture_col': 1},
+    'legacy': {'data_col': 1, 'picture_col': 13}
+}
+
+NAME_PREFIXES = ['儿童', '益智', '大号', '迷你', '新款', '卡通', '合金', '电动', '遥控', '发光']
+NAME_ITEMS = ['遥控车', '积木', '毛绒玩具', '水枪', '拼图', '火车轨道', '娃娃', '魔方', '溜溜球', '泡泡机',
+              '挖掘机', '飞机', '恐龙', '厨房玩具', '滑板车', '画板', '弹珠', '陀螺', '听诊器套装', '钓鱼玩具']
+BATTERIES = ['3节AA', '2节AAA', '4节AA', 'USB充电', '纽扣电池', None, None, None]
+UNITS = ['个', '盒', '套', '只', '台']
+
+EMU_PER_PIXEL = 9525
+ROW_HEIGHT_EMU = 60 * EMU_PER_PIXEL
+
+NS_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+NS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+NS_PKG_REL = 'http://schemas.openxmlformats.org/package/2006/relationships'
+NS_XDR = 'http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing'
+NS_A = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+
+
+def column_letter(col):
+    """1 -> A, 27 -> AA"""
+    letters = ''
+    while col:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def make_png(rng, size):
+    """A size x size RGB PNG filled with noise, so it doesn't compress to nothing"""
+    raw = b''.join(b'\x00' + rng.randbytes(size * 3) for _ in range(size))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    header = struct.pack('>IIBBBBB', size, size, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(raw, 6)) + chunk(b'IEND', b'')
+
+
+def _product_values(rng, index):
+    price = round(rng.uniform(2, 300), 2)
+    quantity = rng.randint(1, 500)
+    return [
+        index + 1,
+        f"{rng.choice(NAME_PREFIXES)}{rng.choice(NAME_ITEMS)} {rng.randint(100, 9999)}",
+        rng.choice(BATTERIES),
+        rng.choice(UNITS),
+        price,
+        quantity,
+        f"{rng.choice([12, 24, 36, 48, 72])}个/箱",
+        round(price * quantity, 2),
+        round(price * rng.uniform(1.3, 2.2), 2),
+        round(price * rng.uniform(2.0, 3.5), 2),
+        f"69{rng.randint(10 ** 10, 10 ** 11 - 1)}",
+        round(rng.uniform(0.05, 5), 2)
+    ]
+
+
+class _SharedStrings:
+    def __init__(self):
+        self.index = {}
+        self.count = 0
+
+    def add(self, text):
+        self.count += 1
+        if text not in self.index:
+            self.index[text] = len(self.index)
+        return self.index[text]
+
+
+def _cell(ref, value, strings):
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return f'<c r="{ref}" t="s"><v>{strings.add(value)}</v></c>'
+    return f'<c r="{ref}"><v>{value}</v></c>'
+
+
+def _marker(tag, col, row, col_off=0, row_off=0):
+    return (f'<xdr:{tag}><xdr:col>{col}</xdr:col><xdr:colOff>{col_off}</xdr:colOff>'
+            f'<xdr:row>{row}</xdr:row><xdr:rowOff>{row_off}</xdr:rowOff></xdr:{tag}>')
+
+
+def _picture(shape_id, rel_id, size):
+    ext = size * EMU_PER_PIXEL
+    return (f'<xdr:pic><xdr:nvPicPr><xdr:cNvPr id="{shape_id}" name="Picture {shape_id}"/>'
+            f'<xdr:cNvPicPr><a:picLocks noChangeAspect="1"/></xdr:cNvPicPr></xdr:nvPicPr>'
+            f'<xdr:blipFill><a:blip r:embed="{rel_id}"/><a:stretch><a:fillRect/></a:stretch></xdr:blipFill>'
+            f'<xdr:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{ext}" cy="{ext}"/></a:xfrm>'
+            f'<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></xdr:spPr></xdr:pic>')
+
+
+def generate_workbook(path, rows, layout='improved', image_ratio=0.9, two_cell_ratio=0.5,
+                      offset_ratio=0.1, duplicate_ratio=0.2, image_px=48, seed=65):
+    """
+    Write a synthetic price-list workbook and its truth sidecar
+
+    rows: number of product rows
+    image_ratio: share of rows that have a picture
+    two_cell_ratio: share of pictures using twoCellAnchor instead of oneCellAnchor
+    offset_ratio: share of two-cell pictures that start in the row above and
+    hang down into their own row, like hand-placed pictures do
+    duplicate_ratio: share of pictures that reuse an earlier photo (same media member)
+    Returns the truth dict {row number: media member}
+    """
+    rng = random.Random(seed)
+    columns = LAYOUTS[layout]
+    data_col, picture_col = columns['data_col'], columns['picture_col']
+    last_col = max(data_col + len(HEADERS) - 1, picture_col)
+    last_row = rows + 2
+
+    strings = _SharedStrings()
+    truth = {}
+    media = []
+    anchors = []
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with ZipFile(path, 'w', ZIP_DEFLATED) as zf:
+        with zf.open('xl/worksheets/sheet1.xml', 'w') as raw:
+            def out(text):
+                raw.write(text.encode('utf-8'))
+
+            out(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                f'<worksheet xmlns="{NS_MAIN}" xmlns:r="{NS_REL}">'
+                f'<dimension ref="A1:{column_letter(last_col)}{last_row}"/><sheetData>')
+            out(f'<row r="1">{_cell("A1", "配货中心 最新全品类报价单", strings)}</row>')
+            header_cells = ''.join(_cell(f"{column_letter(data_col + i)}2", h, strings) for i, h in enumerate(HEADERS))
+            if layout == 'improved':
+                header_cells = _cell('A2', '产品图', strings) + header_cells
+            out(f'<row r="2">{header_cells}</row>')
+
+            for index in range(rows):
+                row_num = index + 3
+                values = _product_values(rng, index)
+                cells = ''.join(_cell(f"{column_letter(data_col + i)}{row_num}", v, strings)
+                                for i, v in enumerate(values))
+                out(f'<row r="{row_num}">{cells}</row>')
+
+                if rng.random() >= image_ratio:
+                    continue
+                if media and rng.random() < duplicate_ratio:
+                    member = rng.choice(media)
+                else:
+                    member = f"xl/media/image{len(media) + 1}.png"
+                    media.append(member)
+                truth[row_num] = member
+                anchors.append((row_num, member))
+
+            out('</sheetData><drawing r:id="rId1"/></worksheet>')
+
+        # PNGs are already compressed; each one has its own seed so they can
+        # be written after the sheet without being held in memory
+        for i, member in enumerate(media):
+            zf.writestr(member, make_png(random.Random(seed * 1000003 + i), image_px), compress_type=ZIP_STORED)
+
+        # Drawing part, one relationship per distinct media member
+        rel_ids = {member: f"rId{i + 1}" for i, member in enumerate(media)}
+        with zf.open('xl/drawings/drawing1.xml', 'w') as raw:
+            raw.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                      f'<xdr:wsDr xmlns:xdr="{NS_XDR}" xmlns:a="{NS_A}" xmlns:r="{NS_REL}">'.encode('utf-8'))
+            col = picture_col - 1
+            for shape_id, (row_num, member) in enumerate(anchors, start=2):
+                row = row_num - 1
+                picture = _picture(shape_id, rel_ids[member], image_px)
+                if rng.random() < two_cell_ratio:
+                    if rng.random() < offset_ratio:
+                        # Starts near the bottom of the row above, most of it sits in its own row
+                        start = _marker('from', col, row - 1, 0, int(ROW_HEIGHT_EMU * 0.8))
+                        end = _marker('to', col + 1, row, 0, int(ROW_HEIGHT_EMU * 0.6))
+                    else:
+                        start = _marker('from', col, row, EMU_PER_PIXEL * 4, EMU_PER_PIXEL * 4)
+                        end = _marker('to', col, row, EMU_PER_PIXEL * 52, EMU_PER_PIXEL * 52)
+                    anchor = f'<xdr:twoCellAnchor editAs="oneCell">{start}{end}{picture}<xdr:clientData/></xdr:twoCellAnchor>'
+                else:
+                    ext = image_px * EMU_PER_PIXEL
+                    anchor = (f'<xdr:oneCellAnchor>{_marker("from", col, row, EMU_PER_PIXEL * 4, EMU_PER_PIXEL * 4)}'
+                              f'<xdr:ext cx="{ext}" cy="{ext}"/>{picture}<xdr:clientData/></xdr:oneCellAnchor>')
+                raw.write(anchor.encode('utf-8'))
+            raw.write(b'</xdr:wsDr>')
+
+        image_rel = f'{NS_REL}/image'
+        zf.writestr('xl/drawings/_rels/drawing1.xml.rels',
+                    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="{NS_PKG_REL}">'
+                    + ''.join(f'<Relationship Id="{rel_ids[m]}" Type="{image_rel}" Target="../media/{Path(m).name}"/>'
+                              for m in media)
+                    + '</Relationships>')
+
+        shared = ''.join(f'<si><t xml:space="preserve">{escape(text)}</t></si>' for text in strings.index)
+        zf.writestr('xl/sharedStrings.xml',
+                    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    f'<sst xmlns="{NS_MAIN}" count="{strings.count}" uniqueCount="{len(strings.index)}">{shared}</sst>')
+
+        zf.writestr('[Content_Types].xml',
+                    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                    '<Default Extension="xml" ContentType="application/xml"/>'
+                    '<Default Extension="png" ContentType="image/png"/>'
+                    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                    '<Override PartName="/xl/drawings/drawing1.xml" ContentType="application/vnd.openxmlformats-officedocument.drawing+xml"/>'
+                    '<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+                    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+                    '</Types>')
+        zf.writestr('_rels/.rels',
+                    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="{NS_PKG_REL}">'
+                    f'<Relationship Id="rId1" Type="{NS_REL}/officeDocument" Target="xl/workbook.xml"/></Relationships>')
+        zf.writestr('xl/workbook.xml',
+                    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    f'<workbook xmlns="{NS_MAIN}" xmlns:r="{NS_REL}"><bookViews><workbookView activeTab="0"/></bookViews>'
+                    f'<sheets><sheet name="报价单" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        zf.writestr('xl/_rels/workbook.xml.rels',
+                    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="{NS_PKG_REL}">'
+                    f'<Relationship Id="rId1" Type="{NS_REL}/worksheet" Target="worksheets/sheet1.xml"/>'
+                    f'<Relationship Id="rId2" Type="{NS_REL}/sharedStrings" Target="sharedStrings.xml"/>'
+                    f'<Relationship Id="rId3" Type="{NS_REL}/styles" Target="styles.xml"/></Relationships>')
+        zf.writestr('xl/worksheets/_rels/sheet1.xml.rels',
+                    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="{NS_PKG_REL}">'
+                    f'<Relationship Id="rId1" Type="{NS_REL}/drawing" Target="../drawings/drawing1.xml"/></Relationships>')
+        zf.writestr('xl/styles.xml',
+                    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    f'<styleSheet xmlns="{NS_MAIN}"><fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+                    f'<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+                    f'<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+                    f'<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+                    f'<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+                    f'<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+                    f'</styleSheet>')
+
+    truth_path = Path(f"{path}.truth.json")
+    with open(truth_path, 'w', encoding='utf-8') as f:
+        json.dump({'layout': layout, 'rows': rows, 'images': len(media), 'truth': truth}, f)
+
+    return truth
+
+
+def load_truth(path):
+    """Read the truth sidecar of a generated workbook as {row number: media member}"""
+    with open(f"{path}.truth.json", 'r', encoding='utf-8') as f:
+        return {int(row): member for row, member in json.load(f)['truth'].items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic price-list workbook')
+    parser.add_argument('output', help='Path of the .xlsx file to write')
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--layout', choices=sorted(LAYOUTS), default='improved')
+    parser.add_argument('--image-ratio', type=float, default=0.9)
+    parser.add_argument('--two-cell-ratio', type=float, default=0.5)
+    parser.add_argument('--offset-ratio', type=float, default=0.1)
+    parser.add_argument('--duplicate-ratio', type=float, default=0.2)
+    parser.add_argument('--image-px', type=int, default=48)
+    parser.add_argument('--seed', type=int, default=65)
+    args = parser.parse_args()
+
+    truth = generate_workbook(args.output, args.rows, layout=args.layout, image_ratio=args.image_ratio,
+                              two_cell_ratio=args.two_cell_ratio, offset_ratio=args.offset_ratio,
+                              duplicate_ratio=args.duplicate_ratio, image_px=args.image_px, seed=args.seed)
+    print(f"Wrote {args.output}: {args.rows} rows, {len(truth)} pictures, {len(set(truth.values()))} media files")
+    sys.exit(0)
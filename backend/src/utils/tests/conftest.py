@@ -0,0 +1,21 @@
+"""
+Shared fixtures for the extraction tests
+The scripts import each other as top-level modules, as when they run from
+this directory, so the directory goes on sys.path first.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from synthetic_workbook import generate_workbook  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def workbook(tmp_path_factory):
+    """A small synthetic price list in the improved layout, with pictures"""
+    path = tmp_path_factory.mktemp('workbook') / 'price.xlsx'
+    generate_workbook(path, 60, seed=7)
+    return path
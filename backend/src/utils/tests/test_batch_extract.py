@@ -0,0 +1,53 @@
+import json
+import os
+
+from batch_extract import IMAGES_DIR, PARTS_DIR, batch_extract
+from output_writers import read_products
+from synthetic_workbook import generate_workbook
+
+
+def test_same_named_workbooks_are_merged_apart(tmp_path):
+    # Two price.xlsx from different suppliers' directories
+    for directory, rows, seed in (('a', 20, 1), ('b', 30, 2)):
+        (tmp_path / directory).mkdir()
+        generate_workbook(tmp_path / directory / 'price.xlsx', rows, seed=seed)
+    output = tmp_path / 'out'
+    result = batch_extract([tmp_path / 'a', tmp_path / 'b'], output, processes=2, media_workers=1)
+
+    assert result['summary']['worksheets'] == 2
+    assert result['summary']['failedWorksheets'] == 0
+    products = read_products(result['output_path'])
+    by_source = {}
+    for product in products:
+        by_source.setdefault(product['sourceFile'], []).append(product)
+    assert {source: len(items) for source, items in by_source.items()} == {'a/price.xlsx': 20, 'b/price.xlsx': 30}
+
+    parts = sorted(os.listdir(output / PARTS_DIR))
+    assert len(parts) == 2
+    images = set(os.listdir(output / IMAGES_DIR))
+    part_images = 0
+    for part in parts:
+        with open(output / PARTS_DIR / part / 'extraction_summary.json', encoding='utf-8') as f:
+            part_images += json.load(f)['totalImages']
+    # No image of one workbook overwrote the other's
+    assert len(images) == part_images
+
+    prefixes = {}
+    for source, items in by_source.items():
+        names = {img['filename'] for product in items for img in product['图片']}
+        assert names and names <= images
+        prefixes[source] = {name.split('_image')[0] for name in names}
+        assert len(prefixes[source]) == 1
+    assert prefixes['a/price.xlsx'] != prefixes['b/price.xlsx']
+
+
+def test_rerun_replaces_the_previous_parts(tmp_path, capsys):
+    generate_workbook(tmp_path / 'price.xlsx', 10, seed=3)
+    output = tmp_path / 'out'
+    batch_extract([tmp_path / 'price.xlsx'], output, processes=1, media_workers=1)
+    stale = next((output / PARTS_DIR).iterdir()) / 'stale.txt'
+    stale.write_text('left over')
+    result = batch_extract([tmp_path / 'price.xlsx'], output, processes=1, media_workers=1)
+    assert 'Replacing the part directory' in capsys.readouterr().out
+    assert not stale.exists()
+    assert [p['sourceFile'] for p in read_products(result['output_path'])] == ['price.xlsx'] * 10
@@ -0,0 +1,49 @@
+import pytest
+
+import extract_with_openpyxl_improved as extractor
+import output_writers
+from checkpoint import CHECKPOINT_NAME
+from output_writers import products_filename
+
+
+class Killed(Exception):
+    """Stands in for the process being killed part-way through a run"""
+
+
+MODES = {
+    'full': {},
+    'streaming': {'streaming': True},
+    'pipelined': {'pipelined': True},
+    'raw': {'engine': 'raw'},
+}
+
+
+@pytest.mark.parametrize('output_format', ['json', 'ndjson'])
+@pytest.mark.parametrize('mode', sorted(MODES))
+def test_resumed_run_writes_the_same_bytes(tmp_path, monkeypatch, workbook, output_format, mode):
+    options = dict(MODES[mode], output_format=output_format)
+    extractor.extract_with_openpyxl_improved(workbook, tmp_path / 'clean', **options)
+
+    writer_class = output_writers.WRITERS[output_format]
+    write = writer_class.write
+    written = []
+
+    def write_until_killed(self, product):
+        written.append(product)
+        if len(written) == 40:
+            raise Killed
+        write(self, product)
+
+    monkeypatch.setattr(writer_class, 'write', write_until_killed)
+    with pytest.raises(Killed):
+        # A checkpoint after every product
+        extractor.extract_with_openpyxl_improved(workbook, tmp_path / 'resumed', checkpoint_interval=0.0,
+                                                 **options)
+    monkeypatch.setattr(writer_class, 'write', write)
+    assert (tmp_path / 'resumed' / CHECKPOINT_NAME).exists()
+
+    result = extractor.extract_with_openpyxl_improved(workbook, tmp_path / 'resumed', resume=True, **options)
+    assert result['summary']['resumedAfterRow'] > 0
+    name = products_filename(output_format)
+    assert (tmp_path / 'resumed' / name).read_bytes() == (tmp_path / 'clean' / name).read_bytes()
+    assert not (tmp_path / 'resumed' / CHECKPOINT_NAME).exists()
@@ -0,0 +1,23 @@
+import sys
+
+import pytest
+
+from extraction_metrics import StageMetrics, current_rss_mb, peak_rss_mb
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='current RSS is read from /proc')
+def test_stages_record_the_rss_they_finished_with():
+    metrics = StageMetrics()
+    metrics.record('small', 0.5, rows=10)
+    ballast = bytearray(64 * 1024 * 1024)
+    ballast[::4096] = b'x' * len(ballast[::4096])
+    metrics.record('large', 1.0, rows=10)
+    del ballast
+    metrics.record('after', 1.0)
+    stages = metrics.stages
+    assert stages['large']['rss_mb'] - stages['small']['rss_mb'] > 50
+    # Unlike the run's peak, a later stage doesn't inherit the large one's memory
+    assert stages['after']['rss_mb'] < stages['large']['rss_mb'] - 50
+    assert metrics.report()['peak_rss_mb'] >= stages['large']['rss_mb']
+    assert stages['small']['rows_per_sec'] == 20.0
+    assert current_rss_mb() <= peak_rss_mb()
@@ -0,0 +1,61 @@
+import os
+import stat
+import threading
+
+import pytest
+
+from extraction_service import ExtractionService, listen, submit
+
+TOKEN = 'daily-update'
+
+
+@pytest.fixture
+def service(tmp_path):
+    return ExtractionService(tmp_path / 'out', output_format='ndjson')
+
+
+@pytest.fixture
+def running():
+    servers = []
+
+    def start(service, **options):
+        servers.extend(listen(service, **options))
+        for server in servers:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        return servers[0]
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_output_dir_must_be_inside_the_root(service, tmp_path):
+    root = (tmp_path / 'out').resolve()
+    assert service.output_dir('in/price.xlsx') == root / 'price'
+    assert service.output_dir('price.xlsx', 'supplier_a') == root / 'supplier_a'
+    assert service.output_dir('price.xlsx', str(root / 'b')) == root / 'b'
+    for outside in ('../elsewhere', str(tmp_path), str(root), '/etc'):
+        with pytest.raises(ValueError):
+            service.output_dir('price.xlsx', outside)
+
+
+def test_unix_socket_is_owner_only(service, running, workbook, tmp_path):
+    path = tmp_path / 'service.sock'
+    running(service, socket_path=path)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    report = submit(workbook, socket_path=path, timeout=60)
+    assert report['error'] is None and report['products'] == 60
+    report = submit(workbook, tmp_path / 'elsewhere', socket_path=path, timeout=60)
+    assert 'not inside' in report['error']
+    assert not (tmp_path / 'elsewhere').exists()
+
+
+def test_port_needs_the_token(service, running, workbook):
+    with pytest.raises(ValueError):
+        listen(service, port=0)
+    port = running(service, port=0, token=TOKEN).server_address[1]
+    assert 'token' in submit(workbook, port=port, timeout=60)['error']
+    assert 'token' in submit(workbook, port=port, token='guess', timeout=60)['error']
+    report = submit(workbook, port=port, token=TOKEN, timeout=60)
+    assert report['error'] is None and report['products'] == 60
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+import image_pack
+from image_pack import ImagePack, ImagePackWriter
+
+
+def test_entries_stream_into_the_pack(tmp_path, monkeypatch):
+    # A small spool so the large image goes through a temporary file
+    monkeypatch.setattr(image_pack, 'SPOOL_SIZE', 1024)
+    large = os.urandom(200_000)
+    writer = ImagePackWriter(tmp_path / 'images.pack')
+    with writer.open('product_images_corrected/a.png') as f:
+        for start in range(0, len(large), 8192):
+            f.write(large[start:start + 8192])
+    with writer.open('b.jpeg') as f:
+        f.write(b'jpeg')
+    with writer.open('c.png') as f:
+        f.write(large)
+    assert writer.get('a.png') == large
+    assert writer.close() == len(large) + 4
+    assert writer.bytes_saved == len(large)
+
+    with ImagePack(tmp_path / 'images.pack') as pack:
+        assert pack.entry('a.png')['contentType'] == 'image/png'
+        assert pack.entry('c.png')['offset'] == pack.entry('a.png')['offset']
+        with pack.get('a.png') as a, pack.get('b.jpeg') as b:
+            assert bytes(a) == large and bytes(b) == b'jpeg'
+
+
+def test_failed_entry_is_not_recorded(tmp_path):
+    writer = ImagePackWriter(tmp_path / 'images.pack')
+    with pytest.raises(OSError):
+        with writer.open('broken.png') as f:
+            f.write(b'partial')
+            raise OSError('member is corrupt')
+    with writer.open('ok.png') as f:
+        f.write(b'ok')
+    assert 'broken.png' not in writer
+    assert writer.close() == 2
+    with ImagePack(tmp_path / 'images.pack') as pack:
+        assert list(pack.names()) == ['ok.png']
@@ -0,0 +1,46 @@
+import json
+
+from incremental import DELTA_NAME, MANIFEST_NAME, ExtractionManifest
+
+
+def product(code, name, price, row, barcode=''):
+    return {'rowNumber': row, '序号': code, '名称': name, '价格': price, '条码': barcode, '图片': []}
+
+
+def run(output_dir, products):
+    manifest = ExtractionManifest.load(output_dir)
+    for item in products:
+        manifest.record_product(item)
+    return manifest.save(output_dir, 'price.xlsx')[1]
+
+
+def test_first_run_adds_everything(tmp_path):
+    delta = run(tmp_path, [product('A1', '积木', 10, 3), product('A2', '魔方', 5, 4)])
+    assert [p['序号'] for p in delta['added']] == ['A1', 'A2']
+    assert delta['changed'] == [] and delta['removed'] == []
+    assert delta['previousExtractionDate'] is None
+    assert (tmp_path / MANIFEST_NAME).exists() and (tmp_path / DELTA_NAME).exists()
+
+
+def test_second_run_reports_added_changed_and_removed(tmp_path):
+    first = run(tmp_path, [product('A1', '积木', 10, 3), product('A2', '魔方', 5, 4), product('A3', '水枪', 8, 5)])
+    delta = run(tmp_path, [
+        # Moved down two rows only: unchanged
+        product('A1', '积木', 10, 5),
+        product('A2', '魔方', 6, 6),
+        product('A4', '拼图', 12, 7),
+    ])
+    assert [p['序号'] for p in delta['added']] == ['A4']
+    assert [p['序号'] for p in delta['changed']] == ['A2']
+    assert delta['removed'] == [{'key': 'A3\t', '序号': 'A3', '条码': ''}]
+    assert delta['previousExtractionDate'] == first['extractionDate']
+    with open(tmp_path / DELTA_NAME, encoding='utf-8') as f:
+        assert json.load(f) == delta
+
+
+def test_repeated_codes_are_kept_apart_by_occurrence(tmp_path):
+    run(tmp_path, [product('A1', '积木', 10, 3), product('A1', '积木 大号', 20, 4)])
+    manifest = ExtractionManifest.load(tmp_path)
+    assert manifest.record_product(product('A1', '积木', 10, 3)) is None
+    assert manifest.record_product(product('A1', '积木 大号', 25, 4)) == 'changed'
+    assert set(manifest.products) == {'A1\t', 'A1\t#2'}
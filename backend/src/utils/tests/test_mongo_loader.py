@@ -0,0 +1,102 @@
+import re
+
+import pytest
+
+pytest.importorskip('mongomock')
+
+from mongo_loader import MongoProductSink, convert_cny_to_myr, open_database
+
+PRODUCTS = [
+    {'序号': 'A1', '条码': '690001', '名称': '杜蕾斯 安全套', '规格': '12只', '建议价': 40, '数量': 5},
+    # Same barcode in the same batch: the first record wins, as in the JS importer
+    {'序号': 'A1', '条码': '690001', '名称': '杜蕾斯 安全套 超薄', '规格': '12只', '建议价': 50, '数量': 7},
+    # No barcode, 序号 is the sku
+    {'序号': 'B1', '名称': '润滑液 200ml', '建议价': 30, '数量': 2},
+    # No code at all, found by name
+    {'名称': '飞机杯', '建议价': 100, '重量KG': 0.5},
+    {'序号': 'C1', '名称': '', '建议价': 10},
+    {'序号': 'C2', '名称': '延时喷剂', '建议价': 0},
+]
+
+
+@pytest.fixture
+def db():
+    client, db = open_database('mongodb://localhost:27017/cms_ecommerce', in_memory=True)
+    # Unique slugs as in the models, plus a category that already owns the 'lubricants' slug
+    db['products'].create_index('slug', unique=True)
+    db['categories'].create_index('slug', unique=True)
+    db['categories'].insert_one({'name': 'Lubricants (old)', 'slug': 'lubricants'})
+    yield db
+    client.close()
+
+
+def load(db, products, **options):
+    sink = MongoProductSink(db, '.', batch_size=2, uploads_dir=None, **options)
+    for product in products:
+        sink.write(product)
+    return sink.close()
+
+
+def test_first_load_inserts_importable_products(db):
+    stats = load(db, PRODUCTS)
+    assert (stats['inserted'], stats['unchanged'], stats['skipped'], stats['errors']) == (3, 1, 2, 0)
+    assert db['products'].count_documents({}) == 3
+    condom = db['products'].find_one({'sku': '690001'})
+    assert condom['name'] == '杜蕾斯 安全套'
+    assert condom['price'] == convert_cny_to_myr(40) and condom['stock'] == 5
+    assert db['products'].find_one({'sku': 'B1'})['name'] == '润滑液 200ml'
+    assert db['products'].find_one({'name': '飞机杯'}).get('sku') is None
+
+
+def test_categories_are_created_once_with_unique_slugs(db):
+    stats = load(db, PRODUCTS)
+    categories = {doc['name']: doc for doc in db['categories'].find()}
+    assert stats['categoriesCreated'] == 3
+    assert set(categories) == {'Lubricants (old)', 'Condoms & Protection', 'Lubricants', 'Male Toys'}
+    assert categories['Lubricants']['slug'].startswith('lubricants-')
+    assert db['products'].find_one({'sku': '690001'})['category'] == categories['Condoms & Protection']['_id']
+    assert load(db, PRODUCTS)['categoriesCreated'] == 0
+
+
+def test_slugs_follow_the_product_hook(db):
+    db['products'].insert_one({'name': 'Old Durex', 'slug': 'durex-12'})
+    load(db, [
+        {'条码': '1', '名称': 'Durex 12', '建议价': 40},
+        {'条码': '2', '名称': 'DUREX  12!', '建议价': 40},
+        {'条码': '3', '名称': '杜蕾斯', '建议价': 40},
+    ])
+    slugs = {doc['sku']: doc['slug'] for doc in db['products'].find({'sku': {'$exists': True}})}
+    assert re.fullmatch(r'durex-12-[a-z0-9]{7}', slugs['1'])
+    assert re.fullmatch(r'durex-12-[a-z0-9]{7}', slugs['2']) and slugs['2'] != slugs['1']
+    assert slugs['3'] == 'product'
+
+
+def test_reload_leaves_existing_products_alone(db):
+    load(db, PRODUCTS)
+    stats = load(db, [{**product, '建议价': (product['建议价'] or 0) * 2} for product in PRODUCTS])
+    assert (stats['inserted'], stats['updated'], stats['unchanged']) == (0, 0, 4)
+    assert db['products'].find_one({'sku': '690001'})['price'] == convert_cny_to_myr(40)
+
+
+def test_overwrite_updates_and_keeps_the_slug(db):
+    load(db, PRODUCTS)
+    slug = db['products'].find_one({'sku': '690001'})['slug']
+    changed = [dict(product) for product in PRODUCTS]
+    changed[0]['建议价'] = 60
+    stats = load(db, changed[:1] + changed[2:], overwrite=True)
+    # updatedAt is set on every overwrite, so every existing product counts as updated
+    assert (stats['inserted'], stats['updated']) == (0, 3)
+    condom = db['products'].find_one({'sku': '690001'})
+    assert condom['price'] == convert_cny_to_myr(60) and condom['slug'] == slug
+    assert db['products'].count_documents({}) == 3
+
+
+def test_product_stored_under_its_name_is_not_duplicated(db):
+    # Created by hand or by an older import: same name, no sku or another one
+    db['products'].insert_one({'name': '润滑液 200ml', 'slug': 'x1', 'price': 1})
+    db['products'].insert_one({'name': '飞机杯', 'sku': 'OLD-9', 'slug': 'x2', 'price': 1})
+    stats = load(db, PRODUCTS[2:4], overwrite=True)
+    assert (stats['inserted'], stats['updated']) == (0, 2)
+    assert db['products'].count_documents({}) == 2
+    lube = db['products'].find_one({'name': '润滑液 200ml'})
+    assert lube['sku'] == 'B1' and lube['slug'] == 'x1' and lube['price'] == convert_cny_to_myr(30)
@@ -0,0 +1,45 @@
+import io
+import json
+
+import pytest
+
+from output_writers import WRITERS, iter_written_products
+
+PRODUCTS = [
+    {'rowNumber': 3, '序号': 'A-001', '名称': '测试产品 "引号"', '价格': 10.5, '数量': 3, '图片': []},
+    {'rowNumber': 4, '序号': 'A-002', '名称': '产品二\n换行', '价格': 0, '数量': 0,
+     '图片': [{'filename': 'image1.png', 'path': 'product_images_corrected/image1.png'}]},
+]
+
+EXPECTED = {
+    'json': lambda products: json.dumps(products, ensure_ascii=False, indent=2),
+    'compact': lambda products: json.dumps(products, ensure_ascii=False, separators=(',', ':')),
+    'ndjson': lambda products: ''.join(json.dumps(product, ensure_ascii=False, separators=(',', ':')) + '\n'
+                                       for product in products),
+}
+
+
+def write(output_format, products):
+    f = io.StringIO()
+    writer = WRITERS[output_format](f)
+    for product in products:
+        writer.write(product)
+    writer.close()
+    return f.getvalue()
+
+
+@pytest.mark.parametrize('output_format', sorted(WRITERS))
+@pytest.mark.parametrize('products', [PRODUCTS, PRODUCTS[:1], []], ids=['two', 'one', 'none'])
+def test_writer_matches_json_dump(output_format, products):
+    assert write(output_format, products) == EXPECTED[output_format](products)
+
+
+@pytest.mark.parametrize('output_format', sorted(WRITERS))
+def test_iter_written_products_reads_an_unfinished_file(tmp_path, output_format):
+    path = tmp_path / ('products.ndjson' if output_format == 'ndjson' else 'products.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        writer = WRITERS[output_format](f)
+        for product in PRODUCTS:
+            writer.write(product)
+        # Not closed: the array is still open, as at a checkpoint
+    assert list(iter_written_products(path, path.stat().st_size)) == PRODUCTS
@@ -0,0 +1,59 @@
+from row_decoder import DEFAULT_COLUMNS, HEADERS, RowDecoder, detect_schema
+
+HEADER = ('产品图', *HEADERS)
+ROW = (None, 'A-001', '测试产品', None, '个', 10.5, 3, '规格', 31.5, 20, 60, '690000000001', 0.2)
+
+
+def test_detect_schema_reads_the_header_row():
+    schema = detect_schema([('配货中心 报价单',), HEADER, ROW])
+    assert schema.detected
+    assert schema.header_row == 2
+    assert schema.letters()['序号'] == 'B'
+    assert schema.letters()['重量KG'] == 'M'
+    assert schema.missing == []
+
+
+def test_detect_schema_matches_header_variants():
+    header = ('序号', '名 称', '重量（kg）')
+    schema = detect_schema([header])
+    assert schema.columns == {'序号': 0, '名称': 1, '重量KG': 2}
+    assert schema.missing == [h for h in HEADERS if h not in schema.columns]
+
+
+def test_detect_schema_falls_back_to_the_given_default():
+    rows = [('A-001', '测试产品')]
+    assert detect_schema(rows).columns == DEFAULT_COLUMNS
+    legacy = {header: index for index, header in enumerate(HEADERS)}
+    schema = detect_schema(rows, default_columns=legacy, default_header_row=0)
+    assert not schema.detected
+    assert schema.header_row == 0
+    assert RowDecoder(schema).decode(1, ('A-001', '测试产品'))['序号'] == 'A-001'
+
+
+def test_decode_converts_fields_and_skips_header_rows():
+    decoder = RowDecoder(detect_schema([HEADER]))
+    assert decoder.decode(1, HEADER) is None
+    # Repeated header further down and empty rows
+    assert decoder.decode(5, HEADER) is None
+    assert decoder.decode(6, (None,) * len(HEADER)) is None
+    product = decoder.decode(2, ROW)
+    assert product == {'rowNumber': 2, '序号': 'A-001', '名称': '测试产品', '电池型号': '无', '单位': '个',
+                       '价格': 10.5, '数量': 3, '规格': '规格', '金额': 31.5, '建议价': 20.0, '市值': 60.0,
+                       '条码': '690000000001', '重量KG': 0.2, '图片': []}
+    # Short rows are padded with the defaults
+    assert decoder.decode(3, ROW[:3])['重量KG'] == 0
+    assert decoder.errors == []
+
+
+def test_decode_records_cells_that_do_not_convert():
+    decoder = RowDecoder(detect_schema([HEADER]))
+    row = list(ROW)
+    row[6] = '24个/箱'
+    row[5] = 'n/a'
+    product = decoder.decode(7, tuple(row))
+    assert product['数量'] == 0
+    assert product['价格'] == 0
+    assert [tuple(error) for error in decoder.errors] == [
+        (7, 'F', '价格', 'n/a', 'float'),
+        (7, 'G', '数量', '24个/箱', 'int'),
+    ]
@@ -0,0 +1,47 @@
+from zipfile import ZipFile
+
+import openpyxl
+import pytest
+
+from xlsx_anchors import active_worksheet_path, read_image_anchors, workbook_sheets
+from xlsx_raw_reader import read_workbook
+
+NS_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+NS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+
+@pytest.fixture
+def notes_first(workbook, tmp_path):
+    """The price list behind an empty 说明 sheet, with the price list active"""
+    path = tmp_path / 'notes_first.xlsx'
+    with ZipFile(workbook) as src, ZipFile(path, 'w') as dst:
+        for item in src.infolist():
+            if item.filename not in ('xl/workbook.xml', 'xl/_rels/workbook.xml.rels'):
+                dst.writestr(item, src.read(item))
+        rels = src.read('xl/_rels/workbook.xml.rels').decode('utf-8')
+        dst.writestr('xl/_rels/workbook.xml.rels', rels.replace(
+            '</Relationships>',
+            f'<Relationship Id="rId9" Type="{NS_REL}/worksheet" Target="worksheets/notes.xml"/></Relationships>'))
+        dst.writestr('xl/worksheets/notes.xml', f'<worksheet xmlns="{NS_MAIN}"><sheetData/></worksheet>')
+        dst.writestr('xl/workbook.xml',
+                     f'<workbook xmlns="{NS_MAIN}" xmlns:r="{NS_REL}"><bookViews><workbookView activeTab="1"/>'
+                     f'</bookViews><sheets><sheet name="说明" sheetId="2" r:id="rId9"/>'
+                     f'<sheet name="报价单" sheetId="1" r:id="rId1"/></sheets></workbook>')
+    return path
+
+
+def test_active_sheet_comes_from_the_workbook_view(notes_first):
+    with ZipFile(notes_first) as zip_ref:
+        sheets, active = workbook_sheets(zip_ref)
+        assert [title for title, _ in sheets] == ['说明', '报价单']
+        assert active == 1
+        assert active_worksheet_path(zip_ref) == 'xl/worksheets/sheet1.xml'
+        assert read_image_anchors(zip_ref, active_worksheet_path(zip_ref))
+        assert read_workbook(zip_ref)[:2] == (sheets, active)
+    # The sheet openpyxl's extraction reads
+    assert openpyxl.load_workbook(notes_first, read_only=True).active.title == '报价单'
+
+
+def test_single_sheet_workbook(workbook):
+    with ZipFile(workbook) as zip_ref:
+        assert workbook_sheets(zip_ref) == ([('报价单', 'xl/worksheets/sheet1.xml')], 0)
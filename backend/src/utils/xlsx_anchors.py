@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Resolve embedded image anchors straight from the XLSX package
+Parses xl/drawings/drawingN.xml and its _rels file with an incremental XML
+parser, mapping each r:embed id to its exact xl/media/ member and the cells
+it is anchored to, in one linear pass per drawing
+"""
+import posixpath
+import sys
+import xml.etree.ElementTree as ET
+from zipfile import ZipFile
+
+REL_DRAWING = '/drawing'
+REL_IMAGE = '/image'
+REL_WORKSHEET = '/worksheet'
+
+ANCHOR_TAGS = ('twoCellAnchor', 'oneCellAnchor', 'absoluteAnchor')
+
+
+def _local(tag):
+    """Strip the namespace from an element or attribute name"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _rels_path(part_path):
+    """xl/drawings/drawing1.xml -> xl/drawings/_rels/drawing1.xml.rels"""
+    folder, name = posixpath.split(part_path)
+    return posixpath.join(folder, '_rels', f"{name}.rels")
+
+
+def read_relationships(zip_ref, part_path):
+    """
+    Read the relationships of a package part
+    Returns {rId: (type, absolute target)}; external targets are skipped
+    """
+    rels_path = _rels_path(part_path)
+    try:
+        data = zip_ref.read(rels_path)
+    except KeyError:
+        return {}
+
+    base = posixpath.dirname(part_path)
+    rels = {}
+    for elem in ET.fromstring(data):
+        if _local(elem.tag) != 'Relationship' or elem.get('TargetMode') == 'External':
+            continue
+        target = elem.get('Target', '')
+        if target.startswith('/'):
+            target = target[1:]
+        else:
+            target = posixpath.normpath(posixpath.join(base, target))
+        rels[elem.get('Id')] = (elem.get('Type', ''), target)
+    return rels
+
+
+def worksheet_paths(zip_ref):
+    """
+    List worksheets in workbook order as (title, part path) pairs
+    """
+    rels = read_relationships(zip_ref, 'xl/workbook.xml')
+    sheets = []
+    for elem in ET.fromstring(zip_ref.read('xl/workbook.xml')).iter():
+        if _local(elem.tag) != 'sheet':
+            continue
+        rel_id = next((v for k, v in elem.attrib.items() if _local(k) == 'id'), None)
+        rel_type, target = rels.get(rel_id, ('', None))
+        if target and rel_type.endswith(REL_WORKSHEET):
+            sheets.append((elem.get('name'), target))
+    return sheets
+
+
+def workbook_sheets(zip_ref):
+    """
+    Sheets in workbook order as (title, part path) pairs, with the index of the
+    active one (bookViews/workbookView/@activeTab). Like openpyxl, sheets
+    whose part is missing don't count towards activeTab
+    """
+    rels = read_relationships(zip_ref, 'xl/workbook.xml')
+    names = set(zip_ref.namelist())
+    sheets = []
+    active = None
+    for elem in ET.fromstring(zip_ref.read('xl/workbook.xml')).iter():
+        tag = _local(elem.tag)
+        if tag == 'sheet':
+            rel_id = next((v for k, v in elem.attrib.items() if _local(k) == 'id'), None)
+            if rel_id in rels and rels[rel_id][1] in names:
+                sheets.append((elem.get('name'), rels[rel_id][1]))
+        elif tag == 'workbookView' and active is None:
+            active = int(elem.get('activeTab', 0))
+    return sheets, active or 0
+
+
+def active_worksheet_path(zip_ref):
+    """Part path of the sheet the workbook opens on, as the extractor picks it, or None"""
+    sheets, active = workbook_sheets(zip_ref)
+    return sheets[active][1] if 0 <= active < len(sheets) else None
+
+
+def worksheet_path(zip_ref, title):
+    """Find the part path of the worksheet with the given title"""
+    for name, path in worksheet_paths(zip_ref):
+        if name == title:
+            return path
+    return None
+
+
+def _parse_drawing(source, media_by_rel):
+    """
+    Stream one drawing part and yield an anchor dict per embedded picture
+    """
+    anchor = None
+    marker = None
+    fallback_depth = 0
+
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        tag = _local(elem.tag)
+
+        if event == 'start':
+            if tag == 'Fallback':
+                # mc:AlternateContent repeats its content in mc:Fallback
+                fallback_depth += 1
+            elif fallback_depth:
+                continue
+            elif tag in ANCHOR_TAGS:
+                # Markers are [row, col, rowOff]; height is the picture's cy in EMU
+                anchor = {'type': tag, 'from': [None, None, 0], 'to': [None, None, 0], 'embed': None, 'height': None}
+            elif anchor is not None and tag in ('from', 'to'):
+                marker = anchor[tag]
+            elif anchor is not None and tag == 'blip' and anchor['embed'] is None:
+                anchor['embed'] = next((v for k, v in elem.attrib.items() if _local(k) == 'embed'), None)
+            elif anchor is not None and tag == 'ext' and 'cy' in elem.attrib and anchor['height'] is None:
+                anchor['height'] = int(elem.attrib['cy'])
+            continue
+
+        if tag == 'Fallback':
+            fallback_depth -= 1
+        elif fallback_depth:
+            pass
+        elif marker is not None and tag in ('col', 'row'):
+            # Markers are 0-indexed in DrawingML, report 1-indexed cells
+            marker[0 if tag == 'row' else 1] = int(elem.text) + 1
+        elif marker is not None and tag == 'rowOff':
+            marker[2] = int(elem.text)
+        elif tag in ('from', 'to'):
+            marker = None
+        elif tag in ANCHOR_TAGS and anchor is not None:
+            media = media_by_rel.get(anchor['embed'])
+            if media:
+                from_row, from_col, from_row_off = anchor['from']
+                to_row, to_col, to_row_off = anchor['to']
+                if anchor['type'] == 'oneCellAnchor':
+                    to_row, to_col, to_row_off = from_row, from_col, from_row_off
+                yield {
+                    'media': media,
+                    'embed': anchor['embed'],
+                    'anchor_type': anchor['type'],
+                    'from_row': from_row,
+                    'from_col': from_col,
+                    'to_row': to_row,
+                    'to_col': to_col,
+                    'from_row_off': from_row_off,
+                    'to_row_off': to_row_off,
+                    'height': anchor['height']
+                }
+            anchor = None
+
+        if tag in ANCHOR_TAGS:
+            # Release the finished anchor subtree so memory stays bounded
+            elem.clear()
+
+
+def _read_drawing(zip_ref, drawing_path):
+    media_by_rel = {
+        rel_id: target
+        for rel_id, (t, target) in read_relationships(zip_ref, drawing_path).items()
+        if t.endswith(REL_IMAGE)
+    }
+    with zip_ref.open(drawing_path) as source:
+        return list(_parse_drawing(source, media_by_rel))
+
+
+def read_image_anchors(zip_ref, sheet_path, cache=None):
+    """
+    Return every picture anchored on a worksheet, in drawing order
+
+    Each anchor is a dict with the exact media member ('xl/media/image5.jpeg'),
+    its relationship id and 1-indexed from/to cells. Row offsets and the
+    picture height are in EMU (height is None when the drawing omits it).
+    Absolute anchors have no cell position and report None for rows and columns.
+    With a PartCache (part_cache.py) a drawing is only parsed again when it or
+    its relationships changed.
+    """
+    anchors = []
+    for rel_type, drawing_path in read_relationships(zip_ref, sheet_path).values():
+        if not rel_type.endswith(REL_DRAWING):
+            continue
+        if cache is not None:
+            anchors.extend(cache.get('drawing', zip_ref, (drawing_path, _rels_path(drawing_path)),
+                                     lambda: _read_drawing(zip_ref, drawing_path)))
+        else:
+            anchors.extend(_read_drawing(zip_ref, drawing_path))
+    return anchors
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python xlsx_anchors.py <excel-file> [sheet-name]")
+        sys.exit(1)
+
+    with ZipFile(sys.argv[1], 'r') as zip_ref:
+        sheets = worksheet_paths(zip_ref)
+        if len(sys.argv) > 2:
+            sheets = [s for s in sheets if s[0] == sys.argv[2]]
+        for title, path in sheets:
+            anchors = read_image_anchors(zip_ref, path)
+            print(f"{title} ({path}): {len(anchors)} anchored images")
+            for a in anchors[:20]:
+                print(f"  {a['media']}: rows {a['from_row']}-{a['to_row']}, cols {a['from_col']}-{a['to_col']} ({a['anchor_type']})")
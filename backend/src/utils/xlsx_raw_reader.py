@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Read worksheet values straight from the SpreadsheetML parts
+Streams xl/worksheets/sheetN.xml and xl/sharedStrings.xml with an incremental
+parser and decodes only the first max_col cells of each row into a tuple,
+without building Cell, style or drawing objects. Values are converted the way
+openpyxl does in read-only, data_only mode (shared and inline strings, int or
+float numbers, booleans, date-formatted numbers), so rows come out exactly
+like ReadOnlyWorksheet.iter_rows(values_only=True).
+"""
+import argparse
+import sys
+import xml.etree.ElementTree as ET
+import xml.parsers.expat
+from itertools import zip_longest
+from zipfile import ZipFile
+
+from openpyxl.styles.numbers import builtin_format_code, is_date_format, is_timedelta_format
+from openpyxl.utils.cell import range_boundaries
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel, from_ISO8601
+
+from xlsx_anchors import _local, read_relationships, workbook_sheets
+
+WORKBOOK_PATH = 'xl/workbook.xml'
+REL_SHARED_STRINGS = '/sharedStrings'
+REL_STYLES = '/styles'
+
+_TRUE_VALUES = ('1', 'true', 'on')
+
+
+_COLUMNS = {}
+
+
+def _column_index(ref):
+    """'AB12' -> 28"""
+    letters = ref.rstrip('0123456789')
+    column = _COLUMNS.get(letters)
+    if column is None:
+        column = 0
+        for ch in letters.upper():
+            column = column * 26 + (ord(ch) - 64)
+        _COLUMNS[letters] = column
+    return column
+
+
+def _parse_part(zip_ref, path, handler, chunk_size=64 * 1024):
+    """
+    Feed a package part through expat in chunks, calling handler.start/end/data
+    Tags are passed without their prefix. Stops early once handler.done is set;
+    yields after every chunk so the caller can drain what the handler collected.
+    """
+    parser = xml.parsers.expat.ParserCreate()
+    parser.buffer_text = True
+
+    def first_start(name, attrs):
+        # Parts written with a prefixed default namespace (<x:worksheet>) get
+        # their tags stripped; the usual unprefixed ones go straight through
+        if ':' in name:
+            parser.StartElementHandler = lambda n, a: handler.start(n.rpartition(':')[2], a)
+            parser.EndElementHandler = lambda n: handler.end(n.rpartition(':')[2])
+        else:
+            parser.StartElementHandler = handler.start
+            parser.EndElementHandler = handler.end
+        parser.StartElementHandler(name, attrs)
+
+    parser.StartElementHandler = first_start
+    parser.EndElementHandler = handler.end
+    parser.CharacterDataHandler = handler.data
+    with zip_ref.open(path) as source:
+        while not handler.done:
+            chunk = source.read(chunk_size)
+            parser.Parse(chunk, not chunk)
+            if not chunk:
+                break
+            yield
+
+
+class _TextCollector:
+    """
+    Text of <si>/<is> elements: the plain <t> plus the <t> of every rich-text
+    run, phonetic runs (<rPh>) left out, as openpyxl's Text.content
+    """
+    def __init__(self):
+        self.parts = None
+        self.text = None
+        self.in_phonetic = False
+
+    def start_text(self, name):
+        if name == 'rPh':
+            self.in_phonetic = True
+        elif name == 't' and not self.in_phonetic:
+            self.text = []
+
+    def end_text(self, name):
+        if name == 'rPh':
+            self.in_phonetic = False
+        elif name == 't' and self.text is not None:
+            self.parts.append(''.join(self.text))
+            self.text = None
+
+
+class _SharedStringsHandler(_TextCollector):
+    def __init__(self):
+        super().__init__()
+        self.strings = []
+        self.done = False
+
+    def start(self, name, attrs):
+        if name == 'si':
+            self.parts = []
+        elif self.parts is not None:
+            self.start_text(name)
+
+    def end(self, name):
+        if name == 'si':
+            self.strings.append(''.join(self.parts).replace('x005F_', ''))
+            self.parts = None
+        elif self.parts is not None:
+            self.end_text(name)
+
+    def data(self, text):
+        if self.text is not None:
+            self.text.append(text)
+
+
+def read_shared_strings(zip_ref, path):
+    """Shared string table as a list, one entry per <si>"""
+    handler = _SharedStringsHandler()
+    if path is not None:
+        for _ in _parse_part(zip_ref, path, handler):
+            pass
+    return handler.strings
+
+
+def read_date_styles(zip_ref, path):
+    """
+    Indexes of the cellXfs styles whose number format is a date or a duration
+    Returns (date style ids, timedelta style ids)
+    """
+    date_styles, timedelta_styles = set(), set()
+    if path is None:
+        return date_styles, timedelta_styles
+    root = ET.fromstring(zip_ref.read(path))
+    custom = {}
+    cell_xfs = []
+    for elem in root:
+        tag = _local(elem.tag)
+        if tag == 'numFmts':
+            for fmt in elem:
+                if _local(fmt.tag) == 'numFmt':
+                    custom[int(fmt.get('numFmtId'))] = fmt.get('formatCode')
+        elif tag == 'cellXfs':
+            cell_xfs = [int(xf.get('numFmtId', 0)) for xf in elem if _local(xf.tag) == 'xf']
+
+    for idx, fmt_id in enumerate(cell_xfs):
+        fmt = custom[fmt_id] if fmt_id in custom else builtin_format_code(fmt_id)
+        if is_date_format(fmt):
+            date_styles.add(idx)
+        if is_timedelta_format(fmt):
+            timedelta_styles.add(idx)
+    return date_styles, timedelta_styles
+
+
+def read_workbook(zip_ref):
+    """
+    Sheets in workbook order as (title, part path) pairs, with the index of the
+    active sheet and the date epoch
+    """
+    sheets, active = workbook_sheets(zip_ref)
+    epoch = CALENDAR_WINDOWS_1900
+    for elem in ET.fromstring(zip_ref.read(WORKBOOK_PATH)).iter():
+        if _local(elem.tag) == 'workbookPr' and (elem.get('date1904') or '').lower() in _TRUE_VALUES:
+            epoch = CALENDAR_MAC_1904
+    return sheets, active, epoch
+
+
+class _DimensionHandler:
+    """Pick up <dimension ref>, stopping at <sheetData>"""
+    def __init__(self):
+        self.ref = None
+        self.done = False
+
+    def start(self, name, attrs):
+        if name == 'dimension':
+            self.ref = attrs.get('ref')
+            self.done = True
+        elif name == 'sheetData':
+            self.done = True
+
+    def end(self, name):
+        pass
+
+    def data(self, text):
+        pass
+
+
+class _SheetHandler(_TextCollector):
+    """
+    Collect finished rows as (row number, [(column, value)]); cells past
+    max_col are skipped without looking at their content
+    """
+    def __init__(self, worksheet, max_col):
+        super().__init__()
+        self.value = worksheet._value
+        self.max_col = max_col
+        self.rows = []
+        self.done = False
+        self.row_num = 0
+        self.column = 0
+        self.cells = None
+        self.cell = None
+        self.v = None
+
+    def start(self, name, attrs):
+        if name == 'c':
+            ref = attrs.get('r')
+            self.column = _column_index(ref) if ref else self.column + 1
+            if self.max_col is None or self.column <= self.max_col:
+                self.cell = (self.column, attrs.get('t', 'n'), attrs.get('s'))
+                self.v = self.parts = None
+        elif self.cell is not None:
+            if name == 'v':
+                self.text = []
+            elif name == 'is':
+                self.parts = []
+            elif self.parts is not None:
+                self.start_text(name)
+        elif name == 'row':
+            r = attrs.get('r')
+            self.row_num = int(float(r)) if r else self.row_num + 1
+            self.column = 0
+            self.cells = []
+
+    def end(self, name):
+        if self.cell is None:
+            if name == 'row':
+                self.rows.append((self.row_num, self.cells))
+        elif name == 'c':
+            column, data_type, style = self.cell
+            self.cells.append((column, self.value(data_type, style, self.v, self.parts)))
+            self.cell = None
+        elif name == 'v':
+            self.v = ''.join(self.text)
+            self.text = None
+        elif self.parts is not None:
+            self.end_text(name)
+
+    def data(self, text):
+        if self.text is not None:
+            self.text.append(text)
+
+
+class RawWorksheet:
+    """
+    One worksheet of an .xlsx, read without openpyxl's object model
+
+    Has the parts of openpyxl's ReadOnlyWorksheet the extractor uses: title,
+    max_row, max_column, calculate_dimension(force=True), iter_rows(values_only=True)
+    and close(). sheet_name defaults to the active sheet. With a PartCache
+    (part_cache.py) the shared string table is only parsed when it changed
+    since an earlier workbook.
+    """
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, excel_path, sheet_name=None, cache=None):
+        self.zip_ref = ZipFile(excel_path, 'r')
+        try:
+            sheets, active, self.epoch = read_workbook(self.zip_ref)
+            if sheet_name is not None:
+                matches = [s for s in sheets if s[0] == sheet_name]
+                if not matches:
+                    raise KeyError(f"Worksheet {sheet_name} does not exist.")
+                self.title, self.path = matches[0]
+            elif 0 <= active < len(sheets):
+                self.title, self.path = sheets[active]
+            else:
+                raise ValueError("Workbook has no active worksheet")
+
+            rels = read_relationships(self.zip_ref, WORKBOOK_PATH).values()
+            strings_path = next((t for rel_type, t in rels if rel_type.endswith(REL_SHARED_STRINGS)), None)
+            styles_path = next((t for rel_type, t in rels if rel_type.endswith(REL_STYLES)), None)
+            if cache is not None and strings_path is not None:
+                self.shared_strings = cache.get('sharedStrings', self.zip_ref, (strings_path,),
+                                                lambda: read_shared_strings(self.zip_ref, strings_path))
+            else:
+                self.shared_strings = read_shared_strings(self.zip_ref, strings_path)
+            self.date_styles, self.timedelta_styles = read_date_styles(self.zip_ref, styles_path)
+            self.max_row, self.max_column = self._read_dimension()
+        except Exception:
+            self.zip_ref.close()
+            raise
+
+    def close(self):
+        self.zip_ref.close()
+
+    def _read_dimension(self):
+        """(max_row, max_column) from <dimension>, or (None, None) when the sheet has none"""
+        handler = _DimensionHandler()
+        for _ in _parse_part(self.zip_ref, self.path, handler, self.CHUNK_SIZE):
+            pass
+        if not handler.ref:
+            return None, None
+        _, _, max_col, max_row = range_boundaries(handler.ref)
+        return max_row, max_col
+
+    def calculate_dimension(self, force=False):
+        """Size a sheet without <dimension> from the last cell of its rows"""
+        if self.max_row and self.max_column:
+            return
+        if not force:
+            raise ValueError("Worksheet is unsized, use calculate_dimension(force=True)")
+        max_row = max_column = 0
+        for row_num, cells in self._rows(None):
+            if cells:
+                max_row = row_num
+                max_column = max(max_column, cells[-1][0])
+        self.max_row, self.max_column = max_row, max_column
+
+    def _rows(self, max_col):
+        """
+        Yield (row number, [(column, value)]) for every <row>, decoding only
+        the cells up to max_col (all of them when max_col is None)
+        """
+        handler = _SheetHandler(self, max_col)
+        for _ in _parse_part(self.zip_ref, self.path, handler, self.CHUNK_SIZE):
+            rows, handler.rows = handler.rows, []
+            yield from rows
+        yield from handler.rows
+
+    def _value(self, data_type, style, value, inline):
+        """Convert one cell's raw <v> text (or inline string parts) like openpyxl's parse_cell"""
+        if data_type == 'inlineStr':
+            return None if inline is None else ''.join(inline)
+        if not value:
+            return None
+        if data_type == 'n':
+            value = float(value) if ('.' in value or 'E' in value or 'e' in value) else int(value)
+            style_id = int(style or 0)
+            if style_id in self.date_styles:
+                try:
+                    return from_excel(value, self.epoch, timedelta=style_id in self.timedelta_styles)
+                except (OverflowError, ValueError):
+                    return '#VALUE!'
+            return value
+        if data_type == 's':
+            return self.shared_strings[int(value)]
+        if data_type == 'b':
+            return bool(int(value))
+        if data_type == 'd':
+            return from_ISO8601(value)
+        # 'str' (formula result) and 'e' (error) keep their text
+        return value
+
+    def iter_rows(self, min_row=1, max_row=None, max_col=None, values_only=True):
+        """
+        Yield a tuple of max_col values per row from min_row to max_row, with
+        empty tuples of None for rows missing from the sheet
+        """
+        if not values_only:
+            raise ValueError("RawWorksheet only returns cell values")
+        max_col = max_col or self.max_column
+        max_row = max_row or self.max_row
+        empty_row = (None,) * max_col if max_col else ()
+        counter = min_row
+        stopped = False
+        for row_num, cells in self._rows(max_col):
+            if max_row is not None and row_num > max_row:
+                stopped = True
+                break
+            while counter < row_num:
+                counter += 1
+                yield empty_row
+            if counter <= row_num:
+                counter += 1
+                width = max_col or (cells[-1][0] if cells else 0)
+                values = [None] * width
+                for column, value in cells:
+                    values[column - 1] = value
+                yield tuple(values)
+        if stopped:
+            while counter <= max_row:
+                counter += 1
+                yield empty_row
+
+
+def compare_with_openpyxl(excel_path, sheet_name=None, max_col=None):
+    """
+    Read a sheet with both readers and return the first differing
+    (row number, raw values, openpyxl values), or None when they agree
+    """
+    from openpyxl import load_workbook
+
+    raw = RawWorksheet(excel_path, sheet_name)
+    workbook = load_workbook(excel_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        worksheet = workbook[sheet_name] if sheet_name else workbook.active
+        if worksheet.max_row is None or worksheet.max_column is None:
+            worksheet.calculate_dimension(force=True)
+        raw.calculate_dimension(force=True)
+        if (raw.title, raw.max_row, raw.max_column) != (worksheet.title, worksheet.max_row, worksheet.max_column):
+            return 0, (raw.title, raw.max_row, raw.max_column), (worksheet.title, worksheet.max_row, worksheet.max_column)
+        max_col = max_col or worksheet.max_column
+        pairs = zip_longest(raw.iter_rows(max_row=raw.max_row, max_col=max_col),
+                            worksheet.iter_rows(min_row=1, max_row=worksheet.max_row, max_col=max_col,
+                                                values_only=True))
+        for row_num, (ours, theirs) in enumerate(pairs, start=1):
+            if ours != theirs or [type(v) for v in ours or ()] != [type(v) for v in theirs or ()]:
+                return row_num, ours, theirs
+        return None
+    finally:
+        raw.close()
+        workbook.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Print worksheet rows read straight from the XML, or check them against openpyxl')
+    parser.add_argument('excel_file', help='Path to the .xlsx file')
+    parser.add_argument('--sheet', dest='sheet_name', default=None, help='Worksheet (default: the active sheet)')
+    parser.add_argument('--max-col', type=int, default=None, help='Columns to decode (default: all)')
+    parser.add_argument('--rows', type=int, default=20, help='Rows to print (default: 20)')
+    parser.add_argument('--compare', action='store_true',
+                        help="Check every row against openpyxl's read-only reader")
+    args = parser.parse_args()
+
+    if args.compare:
+        difference = compare_with_openpyxl(args.excel_file, args.sheet_name, args.max_col)
+        if difference is None:
+            print("Rows are identical to openpyxl's")
+            sys.exit(0)
+        row_num, ours, theirs = difference
+        print(f"Row {row_num} differs:\n  raw:      {ours!r}\n  openpyxl: {theirs!r}")
+        sys.exit(1)
+
+    worksheet = RawWorksheet(args.excel_file, args.sheet_name)
+    worksheet.calculate_dimension(force=True)
+    print(f"{worksheet.title} ({worksheet.path}): {worksheet.max_row} rows, {worksheet.max_column} columns")
+    for row_num, row in enumerate(worksheet.iter_rows(max_row=min(args.rows, worksheet.max_row),
+                                                      max_col=args.max_col), start=1):
+        print(f"  {row_num}: {row}")
+    worksheet.close()